@@ -0,0 +1,41 @@
+"""Synthetic video catalogs for the benchmarks."""
+
+from itertools import accumulate
+import random
+
+WORDS = ("funny", "dogs", "amazing", "cats", "another", "video", "life", "at",
+         "google", "about", "nothing", "music", "live", "how", "to", "cook",
+         "best", "of", "the", "week", "travel", "vlog", "game", "review",
+         "top", "ten", "learn", "python", "in", "minutes", "news", "today")
+
+
+def synthetic_videos(count, seed=0, tag_count=1000):
+    """Yields (title, video_id, tags) for count made up videos.
+
+    Tag popularity follows a Zipf-like curve, so a few tags are on a large
+    share of the videos and most are rare, like on a real catalog.
+
+    Args:
+        count: How many videos to make.
+        seed: Seed for the random generator, the same seed gives the same videos.
+        tag_count: How many distinct tags to use.
+    """
+    rng = random.Random(seed)
+    tags = [f"#tag{i}" for i in range(tag_count)]
+    tag_weights = list(accumulate(1 / (rank + 1) for rank in range(tag_count)))
+    for i in range(count):
+        title = " ".join(rng.choices(WORDS, k=rng.randint(2, 6))).capitalize()
+        video_tags = rng.choices(tags, cum_weights=tag_weights, k=rng.randint(0, 4))
+        yield f"{title} {i}", f"video_{i:08d}", list(dict.fromkeys(video_tags))
+
+
+def catalog_lines(count, seed=0, tag_count=1000):
+    """Yields count lines in the videos.txt format."""
+    for title, video_id, tags in synthetic_videos(count, seed, tag_count):
+        yield f"{title} | {video_id} | {' , '.join(tags)}\n"
+
+
+def write_catalog(path, count, seed=0, tag_count=1000):
+    """Writes a videos.txt style catalog of count made up videos to path."""
+    with open(path, "w") as catalog:
+        catalog.writelines(catalog_lines(count, seed, tag_count))
@@ -0,0 +1,66 @@
+"""Cost of dispatching each command through CommandParser.
+
+The player is replaced by one whose methods do nothing, so only the
+parser's own work is timed: looking the command up, checking its
+arguments, parsing its options and calling the handler. For comparison
+it also times just the lookup of the if/elif chain the parser used to
+have, which called .upper() and compared once per command ahead of the
+one being run, so its cost grew down the list. The last column is the
+same dispatch with metrics being collected.
+
+Run from the python directory:
+    python3 -m benchmarks.command_dispatch
+"""
+
+import argparse
+import timeit
+
+from src.command_parser import CommandParser
+from src.metrics import Metrics
+
+
+class NullPlayer:
+    """A video player whose every method does nothing."""
+
+    def __getattr__(self, name):
+        return lambda *args, **options: None
+
+
+def _example(name, spec):
+    """Returns a valid command line for a registered command."""
+    return [name] + ["arg"] * spec.min_args
+
+
+def _if_chain(command, names):
+    # What the old elif chain cost: one .upper() and comparison per branch
+    for name in names:
+        if command[0].upper() == name:
+            return name
+    return None
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--number", type=int, default=200_000, help="executions per command")
+    args = arg_parser.parse_args()
+
+    parsers = CommandParser(NullPlayer()), CommandParser(NullPlayer(), Metrics())
+    for parser in parsers: # Don't print anything
+        parser.register_command("HELP", lambda: None, "HELP", "Displays help.")
+        parser.register_command("STATS", lambda *args: None, "STATS", "Shows statistics.", max_args=1)
+        parser.register_command("PROFILE", lambda *args: None, "PROFILE", "Profiles.", min_args=1, max_args=None)
+    parser, measured = parsers
+    names = list(parser._commands)
+
+    print(f"{'command':<24} {'registry ns':>12} {'old lookup ns':>14} {'metrics ns':>11}")
+    for name in names:
+        command = _example(name, parser._commands[name])
+        registry = timeit.timeit(lambda: parser.execute_command(command), number=args.number)
+        chain = timeit.timeit(lambda: _if_chain(command, names), number=args.number)
+        metrics = timeit.timeit(lambda: measured.execute_command(command), number=args.number)
+        print(f"{name:<24} {registry / args.number * 1e9:>12.0f} {chain / args.number * 1e9:>14.0f} "
+              f"{metrics / args.number * 1e9:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
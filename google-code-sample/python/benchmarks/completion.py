@@ -0,0 +1,68 @@
+"""Cost of completing video ids and titles, against scanning for them.
+
+Builds the PrefixIndex of the video ids and the one of the lowercased
+titles of synthetic videos, as a library does on its first completion,
+then times completing prefixes of each length with them and, for
+comparison, by reading through every id and title.
+
+Run from the python directory:
+    python3 -m benchmarks.completion
+    python3 -m benchmarks.completion --videos 100000 --runs 1000
+"""
+
+import argparse
+import random
+import resource
+import statistics
+import time
+
+from benchmarks.catalog import synthetic_videos
+from src.prefix_index import PrefixIndex
+
+
+def _rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KiB on Linux
+
+
+def _p50_ms(function, prefixes, runs):
+    timings = []
+    for prefix in prefixes[:runs]:
+        started = time.perf_counter()
+        function(prefix)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--videos", type=int, default=1_000_000, help="videos in the catalog")
+    arg_parser.add_argument("--runs", type=int, default=200, help="completions of each kind")
+    arg_parser.add_argument("--top", type=int, default=10, help="completions asked for")
+    args = arg_parser.parse_args()
+
+    videos = [(title.lower(), video_id) for title, video_id, _ in synthetic_videos(args.videos)]
+    rss_before = _rss_mib()
+    started = time.perf_counter()
+    ids, titles = PrefixIndex(), PrefixIndex()
+    for title, video_id in videos:
+        ids.add(video_id, video_id)
+        titles.add(title, video_id)
+    ids.complete("") # The first completion sorts them
+    titles.complete("")
+    print(f"{args.videos} videos: indexes built in {time.perf_counter() - started:.2f}s, "
+          f"peak RSS grew by {_rss_mib() - rss_before:.0f} MiB")
+
+    rng = random.Random(1)
+    print(f"{'prefix':<16} {'index':>10} {'scan':>10}  (ms, p50)")
+    for length in (1, 3, 6, 10):
+        for name, index, keys in (("video id", ids, [video_id for _, video_id in videos]),
+                                  ("title", titles, [title for title, _ in videos])):
+            prefixes = [rng.choice(keys)[:length] for _ in range(args.runs)]
+            indexed = _p50_ms(lambda prefix: index.complete(prefix, args.top), prefixes, args.runs)
+            scanned = _p50_ms(lambda prefix: sorted(key for key in keys if key.startswith(prefix))[:args.top],
+                              prefixes, max(1, args.runs // 50))
+            print(f"{f'{name}, {length} chars':<16} {indexed:>10.4f} {scanned:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Cost of counting the tags of search results, with and without the index.
+
+Builds a TagIndex and FacetIndex of synthetic videos, then for tag
+searches of different sizes times counting the top tags of the results:
+naively (reading and normalizing every result's tags), from the
+signatures the index keeps, and with its bitsets, both the first time
+(making the bitsets of the tags needed) and once they are kept. Keeping
+the counts up to date as videos are flagged and allowed is timed too.
+
+Run from the python directory:
+    python3 -m benchmarks.facets
+    python3 -m benchmarks.facets --videos 100000 --runs 20
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks.catalog import synthetic_videos
+from src.facet_index import FacetIndex
+from src.facet_index import count_tags
+from src.facet_index import top_facets
+from src.tag_index import TagIndex
+from src.video import Video
+
+# Searches from most to fewest results: the tags are ranked by how common they are
+QUERIES = (("common tag", ["#tag0"], True),
+           ("two common tags", ["#tag0", "#tag1"], True),
+           ("either of two", ["#tag2", "#tag3"], False),
+           ("mid tag", ["#tag30"], True),
+           ("rare tag", ["#tag700"], True))
+
+
+def _p50_ms(function, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--videos", type=int, default=1_000_000, help="videos in the catalog")
+    arg_parser.add_argument("--runs", type=int, default=5, help="counts of each kind")
+    arg_parser.add_argument("--top", type=int, default=10, help="tags per count")
+    args = arg_parser.parse_args()
+
+    videos = {video_id: Video(title, video_id, tags) for title, video_id, tags in synthetic_videos(args.videos)}
+    tag_index = TagIndex()
+    for video in videos.values():
+        tag_index.add(video.video_id, video.title, video.tags)
+    started = time.perf_counter()
+    index = FacetIndex(tag_index.videos_with_tag)
+    for video in videos.values():
+        index.add(video.video_id, video.tags)
+    print(f"{args.videos} videos: facet index built in {time.perf_counter() - started:.2f}s")
+
+    print(f"{'search':<16} {'results':>8} {'naive':>10} {'signatures':>11} {'first bitsets':>14} {'bitsets':>10}  (ms)")
+    for name, tags, match_all in QUERIES:
+        if match_all:
+            video_ids = list(tag_index.videos_with_all_tags(tags))
+        else:
+            video_ids = list(tag_index.videos_with_any_tag(tags))
+        naive = _p50_ms(lambda: top_facets(count_tags(map(videos.__getitem__, video_ids)), args.top), args.runs)
+        signatures = _p50_ms(lambda: index.count(video_ids, None), args.runs)
+        started = time.perf_counter()
+        facets = index.count(video_ids, args.top, tags, match_all)
+        first = (time.perf_counter() - started) * 1000
+        kept = _p50_ms(lambda: index.count(video_ids, args.top, tags, match_all), args.runs)
+        assert facets == top_facets(count_tags(map(videos.__getitem__, video_ids)), args.top)
+        print(f"{name:<16} {len(video_ids):>8} {naive:>10.1f} {signatures:>11.1f} {first:>14.1f} {kept:>10.1f}")
+
+    # Flagging changes the counts at once, and the kept bitsets when next used
+    flagged = random.Random(1).sample(list(videos), 1000)
+    started = time.perf_counter()
+    for video_id in flagged:
+        index.flag(video_id)
+    for video_id in flagged:
+        index.allow(video_id)
+    print(f"flag and allow: {(time.perf_counter() - started) / len(flagged) * 1e6:.1f} us per video")
+    started = time.perf_counter()
+    index.count(list(tag_index.videos_with_tag("#tag0")), args.top, ["#tag0"])
+    print(f"common tag after them: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Catalog loading time against the number of parsing processes.
+
+Writes a synthetic catalog, then times loading a VideoLibrary from it
+with 1 to N worker processes parsing and indexing byte ranges of it
+(1 is the plain one-process load).
+
+Run from the python directory:
+    python3 -m benchmarks.parallel_ingest
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.catalog import write_catalog
+from src.video_library import VideoLibrary
+
+
+def _timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--videos", type=int, default=1_000_000, help="videos in the catalog")
+    arg_parser.add_argument("--workers", type=int, nargs="+",
+                            default=sorted({1, 2, 4, os.cpu_count() or 1}), help="worker counts to time")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        catalog_path = os.path.join(directory, "videos.txt")
+        write_catalog(catalog_path, args.videos)
+
+        print(f"{args.videos} videos, {os.cpu_count()} cpus")
+        print(f"{'workers':>8} {'load s':>8} {'speedup':>8}")
+        first = None
+        for workers in args.workers:
+            elapsed = _timed(lambda: VideoLibrary(catalog_path, use_snapshot=False, workers=workers))
+            if first is None:
+                first = elapsed
+            print(f"{workers:>8} {elapsed:>8.2f} {first / elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Latency of ranked title searches against a latency budget.
+
+Loads a VideoLibrary from a synthetic catalog, times building its
+RankedIndex (done by the first ranked search), then times top-k ranked
+searches of a few kinds: one common word, several common words, words
+with typos, and a common word with a rare one. The plain substring search
+of one common word is timed for comparison, and so is reading through
+the titles once without the index, as a lazy library does.
+
+Run from the python directory:
+    python3 -m benchmarks.ranked_search
+    python3 -m benchmarks.ranked_search --videos 10000000 --budget-ms 50
+"""
+
+import argparse
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+
+from benchmarks.catalog import WORDS
+from benchmarks.catalog import write_catalog
+from src.ranked_index import rank_titles
+from src.video_library import VideoLibrary
+
+
+def _typo(word, rng):
+    """Returns word with two of its letters swapped, or one dropped."""
+    i = rng.randrange(len(word) - 1)
+    if rng.random() < 0.5:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + word[i + 1:]
+
+
+def _queries(videos, rng):
+    """Returns each kind of query as (name, function returning the next search term)."""
+    long_words = [word for word in WORDS if len(word) >= 4]
+    return [
+        ("one_word", lambda: rng.choice(WORDS)),
+        ("two_words", lambda: " ".join(rng.sample(WORDS, 2))),
+        ("three_words", lambda: " ".join(rng.sample(WORDS, 3))),
+        ("typos", lambda: " ".join(_typo(word, rng) for word in rng.sample(long_words, 2))),
+        ("word_and_rare", lambda: f"{rng.choice(WORDS)} {rng.randrange(videos)}"),
+    ]
+
+
+def _percentiles(seconds):
+    millis = sorted(second * 1000 for second in seconds)
+    quantiles = statistics.quantiles(millis, n=100) if len(millis) > 1 else millis * 99
+    return quantiles[49], quantiles[98], millis[-1]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--videos", type=int, default=1_000_000, help="videos in the catalog")
+    arg_parser.add_argument("--runs", type=int, default=200, help="searches of each kind")
+    arg_parser.add_argument("--top", type=int, default=10, help="results per search")
+    arg_parser.add_argument("--budget-ms", type=float, default=50, help="latency budget per search")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        catalog_path = os.path.join(directory, "videos.txt")
+        write_catalog(catalog_path, args.videos)
+        library = VideoLibrary(catalog_path, use_snapshot=False)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    library.ranked_search("")
+    build_seconds = time.perf_counter() - start
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before # KiB on Linux
+    print(f"{args.videos} videos: index built in {build_seconds:.2f}s, "
+          f"peak RSS grew by {rss_growth / 1024:.0f} MiB")
+
+    rng = random.Random(0)
+    print(f"{'search':<16} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'over budget':>12}")
+    kinds = _queries(args.videos, rng)
+    kinds.append(("substring", lambda: rng.choice(WORDS))) # All matches of SEARCH_VIDEOS, for comparison
+    for name, next_term in kinds:
+        search = library.search_titles if name == "substring" else lambda term: library.ranked_search(term, args.top)
+        timings = []
+        for _ in range(args.runs):
+            term = next_term()
+            started = time.perf_counter()
+            search(term)
+            timings.append(time.perf_counter() - started)
+        over = sum(timing * 1000 > args.budget_ms for timing in timings)
+        p50, p99, most = _percentiles(timings)
+        print(f"{name:<16} {p50:>8.2f} {p99:>8.2f} {most:>8.2f} {over:>6}/{len(timings)}")
+
+    # What a search costs without the index, reading every title once
+    titles = [(video.video_id, video.title) for video in library.iter_videos()]
+    started = time.perf_counter()
+    rank_titles(" ".join(rng.sample(WORDS, 2)), titles, args.top)
+    print(f"{'without index':<16} {(time.perf_counter() - started) * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Cost of precomputing related videos, and of looking them up.
+
+Builds a RelatedIndex of synthetic videos and times: building it, the
+first lookups of random videos (which work out their signature's related
+videos), working out every other signature's (what precomputing them all
+offline costs), then lookups once every signature's are kept, with and
+without 1% of the videos flagged, and the first lookups of sets of many
+tags, which count shared tags rather than read a cell per subset of them.
+Reading through every video to rank them, as a lazy library does, is
+timed for comparison.
+
+Run from the python directory:
+    python3 -m benchmarks.related_videos
+    python3 -m benchmarks.related_videos --videos 100000 --runs 1000
+"""
+
+import argparse
+import random
+import resource
+import statistics
+import time
+
+from benchmarks.catalog import synthetic_videos
+from src.related_index import RelatedIndex
+from src.related_index import rank_related
+
+
+def _rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KiB on Linux
+
+
+def _lookups(index, videos, runs, k, skip=()):
+    """Times related videos lookups of random videos, returns (p50, p99) in ms."""
+    rng = random.Random(1)
+    timings = []
+    for _ in range(runs):
+        title, video_id, tags = rng.choice(videos)
+        started = time.perf_counter()
+        index.related(video_id, tags, k, skip)
+        timings.append(time.perf_counter() - started)
+    millis = sorted(timing * 1000 for timing in timings)
+    quantiles = statistics.quantiles(millis, n=100) if len(millis) > 1 else millis * 99
+    return quantiles[49], quantiles[98]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--videos", type=int, default=1_000_000, help="videos in the catalog")
+    arg_parser.add_argument("--runs", type=int, default=200, help="lookups of each kind")
+    arg_parser.add_argument("--top", type=int, default=10, help="related videos per lookup")
+    arg_parser.add_argument("--many-tags", type=int, nargs="+", default=[8, 16, 24, 32],
+                            help="tag counts of the sets of many tags looked up")
+    args = arg_parser.parse_args()
+
+    videos = list(synthetic_videos(args.videos))
+    rss_before = _rss_mib()
+    index = RelatedIndex()
+    started = time.perf_counter()
+    for title, video_id, tags in videos:
+        index.add(video_id, title, tags)
+    print(f"{args.videos} videos: index built in {time.perf_counter() - started:.2f}s, "
+          f"peak RSS grew by {_rss_mib() - rss_before:.0f} MiB")
+
+    p50, p99 = _lookups(index, videos, args.runs, args.top)
+    print(f"{'first lookups':<24} p50 {p50:>8.3f} ms  p99 {p99:>8.3f} ms")
+
+    rss_before = _rss_mib()
+    started = time.perf_counter()
+    count = index.precompute()
+    seconds = time.perf_counter() - started
+    print(f"{'precompute':<24} {count} signatures in {seconds:.1f}s "
+          f"({seconds / max(count, 1) * 1e6:.0f} us each), peak RSS grew by {_rss_mib() - rss_before:.0f} MiB")
+
+    p50, p99 = _lookups(index, videos, args.runs, args.top)
+    print(f"{'kept lookups':<24} p50 {p50:>8.3f} ms  p99 {p99:>8.3f} ms")
+    flagged = {video_id for _, video_id, _ in random.Random(2).sample(videos, len(videos) // 100)}
+    p50, p99 = _lookups(index, videos, args.runs, args.top, flagged)
+    print(f"{'kept lookups, 1% flagged':<24} p50 {p50:>8.3f} ms  p99 {p99:>8.3f} ms")
+
+    # Sets of tags no video has, so each lookup works out a new signature
+    rng = random.Random(3)
+    tag_names = sorted({tag for _, _, tags in videos for tag in tags})
+    for tag_count in args.many_tags:
+        timings = []
+        for _ in range(5):
+            tags = rng.sample(tag_names, min(tag_count, len(tag_names)))
+            started = time.perf_counter()
+            index.related(None, tags, args.top)
+            timings.append(time.perf_counter() - started)
+        print(f"{f'first lookup, {tag_count} tags':<24} p50 {statistics.median(timings) * 1000:>8.3f} ms  "
+              f"max {max(timings) * 1000:>8.3f} ms")
+
+    # What a lookup costs without the index, reading every video once
+    title, video_id, tags = videos[0]
+    started = time.perf_counter()
+    rank_related(video_id, tags, ((other_id, other_title, other_tags)
+                                  for other_title, other_id, other_tags in videos), args.top)
+    print(f"{'without index':<24} {(time.perf_counter() - started) * 1000:>12.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Command latency of the video server under many concurrent sessions.
+
+Starts the server in its own process on a Unix socket, then connects
+every session at once and has each send a mix of commands (listings,
+searches, playing, playlists and flags), timing each command from
+sending it to reading the end of its reply. Reports the p50/p99 latency
+and the commands per second the server kept up.
+
+Run from the python directory:
+    python3 -m benchmarks.server_load
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+
+from benchmarks.catalog import write_catalog
+from src.server import VideoServer
+from src.video_library import VideoLibrary
+from src.video_player import VideoPlayer
+
+
+def _run_server(catalog_path, socket_path):
+    player = VideoPlayer(VideoLibrary(catalog_path), prompt=None)
+    asyncio.run(VideoServer(player).serve(path=socket_path))
+
+
+def _commands(rng, session, videos):
+    """Yields the commands one session sends."""
+    playlist = f"list_{session}"
+    yield f"CREATE_PLAYLIST {playlist}"
+    while True:
+        video_id = f"video_{rng.randrange(videos):08d}"
+        roll = rng.random()
+        if roll < 0.25:
+            yield f"PLAY {video_id}"
+        elif roll < 0.45:
+            yield f"SEARCH_VIDEOS {rng.choice(('cat', 'dogs', 'music', 'python'))} --limit 10"
+            yield "no" # Answers "play which video?"
+        elif roll < 0.6:
+            yield f"SEARCH_VIDEOS_WITH_TAG #tag{rng.randrange(50)} --limit 10"
+            yield "no"
+        elif roll < 0.75:
+            yield f"ADD_TO_PLAYLIST {playlist} {video_id}"
+        elif roll < 0.85:
+            yield f"SHOW_PLAYLIST {playlist}"
+        elif roll < 0.9:
+            yield f"FLAG_VIDEO {video_id} spam"
+        elif roll < 0.95:
+            yield f"ALLOW_VIDEO {video_id}"
+        else:
+            yield "SHOW_PLAYING"
+
+
+async def _read_reply(reader):
+    while (await reader.readline()) not in (b".\n", b""):
+        pass
+
+
+async def _session(socket_path, session, args, latencies, start_gate):
+    rng = random.Random(session)
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    await _read_reply(reader) # The welcome message
+    await start_gate.wait()
+    commands = _commands(rng, session, args.videos)
+    for _ in range(args.commands):
+        command = next(commands)
+        start = time.perf_counter()
+        writer.write(command.encode("utf-8") + b"\n")
+        await _read_reply(reader)
+        latencies.append(time.perf_counter() - start)
+    writer.write(b"EXIT\n")
+    await _read_reply(reader)
+    writer.close()
+
+
+async def _load(socket_path, args):
+    latencies = []
+    start_gate = asyncio.Event()
+    sessions = []
+    for session in range(args.sessions): # Connect in batches so the backlog isn't overrun
+        sessions.append(asyncio.create_task(_session(socket_path, session, args, latencies, start_gate)))
+        if session % 256 == 255:
+            await asyncio.sleep(0.05)
+    await asyncio.sleep(0.5)
+    start = time.perf_counter()
+    start_gate.set()
+    await asyncio.gather(*sessions)
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--sessions", type=int, default=2_000, help="concurrent sessions")
+    arg_parser.add_argument("--commands", type=int, default=20, help="commands per session")
+    arg_parser.add_argument("--videos", type=int, default=100_000, help="videos in the library")
+    args = arg_parser.parse_args()
+
+    # Each session needs a socket on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, 2 * args.sessions + 64)), hard))
+
+    with tempfile.TemporaryDirectory() as directory:
+        catalog_path = os.path.join(directory, "videos.txt")
+        socket_path = os.path.join(directory, "server.sock")
+        write_catalog(catalog_path, args.videos)
+        server = multiprocessing.Process(target=_run_server, args=(catalog_path, socket_path), daemon=True)
+        server.start()
+        while not os.path.exists(socket_path):
+            time.sleep(0.1)
+        try:
+            latencies, elapsed = asyncio.run(_load(socket_path, args))
+        finally:
+            server.terminate()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"{args.sessions} sessions, {len(latencies)} commands in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.0f} commands/sec)")
+    print(f"p50 {quantiles[49] * 1e3:.2f} ms, p99 {quantiles[98] * 1e3:.2f} ms, "
+          f"max {max(latencies) * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Query latency and memory per process against the number of shards.
+
+Writes a synthetic catalog, then for each shard count loads a
+ShardedVideoLibrary from it (0 is a plain VideoLibrary, for comparison)
+and times lookups by video_id, title searches and tag searches through
+it, and reads the resident memory of the process using it and of the
+biggest shard's process from /proc (so Linux only). Each shard count
+runs in a new process.
+
+Run from the python directory:
+    python3 -m benchmarks.sharded_library
+    python3 -m benchmarks.sharded_library --videos 1000000 --shards 0 1 2 4 8
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.catalog import WORDS
+from benchmarks.catalog import write_catalog
+from src.sharded_library import ShardedVideoLibrary
+from src.video_library import VideoLibrary
+
+
+def _rss_mib(pid):
+    """Returns the resident memory of a process in MiB."""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024 # In KiB
+    return 0
+
+
+def _p50_ms(function, next_argument, runs):
+    timings = []
+    for _ in range(runs):
+        argument = next_argument()
+        started = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def run_shards(catalog_path, videos, shards, runs):
+    """Loads the library with shards shards and times it, in this process."""
+    started = time.perf_counter()
+    if shards:
+        library = ShardedVideoLibrary(catalog_path, shards, use_snapshot=False)
+    else:
+        library = VideoLibrary(catalog_path, use_snapshot=False)
+    load_seconds = time.perf_counter() - started
+
+    rng = random.Random(0)
+    video_id = lambda: f"video_{rng.randrange(videos):08d}"
+    get = _p50_ms(library.get_video, video_id, runs)
+    rare = _p50_ms(library.search_titles, lambda: f" {rng.randrange(videos)}", runs)
+    common = _p50_ms(library.search_titles, lambda: rng.choice(WORDS), max(1, runs // 20))
+    tags = _p50_ms(lambda tag: list(library.videos_with_tags([tag])), lambda: f"#tag{rng.randrange(50, 1000)}", runs)
+
+    shard_rss = [_rss_mib(process.pid) for process in multiprocessing.active_children()
+                 if process.name.startswith("VideoLibraryShard")]
+    result = (load_seconds, get, rare, common, tags, _rss_mib(os.getpid()), max(shard_rss, default=0))
+    if shards:
+        library.close()
+    return result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--videos", type=int, default=200_000, help="videos in the catalog")
+    arg_parser.add_argument("--shards", type=int, nargs="+", default=[0, 1, 2, 4],
+                            help="shard counts to time, 0 for a VideoLibrary in this process")
+    arg_parser.add_argument("--runs", type=int, default=200, help="queries of each kind")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        catalog_path = os.path.join(directory, "videos.txt")
+        write_catalog(catalog_path, args.videos)
+
+        print(f"{args.videos} videos, {os.cpu_count()} cpus, p50 latencies")
+        print(f"{'shards':>6} {'load s':>7} {'get ms':>7} {'rare ms':>8} {'common ms':>10} {'tag ms':>7} "
+              f"{'parent MiB':>11} {'shard MiB':>10}")
+        # A new interpreter for each count, so its memory is its own
+        context = multiprocessing.get_context("spawn")
+        for shards in args.shards:
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                load_seconds, get, rare, common, tags, parent_rss, shard_rss = pool.submit(
+                    run_shards, catalog_path, args.videos, shards, args.runs).result()
+            print(f"{shards:>6} {load_seconds:>7.2f} {get:>7.3f} {rare:>8.3f} {common:>10.1f} {tags:>7.3f} "
+                  f"{parent_rss:>11.0f} {shard_rss:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
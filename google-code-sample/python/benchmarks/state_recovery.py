@@ -0,0 +1,89 @@
+"""Recovery time of the playlist and flag store against the size of its log.
+
+Writes logs of made up playlist and flag changes, then times reading them
+back with the log alone and after compacting them into a snapshot. Also
+times appending a record for a few fsync batch sizes, which is what every
+command changing a playlist or flag pays.
+
+Run from the python directory:
+    python3 -m benchmarks.state_recovery
+"""
+
+import argparse
+import random
+import tempfile
+import time
+
+from src.state_store import StateStore
+
+
+def _write_log(directory, count, seed=0, videos=100_000, playlists=100):
+    """Logs count made up changes and returns the state they add up to."""
+    rng = random.Random(seed)
+    store = StateStore(directory, sync_every=10_000, compact_every=count + 1)
+    state = store.recover()
+    for i in range(count):
+        video_id = f"video_{rng.randrange(videos):08d}"
+        key = f"playlist_{rng.randrange(playlists)}"
+        roll = rng.random()
+        if key not in state.playlists:
+            record = ("create", key, key.upper())
+        elif roll < 0.6:
+            record = ("add", key, video_id)
+        elif roll < 0.75:
+            record = ("remove", key, video_id)
+        elif roll < 0.9:
+            record = ("flag", video_id, "spam")
+        elif roll < 0.99:
+            record = ("allow", video_id)
+        else:
+            record = ("clear", key)
+        state.apply(*record)
+        store.append(*record)
+    store.close()
+    return state
+
+
+def _time_recovery(directory):
+    start = time.perf_counter()
+    store = StateStore(directory)
+    store.recover()
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000],
+                            help="log sizes in records")
+    arg_parser.add_argument("--appends", type=int, default=2_000, help="records to time appending")
+    args = arg_parser.parse_args()
+
+    print(f"{'records':>10} {'log recovery ms':>16} {'snapshot recovery ms':>21}")
+    for count in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            state = _write_log(directory, count)
+            from_log = _time_recovery(directory)
+            store = StateStore(directory)
+            store.recover()
+            store.compact(state)
+            store.close()
+            from_snapshot = _time_recovery(directory)
+        print(f"{count:>10} {from_log * 1e3:>16.1f} {from_snapshot * 1e3:>21.1f}")
+
+    print(f"\n{'sync_every':>10} {'append us':>10}")
+    for sync_every in (1, 16, 64, 1024):
+        with tempfile.TemporaryDirectory() as directory:
+            store = StateStore(directory, sync_every=sync_every)
+            store.recover()
+            start = time.perf_counter()
+            for i in range(args.appends):
+                store.append("flag", f"video_{i:08d}", "spam")
+            elapsed = time.perf_counter() - start
+            store.close()
+        print(f"{sync_every:>10} {elapsed / args.appends * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Latency and memory of the player's commands on catalogs of every size.
+
+For each catalog size, a fresh process loads a VideoLibrary from a
+synthetic videos.txt (kept in --catalog-dir and reused by later runs,
+the big ones take a while to write) and runs each benchmark's commands
+through CommandParser.execute_command with the output thrown away. Each
+benchmark reports its latency distribution over --runs runs and the
+peak memory a single run allocates; each size reports the load time and
+the process's peak RSS.
+
+The results are written as JSON to --output, and a previous results
+file given to --compare is printed next to them with the change in p50.
+
+Run from the python directory:
+    python3 -m benchmarks.suite --output results.json
+    python3 -m benchmarks.suite --output new.json --compare results.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+from benchmarks.catalog import WORDS
+from benchmarks.catalog import write_catalog
+from src.command_parser import CommandException
+from src.command_parser import CommandParser
+from src.video_library import VideoLibrary
+from src.video_player import VideoPlayer
+
+FORMAT_VERSION = 1
+
+
+class _NullOutput(io.TextIOBase):
+    """A stdout that throws everything away."""
+
+    def write(self, text):
+        return len(text)
+
+
+def _benchmarks(size, rng):
+    """Returns the benchmarks for a catalog of size videos.
+
+    Each one is (name, function returning the next command line, whether
+    the search cache is cleared before every run).
+    """
+    video_id = lambda: f"video_{rng.randrange(size):08d}"
+    benchmarks = [
+        ("play", lambda: f"PLAY {video_id()}", False),
+        ("show_all_videos_page", lambda: f"SHOW_ALL_VIDEOS --limit 20 --offset {rng.randrange(size)}", False),
+        ("search_videos_cold", lambda: f"SEARCH_VIDEOS {rng.choice(WORDS)} --limit 20", True),
+        ("search_videos_cached", lambda: f"SEARCH_VIDEOS {rng.choice(WORDS[:4])} --limit 20", False),
+        ("search_videos_rare", lambda: f"SEARCH_VIDEOS {rng.randrange(size)} --limit 20", True),
+        ("search_videos_tag_common", lambda: f"SEARCH_VIDEOS_WITH_TAG #tag{rng.randrange(5)} --limit 20", True),
+        ("search_videos_tag_rare", lambda: f"SEARCH_VIDEOS_WITH_TAG #tag{rng.randrange(500, 1000)} --limit 20", True),
+        ("search_videos_tag_all", lambda: f"SEARCH_VIDEOS_WITH_TAG #tag0&#tag{rng.randrange(1, 50)} --limit 20", True),
+        ("search_videos_tag_facets", lambda: f"SEARCH_VIDEOS_WITH_TAG #tag{rng.randrange(5)} --limit 20 --facets 10", False),
+        ("search_videos_ranked", lambda: f"SEARCH_VIDEOS_RANKED {' '.join(rng.sample(WORDS, 3))}", False),
+        ("search_videos_ranked_rare", lambda: f"SEARCH_VIDEOS_RANKED {rng.choice(WORDS)} {rng.randrange(size)}", False),
+        ("show_related", lambda: f"SHOW_RELATED {video_id()}", False),
+        ("complete", lambda: f"COMPLETE {video_id()[:10]}", False),
+        ("add_to_playlist", lambda: f"ADD_TO_PLAYLIST bench {' '.join(video_id() for _ in range(10))}", False),
+        ("flag_allow", lambda: f"FLAG_VIDEO {video_id()}", False),
+    ]
+    if size <= 100_000: # Listing everything is the point here, but is too slow past this
+        benchmarks.append(("show_all_videos", lambda: "SHOW_ALL_VIDEOS", False))
+    return benchmarks
+
+
+def _run(parser, player, line):
+    try:
+        parser.execute_command(line.split())
+    except CommandException:
+        pass
+    if player.has_pending_prompt:
+        player.answer_prompt("no")
+
+
+def _distribution(seconds):
+    """Returns the summary of a list of latencies, in microseconds."""
+    micros = sorted(second * 1e6 for second in seconds)
+    quantiles = statistics.quantiles(micros, n=100) if len(micros) > 1 else micros * 99
+    return {"runs": len(micros), "min_us": micros[0], "p50_us": quantiles[49], "p90_us": quantiles[89],
+            "p99_us": quantiles[98], "max_us": micros[-1], "mean_us": statistics.fmean(micros)}
+
+
+def run_size(catalog_path, size, runs, seed):
+    """Loads one catalog and runs every benchmark on it, in this process."""
+    start = time.perf_counter()
+    library = VideoLibrary(catalog_path, use_snapshot=False)
+    load_seconds = time.perf_counter() - start
+    load_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 # KiB on Linux
+
+    player = VideoPlayer(library, prompt=None)
+    parser = CommandParser(player)
+    rng = random.Random(seed)
+    results = {}
+    with contextlib.redirect_stdout(_NullOutput()):
+        _run(parser, player, "CREATE_PLAYLIST bench")
+        for name, next_command, cold in _benchmarks(size, rng):
+            for _ in range(min(3, runs)): # Warm up
+                _run(parser, player, next_command())
+
+            timings = []
+            for _ in range(runs):
+                line = next_command()
+                if cold:
+                    player.query_cache.clear()
+                started = time.perf_counter()
+                _run(parser, player, line)
+                timings.append(time.perf_counter() - started)
+            if name == "flag_allow": # Put the flags back
+                for video in library.flagged_videos():
+                    library.allow_video(video.video_id)
+
+            # Memory on separate runs, tracing slows everything down
+            peaks = []
+            for _ in range(min(5, runs)):
+                line = next_command()
+                if cold:
+                    player.query_cache.clear()
+                tracemalloc.start()
+                _run(parser, player, line)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            results[name] = dict(_distribution(timings), peak_bytes=max(peaks))
+
+    return {"size": size, "load_seconds": load_seconds, "load_peak_rss_bytes": load_rss,
+            "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+            "benchmarks": results}
+
+
+def _compare(results, baseline):
+    """Prints the p50 of each benchmark next to the baseline's."""
+    old = {(entry["size"], name): stats
+           for entry in baseline["sizes"] for name, stats in entry["benchmarks"].items()}
+    old_loads = {entry["size"]: entry["load_seconds"] for entry in baseline["sizes"]}
+    print(f"\n{'size':>9} {'benchmark':<26} {'old p50 us':>11} {'new p50 us':>11} {'change':>8}")
+    for entry in results["sizes"]:
+        size = entry["size"]
+        if size in old_loads:
+            change = entry["load_seconds"] / old_loads[size] - 1
+            print(f"{size:>9} {'load (s)':<26} {old_loads[size]:>11.3f} {entry['load_seconds']:>11.3f} {change:>+8.0%}")
+        for name, stats in entry["benchmarks"].items():
+            if (size, name) in old:
+                before = old[size, name]["p50_us"]
+                change = stats["p50_us"] / before - 1 if before else 0
+                print(f"{size:>9} {name:<26} {before:>11.1f} {stats['p50_us']:>11.1f} {change:>+8.0%}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                            help="catalog sizes to run, up to 10000000")
+    arg_parser.add_argument("--runs", type=int, default=200, help="timed runs per benchmark")
+    arg_parser.add_argument("--seed", type=int, default=0, help="seed for the catalogs and commands")
+    arg_parser.add_argument("--catalog-dir", default=os.path.join("benchmarks", "catalogs"),
+                            help="where to keep the generated catalogs")
+    arg_parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write")
+    arg_parser.add_argument("--compare", metavar="FILE", help="earlier results to compare with")
+    args = arg_parser.parse_args()
+
+    os.makedirs(args.catalog_dir, exist_ok=True)
+    results = {"format": FORMAT_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+               "python": sys.version.split()[0], "platform": platform.platform(),
+               "runs": args.runs, "seed": args.seed, "sizes": []}
+
+    # A new interpreter for each size, so its peak RSS is its own
+    context = multiprocessing.get_context("spawn")
+    for size in args.sizes:
+        catalog_path = os.path.join(args.catalog_dir, f"videos_{size}_{args.seed}.txt")
+        if not os.path.exists(catalog_path):
+            write_catalog(catalog_path + ".tmp", size, args.seed)
+            os.replace(catalog_path + ".tmp", catalog_path)
+
+        with context.Pool(1) as pool:
+            entry = pool.apply(run_size, (catalog_path, size, args.runs, args.seed))
+        results["sizes"].append(entry)
+
+        print(f"{size} videos: loaded in {entry['load_seconds']:.2f}s, "
+              f"peak RSS {entry['peak_rss_bytes'] / 2**20:.0f} MiB")
+        for name, stats in entry["benchmarks"].items():
+            print(f"    {name:<26} p50 {stats['p50_us']:>9.1f} us  p99 {stats['p99_us']:>9.1f} us  "
+                  f"peak {stats['peak_bytes'] / 1024:>8.1f} KiB")
+
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare is not None:
+        with open(args.compare) as baseline:
+            _compare(results, json.load(baseline))
+
+
+if __name__ == "__main__":
+    main()
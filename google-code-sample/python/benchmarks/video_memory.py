@@ -0,0 +1,76 @@
+"""Memory used per video by the library's Video records.
+
+Compares the current Video (__slots__, interned tags, shared tag tuples)
+with the layout it replaced (per-object __dict__, a fresh tuple of fresh
+tag strings for every video).
+
+Run from the python directory (allocation tracing is slow, the 10M run
+takes the better part of an hour):
+    python3 -m benchmarks.video_memory --sizes 1000000 10000000
+"""
+
+import argparse
+import gc
+import sys
+import tracemalloc
+
+from src.video import Video
+
+from .catalog import catalog_lines
+
+
+class DictVideo:
+    """The Video layout before __slots__, kept here to compare against."""
+
+    def __init__(self, video_title, video_id, video_tags):
+        self._title = video_title
+        self._video_id = video_id
+        self._flag = None
+        self._tags = tuple(video_tags)
+
+
+def _load_dict_videos(lines):
+    videos = {}
+    for line in lines:
+        title, url, tags = (item.strip() for item in line.split("|"))
+        videos[url] = DictVideo(title, url, [tag.strip() for tag in tags.split(",")] if tags else [])
+    return videos
+
+
+def _load_slot_videos(lines):
+    # Same steps as VideoLibrary's loader
+    videos = {}
+    tag_tuples = {}
+    for line in lines:
+        title, url, tags = (item.strip() for item in line.split("|"))
+        tags = tuple(sys.intern(tag.strip()) for tag in tags.split(",")) if tags else ()
+        videos[url] = Video(title, url, tag_tuples.setdefault(tags, tags))
+    return videos
+
+
+def measure(load, count):
+    """Returns the bytes still allocated after loading count videos."""
+    gc.collect()
+    tracemalloc.start()
+    videos = load(catalog_lines(count))
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del videos
+    return used
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    args = arg_parser.parse_args()
+
+    print(f"{'videos':>12} {'dict MB':>10} {'slots MB':>10} {'B/video':>16} {'saved':>6}")
+    for count in args.sizes:
+        before = measure(_load_dict_videos, count)
+        after = measure(_load_slot_videos, count)
+        print(f"{count:>12} {before / 2**20:>10.1f} {after / 2**20:>10.1f} "
+              f"{before // count:>7} -> {after // count:<6} {1 - after / before:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
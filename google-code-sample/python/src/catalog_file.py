@@ -0,0 +1,99 @@
+"""Helpers to read the pipe-delimited videos.txt catalog format."""
+
+import csv
+import io
+import os
+import sys
+
+
+# Helper Wrapper around CSV reader to strip whitespace from around
+# each item.
+def _csv_reader_with_strip(reader):
+    yield from ((item.strip() for item in line) for line in reader)
+
+
+def _split_tags(tags):
+    """Returns the tags of a catalog line as a tuple of interned strings."""
+    return tuple(sys.intern(tag.strip()) for tag in tags.split(",")) if tags else ()
+
+
+def read_catalog(path):
+    """Yields (title, video_id, tags) for every line of a catalog file.
+
+    Tag strings are interned and videos with the same tags get the same
+    tuple, which a big library would otherwise hold millions of copies of.
+
+    Args:
+        path: The catalog file.
+    """
+    with open(path) as video_file:
+        yield from _read_lines(video_file, {})
+
+
+def _read_lines(lines, tag_tuples):
+    """Yields (title, video_id, tags) for lines of a catalog file.
+
+    Args:
+        lines: The lines, as an iterable of strings.
+        tag_tuples: Tags already seen, tags tuple -> the same tuple, to
+            hand back one tuple for the same tags.
+    """
+    reader = _csv_reader_with_strip(
+        csv.reader(lines, delimiter="|"))
+    for video_info in reader:
+        title, url, tags = video_info
+        tags = _split_tags(tags)
+        yield title, url, tag_tuples.setdefault(tags, tags)
+
+
+def chunk_ranges(path, count):
+    """Splits a catalog file into byte ranges that start and end on lines.
+
+    Args:
+        path: The catalog file.
+        count: How many ranges to split it into, at most.
+
+    Returns:
+        A list of (start, end) byte offsets, in file order.
+    """
+    size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, "rb") as catalog:
+        for i in range(1, count):
+            catalog.seek(max(size * i // count, boundaries[-1]))
+            catalog.readline() # Move on to the start of the next line
+            boundaries.append(min(catalog.tell(), size))
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def read_range(path, start, end):
+    """Returns (title, video_id, tags) for every line in a byte range of a
+    catalog file, as given by chunk_ranges.
+
+    Args:
+        path: The catalog file.
+        start: Offset of the first line.
+        end: Offset just past the last line.
+    """
+    with open(path, "rb") as catalog:
+        catalog.seek(start)
+        text = catalog.read(end - start)
+    lines = io.TextIOWrapper(io.BytesIO(text)) # Same newline handling as open(path)
+    return list(_read_lines(lines, {}))
+
+
+def parse_line(line):
+    """Returns (title, video_id, tags) for one raw catalog line.
+
+    Args:
+        line: The line as bytes.
+
+    Returns:
+        None if the line is blank.
+    """
+    text = line.decode("utf-8").strip()
+    if not text:
+        return None
+    title, url, tags = (item.strip() for item in next(csv.reader([text], delimiter="|")))
+    return title, url, _split_tags(tags)
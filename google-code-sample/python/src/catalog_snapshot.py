@@ -0,0 +1,206 @@
+"""A compiled binary snapshot of a video catalog.
+
+Compiling turns videos.txt into a file VideoLibrary can open without
+parsing any text: a string table holding every tag, title and video_id,
+each video's tag ids, and the videos pre-sorted by title and by id. The
+arrays are read straight out of the memory-mapped file, so opening a
+snapshot costs the same whatever the size of the catalog.
+
+To compile the bundled catalog, from the python directory:
+    python3 -m src.catalog_snapshot src/videos.txt
+"""
+
+from .catalog_file import read_catalog
+from array import array
+from pathlib import Path
+import argparse
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"YTCATLG\0"
+VERSION = 1
+
+# magic, version, little endian, video count, tag count, tag reference
+# count, size and mtime of the videos.txt it was compiled from
+_HEADER = struct.Struct("<8sHH4xIIQQQ")
+
+
+def snapshot_path_for(catalog_path):
+    """Returns where the snapshot of a catalog file is kept."""
+    catalog_path = Path(catalog_path)
+    return catalog_path.with_name(catalog_path.name + ".snapshot")
+
+
+def _aligned(size):
+    """Returns size rounded up so the next section starts on 8 bytes."""
+    return (size + 7) & ~7
+
+
+def compile_snapshot(catalog_path, snapshot_path=None):
+    """Compiles a catalog file into a snapshot.
+
+    Args:
+        catalog_path: The videos.txt file to compile.
+        snapshot_path: Where to write the snapshot, next to the catalog by default.
+
+    Returns:
+        The path of the snapshot.
+    """
+    if snapshot_path is None:
+        snapshot_path = snapshot_path_for(catalog_path)
+
+    source_stat = os.stat(catalog_path)
+    videos = {} # Same replace semantics for repeated ids as the library
+    for title, video_id, tags in read_catalog(catalog_path):
+        videos[video_id] = (title, tags)
+
+    tag_ids = {}
+    for _, tags in videos.values():
+        for tag in tags:
+            tag_ids.setdefault(tag, len(tag_ids))
+
+    # Strings are all tags, then the title and video_id of every video
+    strings = [tag.encode("utf-8") for tag in tag_ids]
+    tag_starts = array("I", [0])
+    tag_refs = array("I")
+    for video_id, (title, tags) in videos.items():
+        strings.append(title.encode("utf-8"))
+        strings.append(video_id.encode("utf-8"))
+        tag_refs.extend(tag_ids[tag] for tag in tags)
+        tag_starts.append(len(tag_refs))
+
+    string_offsets = array("Q", [0])
+    for string in strings:
+        string_offsets.append(string_offsets[-1] + len(string))
+
+    keys = list(videos.items())
+    title_order = array("I", sorted(range(len(keys)), key=lambda i: (keys[i][1][0], keys[i][0])))
+    id_order = array("I", sorted(range(len(keys)), key=lambda i: keys[i][0]))
+
+    header = _HEADER.pack(MAGIC, VERSION, sys.byteorder == "little", len(videos), len(tag_ids),
+                          len(tag_refs), source_stat.st_size, source_stat.st_mtime_ns)
+    temp_path = Path(str(snapshot_path) + ".tmp")
+    with open(temp_path, "wb") as snapshot:
+        for section in (header, string_offsets, tag_starts, tag_refs, title_order, id_order):
+            data = bytes(section)
+            snapshot.write(data + bytes(_aligned(len(data)) - len(data)))
+        snapshot.write(b"".join(strings))
+    os.replace(temp_path, snapshot_path) # Never leave a half written snapshot behind
+    return snapshot_path
+
+
+class CatalogSnapshot:
+    """A class used to read videos out of a compiled catalog snapshot.
+
+    Works as a source for LazyCatalog, and can be iterated to load every
+    video. Raises ValueError if the file isn't a snapshot this version
+    can read.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as snapshot:
+            self._map = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < _HEADER.size:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        (magic, version, little_endian, self._count, tag_count, tag_ref_count,
+         self.source_size, self.source_mtime_ns) = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION or little_endian != (sys.byteorder == "little"):
+            raise ValueError(f"{path} is not a version {VERSION} catalog snapshot")
+
+        # Views straight into the mapped file, nothing is copied
+        view = memoryview(self._map)
+        position = _aligned(_HEADER.size)
+        sections = []
+        for typecode, length in (("Q", tag_count + 2 * self._count + 1), ("I", self._count + 1),
+                                 ("I", tag_ref_count), ("I", self._count), ("I", self._count)):
+            size = length * array(typecode).itemsize
+            sections.append(view[position:position + size].cast(typecode))
+            position += _aligned(size)
+        self._string_offsets, self._tag_starts, self._tag_refs, self._title_order, self._id_order = sections
+        self._strings_start = position
+
+        self._tag_count = tag_count
+        self._tags = [None] * tag_count # decoded tag strings, filled in as they are used
+        self._tag_tuples = {}
+
+    def is_current(self, catalog_path):
+        """Returns True if the snapshot was compiled from the catalog as it is now."""
+        try:
+            source_stat = os.stat(catalog_path)
+        except FileNotFoundError:
+            return True # Nothing newer to fall back to
+        return (source_stat.st_size, source_stat.st_mtime_ns) == (self.source_size, self.source_mtime_ns)
+
+    def __len__(self):
+        return self._count
+
+    def _string(self, i):
+        start = self._strings_start
+        return self._map[start + self._string_offsets[i]:start + self._string_offsets[i + 1]].decode("utf-8")
+
+    def _tag(self, tag_id):
+        tag = self._tags[tag_id]
+        if tag is None:
+            tag = self._tags[tag_id] = sys.intern(self._string(tag_id))
+        return tag
+
+    def _title(self, i):
+        return self._string(self._tag_count + 2 * i)
+
+    def _video_id(self, i):
+        return self._string(self._tag_count + 2 * i + 1)
+
+    def find(self, video_id):
+        """Returns the position of video_id in the snapshot, None if it isn't there."""
+        low, high = 0, self._count
+        while low < high: # Binary search over the ids in sorted order
+            middle = (low + high) // 2
+            if self._video_id(self._id_order[middle]) < video_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._video_id(self._id_order[low]) == video_id:
+            return self._id_order[low]
+        return None
+
+    def read(self, i):
+        """Returns (title, video_id, tags) for the video at position i."""
+        tags = tuple(self._tag(tag_id)
+                     for tag_id in self._tag_refs[self._tag_starts[i]:self._tag_starts[i + 1]])
+        return self._title(i), self._video_id(i), self._tag_tuples.setdefault(tags, tags)
+
+    def ids(self):
+        """Yields the video ids in catalog order."""
+        return (self._video_id(i) for i in range(self._count))
+
+    def records(self):
+        """Yields (title, video_id, tags) for every video in catalog order."""
+        return (self.read(i) for i in range(self._count))
+
+    __iter__ = records
+
+    def keys_by_title(self):
+        """Yields every (title, video_id) pair sorted by title, using the
+        order worked out when the snapshot was compiled."""
+        return ((self._title(i), self._video_id(i)) for i in self._title_order)
+
+
+def open_snapshot(catalog_path):
+    """Returns the CatalogSnapshot for a catalog file if there is an
+    up to date one, else None so the caller can parse the text instead."""
+    try:
+        snapshot = CatalogSnapshot(snapshot_path_for(catalog_path))
+    except (OSError, ValueError):
+        return None
+    return snapshot if snapshot.is_current(catalog_path) else None
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Compiles a videos.txt catalog into a snapshot.")
+    arg_parser.add_argument("catalog", nargs="?", default=Path(__file__).parent / "videos.txt")
+    arg_parser.add_argument("--output", help="where to write the snapshot, next to the catalog by default")
+    args = arg_parser.parse_args()
+    print(f"Compiled snapshot: {compile_snapshot(args.catalog, args.output)}")
@@ -0,0 +1,89 @@
+"""A catalog file watcher class."""
+
+import contextlib
+import os
+import sys
+import threading
+
+
+class CatalogWatcher:
+    """A class used to reload a library whenever its catalog file changes.
+
+    A background thread checks the file's size and modification time every
+    interval seconds. Once a change has stayed the same for one check (so
+    the file isn't still being written), the new catalog is read and
+    compared with the library in the background, and only applying the
+    differences waits for the lock commands run under.
+    """
+
+    def __init__(self, video_library, video_player, lock=None, reload_lock=None, interval=1.0):
+        """
+        Args:
+            video_library: The library to reload, from its catalog_path.
+            video_player: The player applying the changes, so its
+                playlists and current video follow them.
+            lock: Held while the changes are applied, the one commands are
+                run under. None if nothing else uses the library at the
+                same time.
+            reload_lock: Held from reading the catalog until the changes
+                are applied, the one other reloads of the library hold, so
+                none of them compares against a library about to change.
+                None if nothing else reloads it.
+            interval: Seconds between checks of the file.
+        """
+        self._library = video_library
+        self._player = video_player
+        self._lock = lock if lock is not None else contextlib.nullcontext()
+        self._reload_lock = reload_lock if reload_lock is not None else contextlib.nullcontext()
+        self._interval = interval
+        self._loaded = self._stat() # The version of the file the library has
+        self._pending = None # A new version seen on the last check
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _stat(self):
+        try:
+            stat = os.stat(self._library.catalog_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def check(self):
+        """Reloads the library if the catalog file has changed and settled.
+
+        Returns:
+            The CatalogChanges applied, None if nothing was reloaded.
+        """
+        stat = self._stat()
+        if stat is None or stat == self._loaded:
+            self._pending = None
+            return None
+        if stat != self._pending: # Still being written, maybe
+            self._pending = stat
+            return None
+
+        self._loaded, self._pending = stat, None
+        with self._reload_lock:
+            try:
+                changes = self._library.read_changes()
+            except (OSError, ValueError) as e:
+                print(f"Cannot reload library: {e}", file=sys.stderr)
+                return None
+            with self._lock:
+                self._player.apply_library_changes(changes)
+        return changes
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            self.check()
+
+    def start(self):
+        """Starts checking the file in a background thread."""
+        self._thread = threading.Thread(target=self._run, name="CatalogWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops checking the file."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -1,163 +1,407 @@
-"""A command parser class."""
-
-import textwrap
-from typing import Sequence
-
-
-class CommandException(Exception):
-    """A class used to represent a wrong command exception."""
-    pass
-
-
-class CommandParser:
-    """A class used to parse and execute a user Command."""
-
-    def __init__(self, video_player):
-        self._player = video_player
-
-    def execute_command(self, command: Sequence[str]):
-        """Executes the user command. Expects the command to be upper case.
-           Raises CommandException if a command cannot be parsed.
-        """
-        if not command:
-            raise CommandException(
-                "Please enter a valid command, "
-                "type HELP for a list of available commands.")
-
-        if command[0].upper() == "NUMBER_OF_VIDEOS":
-            self._player.number_of_videos()
-
-        elif command[0].upper() == "SHOW_ALL_VIDEOS":
-            self._player.show_all_videos()
-
-        elif command[0].upper() == "PLAY":
-            if len(command) != 2:
-                raise CommandException(
-                    "Please enter PLAY command followed by video_id.")
-            self._player.play_video(command[1])
-
-        elif command[0].upper() == "PLAY_RANDOM":
-            self._player.play_random_video()
-
-        elif command[0].upper() == "STOP":
-            self._player.stop_video()
-
-        elif command[0].upper() == "PAUSE":
-            self._player.pause_video()
-
-        elif command[0].upper() == "CONTINUE":
-            self._player.continue_video()
-
-        elif command[0].upper() == "SHOW_PLAYING":
-            self._player.show_playing()
-
-        elif command[0].upper() == "CREATE_PLAYLIST":
-            if len(command) != 2:
-                raise CommandException(
-                    "Please enter CREATE_PLAYLIST command followed by a "
-                    "playlist name.")
-            self._player.create_playlist(command[1])
-
-        elif command[0].upper() == "ADD_TO_PLAYLIST":
-            if len(command) != 3:
-                raise CommandException(
-                    "Please enter ADD_TO_PLAYLIST command followed by a "
-                    "playlist name and video_id to add.")
-            self._player.add_to_playlist(command[1], command[2])
-
-        elif command[0].upper() == "REMOVE_FROM_PLAYLIST":
-            if len(command) != 3:
-                raise CommandException(
-                    "Please enter REMOVE_FROM_PLAYLIST command followed by a "
-                    "playlist name and video_id to remove.")
-            self._player.remove_from_playlist(command[1], command[2])
-
-        elif command[0].upper() == "CLEAR_PLAYLIST":
-            if len(command) != 2:
-                raise CommandException(
-                    "Please enter CLEAR_PLAYLIST command followed by a "
-                    "playlist name.")
-            self._player.clear_playlist(command[1])
-
-        elif command[0].upper() == "DELETE_PLAYLIST":
-            if len(command) != 2:
-                raise CommandException(
-                    "Please enter DELETE_PLAYLIST command followed by a "
-                    "playlist name.")
-            self._player.delete_playlist(command[1])
-
-        elif command[0].upper() == "SHOW_PLAYLIST":
-            if len(command) != 2:
-                raise CommandException(
-                    "Please enter SHOW_PLAYLIST command followed by a "
-                    "playlist name.")
-            self._player.show_playlist(command[1])
-
-        elif command[0].upper() == "SHOW_ALL_PLAYLISTS":
-            self._player.show_all_playlists()
-
-        elif command[0].upper() == "SEARCH_VIDEOS":
-            if len(command) != 2:
-                raise CommandException(
-                    "Please enter SEARCH_VIDEOS command followed by a "
-                    "search term.")
-            self._player.search_videos(command[1])
-
-        elif command[0].upper() == "SEARCH_VIDEOS_WITH_TAG":
-            if len(command) != 2:
-                raise CommandException(
-                    "Please enter SEARCH_VIDEOS_WITH_TAG command followed by a "
-                    "video tag.")
-            self._player.search_videos_tag(command[1])
-
-        elif command[0].upper() == "FLAG_VIDEO":
-            if len(command) == 3:
-                self._player.flag_video(command[1], command[2])
-            elif len(command) == 2:
-                self._player.flag_video(command[1])
-            else:
-                raise CommandException(
-                    "Please enter FLAG_VIDEO command followed by a "
-                    "video_id and an optional flag reason.")
-
-        elif command[0].upper() == "ALLOW_VIDEO":
-            if len(command) != 2:
-                raise CommandException(
-                    "Please enter ALLOW_VIDEO command followed by a "
-                    "video_id.")
-            self._player.allow_video(command[1])
-
-        elif command[0].upper() == "HELP":
-            self._get_help()
-        else:
-            print(
-                "Please enter a valid command, type HELP for a list of "
-                "available commands.")
-
-    def _get_help(self):
-        """Displays all available commands to the user."""
-        help_text = textwrap.dedent("""
-        Available commands:
-            NUMBER_OF_VIDEOS - Shows how many videos are in the library.
-            SHOW_ALL_VIDEOS - Lists all videos from the library.
-            PLAY <video_id> - Plays specified video.
-            PLAY_RANDOM - Plays a random video from the library.
-            STOP - Stop the current video.
-            PAUSE - Pause the current video.
-            CONTINUE - Resume the current paused video.
-            SHOW_PLAYING - Displays the title, url and paused status of the video that is currently playing (or paused).
-            CREATE_PLAYLIST <playlist_name> - Creates a new (empty) playlist with the provided name.
-            ADD_TO_PLAYLIST <playlist_name> <video_id> - Adds the requested video to the playlist.
-            REMOVE_FROM_PLAYLIST <playlist_name> <video_id> - Removes the specified video from the specified playlist
-            CLEAR_PLAYLIST <playlist_name> - Removes all the videos from the playlist.
-            DELETE_PLAYLIST <playlist_name> - Deletes the playlist.
-            SHOW_PLAYLIST <playlist_name> - List all the videos in this playlist.
-            SHOW_ALL_PLAYLISTS - Display all the available playlists.
-            SEARCH_VIDEOS <search_term> - Display all the videos whose titles contain the search_term.
-            SEARCH_VIDEOS_WITH_TAG <tag_name> -Display all videos whose tags contains the provided tag.
-            FLAG_VIDEO <video_id> <flag_reason> - Mark a video as flagged.
-            ALLOW_VIDEO <video_id> - Removes a flag from a video.
-            HELP - Displays help.
-            EXIT - Terminates the program execution.
-        """)
-        print(help_text)
+"""A command parser class."""
+
+from collections import namedtuple
+from itertools import chain
+from typing import Sequence
+import cProfile
+import pstats
+import sys
+import time
+
+
+class CommandException(Exception):
+    """A class used to represent a wrong command exception."""
+    pass
+
+
+# What the parser knows about a command:
+#   handler - called with the command's arguments, and its options as keyword arguments
+#   usage - how the command is written, shown in HELP
+#   description - what the command does, shown in HELP
+#   min_args, max_args - how many arguments it takes (max_args None for no limit)
+#   error - message for the wrong number of arguments, None to ignore extra arguments instead
+#   options - --name options it takes, name -> function turning the value into the keyword argument
+Command = namedtuple("Command", "handler usage description min_args max_args error options")
+
+
+def _whole_number(minimum, description):
+    """Returns an option parser for whole numbers of at least minimum."""
+    def parse(option, value):
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            number = minimum - 1
+        if number < minimum:
+            raise CommandException(f"Please enter a {description} whole number after --{option}.")
+        return number
+    return parse
+
+
+def _tag_weights(option, value):
+    """Parses --weights #tag=weight,#tag=weight into a dict."""
+    weights = {}
+    try:
+        for pair in value.split(","):
+            tag, weight = pair.split("=")
+            weights[tag] = float(weight)
+    except (AttributeError, ValueError):
+        weights = None
+    if not weights or any(weight < 0 for weight in weights.values()):
+        raise CommandException(f"Please enter --{option} as a list like #tag=2,#other_tag=0.5.")
+    return weights
+
+
+def _text(option, value):
+    """Parses an option whose value is any word."""
+    if value is None:
+        raise CommandException(f"Please enter a value after --{option}.")
+    return value
+
+
+def _argument_kind(usage, position):
+    """Returns what the argument at position (0 for the first) of a command
+    is, going by its usage, e.g. "<video_id>". None if it takes no such argument."""
+    kinds = []
+    words = iter(usage.split()[1:])
+    for word in words:
+        if word.startswith("[--"): # An option, and its value
+            next(words, None)
+        elif word.strip("[]").startswith("<"):
+            kinds.append(word.strip("[]"))
+    if position < len(kinds):
+        return kinds[position]
+    if "..." in usage and kinds: # The last one repeats
+        return kinds[-1]
+    return None
+
+
+PAGE_OPTIONS = {
+    "limit": _whole_number(1, "positive"),
+    "offset": _whole_number(0, "non-negative"),
+}
+
+SEARCH_OPTIONS = dict(PAGE_OPTIONS, facets=_whole_number(1, "positive"))
+
+
+class CommandParser:
+    """A class used to parse and execute a user Command."""
+
+    def __init__(self, video_player, metrics=None):
+        """
+        Args:
+            video_player: The VideoPlayer the commands are run on.
+            metrics: A Metrics to count and time every command in, None to
+                not measure anything.
+        """
+        self._player = video_player
+        self._metrics = metrics
+        if metrics is not None:
+            metrics.define("yt_commands_total", "counter", "Commands run.")
+            metrics.define("yt_command_errors_total", "counter", "Commands rejected with an error message.")
+            metrics.define("yt_command_duration_seconds", "histogram", "Time taken to run a command.")
+        self._commands = {} # command name -> Command, in the order HELP lists them
+        self._register_player_commands()
+
+    def register_command(self, name, handler, usage, description,
+                         min_args=0, max_args=0, error=None, options=None):
+        """Adds a command, or replaces the one with the same name.
+
+        Args:
+            name: The command name, matched ignoring case.
+            handler: Called with the command's arguments, and its options as
+                keyword arguments.
+            usage: How the command is written, e.g. "PLAY <video_id>".
+            description: What the command does.
+            min_args: The fewest arguments the command takes.
+            max_args: The most arguments the command takes, None for no limit.
+            error: Message for the wrong number of arguments. None to drop any
+                extra arguments instead.
+            options: The --name options the command takes, as a dict of
+                name -> function(name, value) returning the parsed value.
+        """
+        self._commands[name.upper()] = Command(
+            handler, usage, description, min_args, max_args, error, options or {})
+
+    def _register_player_commands(self):
+        """Registers the commands of the video player."""
+        player = self._player
+        self.register_command(
+            "NUMBER_OF_VIDEOS", player.number_of_videos, "NUMBER_OF_VIDEOS",
+            "Shows how many videos are in the library.")
+        self.register_command(
+            "SHOW_ALL_VIDEOS", player.show_all_videos, "SHOW_ALL_VIDEOS [--limit <n>] [--offset <n>]",
+            "Lists all videos from the library, a page at a time if given a limit.",
+            options=PAGE_OPTIONS)
+        self.register_command(
+            "NEXT_PAGE", player.show_next_page, "NEXT_PAGE",
+            "Shows the next page of the last listing or search given a limit.")
+        self.register_command(
+            "PLAY", player.play_video, "PLAY <video_id>",
+            "Plays specified video.", 1, 1,
+            "Please enter PLAY command followed by video_id.")
+        self.register_command(
+            "PLAY_RANDOM", player.play_random_video, "PLAY_RANDOM [--seed <n>] [--weights <tag>=<weight>,...]",
+            "Plays a random video from the library, videos with a tag given a bigger weight are picked more often.",
+            options={"seed": _whole_number(0, "non-negative"), "weights": _tag_weights})
+        self.register_command(
+            "STOP", player.stop_video, "STOP",
+            "Stop the current video.")
+        self.register_command(
+            "PAUSE", player.pause_video, "PAUSE",
+            "Pause the current video.")
+        self.register_command(
+            "CONTINUE", player.continue_video, "CONTINUE",
+            "Resume the current paused video.")
+        self.register_command(
+            "SHOW_PLAYING", player.show_playing, "SHOW_PLAYING",
+            "Displays the title, url and paused status of the video that is currently playing (or paused).")
+        self.register_command(
+            "CREATE_PLAYLIST", player.create_playlist, "CREATE_PLAYLIST <playlist_name>",
+            "Creates a new (empty) playlist with the provided name.", 1, 1,
+            "Please enter CREATE_PLAYLIST command followed by a "
+            "playlist name.")
+        self.register_command(
+            "ADD_TO_PLAYLIST", player.add_to_playlist, "ADD_TO_PLAYLIST <playlist_name> <video_id> [<video_id> ...]",
+            "Adds the requested videos to the playlist.", 2, None,
+            "Please enter ADD_TO_PLAYLIST command followed by a "
+            "playlist name and video_id to add.")
+        self.register_command(
+            "REMOVE_FROM_PLAYLIST", player.remove_from_playlist, "REMOVE_FROM_PLAYLIST <playlist_name> <video_id>",
+            "Removes the specified video from the specified playlist", 2, 2,
+            "Please enter REMOVE_FROM_PLAYLIST command followed by a "
+            "playlist name and video_id to remove.")
+        self.register_command(
+            "CLEAR_PLAYLIST", player.clear_playlist, "CLEAR_PLAYLIST <playlist_name>",
+            "Removes all the videos from the playlist.", 1, 1,
+            "Please enter CLEAR_PLAYLIST command followed by a "
+            "playlist name.")
+        self.register_command(
+            "DELETE_PLAYLIST", player.delete_playlist, "DELETE_PLAYLIST <playlist_name>",
+            "Deletes the playlist.", 1, 1,
+            "Please enter DELETE_PLAYLIST command followed by a "
+            "playlist name.")
+        self.register_command(
+            "SHOW_PLAYLIST", player.show_playlist, "SHOW_PLAYLIST <playlist_name>",
+            "List all the videos in this playlist.", 1, 1,
+            "Please enter SHOW_PLAYLIST command followed by a "
+            "playlist name.")
+        self.register_command(
+            "SHOW_ALL_PLAYLISTS", player.show_all_playlists, "SHOW_ALL_PLAYLISTS",
+            "Display all the available playlists.")
+        self.register_command(
+            "SEARCH_VIDEOS", player.search_videos,
+            "SEARCH_VIDEOS <search_term> [--limit <n>] [--offset <n>] [--facets <n>]",
+            "Display all the videos whose titles contain the search_term, "
+            "and the n tags most of them have if given --facets.", 1, 1,
+            "Please enter SEARCH_VIDEOS command followed by a "
+            "search term.",
+            SEARCH_OPTIONS)
+        self.register_command(
+            "SEARCH_VIDEOS_WITH_TAG", player.search_videos_tag,
+            "SEARCH_VIDEOS_WITH_TAG <tag_name> [--limit <n>] [--offset <n>] [--facets <n>]",
+            "Display all videos whose tags contains the provided tag. "
+            "Join tags with & to match all of them or | to match any.", 1, 1,
+            "Please enter SEARCH_VIDEOS_WITH_TAG command followed by a "
+            "video tag.",
+            SEARCH_OPTIONS)
+        self.register_command(
+            "SEARCH_VIDEOS_RANKED", player.search_videos_ranked,
+            "SEARCH_VIDEOS_RANKED <word> [<word> ...] [--top <n>] [--limit <n>] [--offset <n>]",
+            "Display the videos whose titles best match the words, best first, allowing for typos.", 1, None,
+            "Please enter SEARCH_VIDEOS_RANKED command followed by a "
+            "search term.",
+            dict(PAGE_OPTIONS, top=_whole_number(1, "positive")))
+        self.register_command(
+            "SHOW_RELATED", player.show_related, "SHOW_RELATED <video_id> [--top <n>]",
+            "Display the videos sharing the most tags with a video, most related first.", 1, 1,
+            "Please enter SHOW_RELATED command followed by a video_id.",
+            {"top": _whole_number(1, "positive")})
+        self.register_command(
+            "COMPLETE", player.complete, "COMPLETE <prefix> [--top <n>]",
+            "Shows the video ids, titles and playlist names starting with the prefix.", 1, None,
+            "Please enter COMPLETE command followed by the start of a "
+            "video id, title or playlist name.",
+            {"top": _whole_number(1, "positive")})
+        self.register_command(
+            "FLAG_VIDEO", player.flag_video, "FLAG_VIDEO <video_id> <flag_reason>",
+            "Mark a video as flagged.", 1, 2,
+            "Please enter FLAG_VIDEO command followed by a "
+            "video_id and an optional flag reason.")
+        self.register_command(
+            "ALLOW_VIDEO", player.allow_video, "ALLOW_VIDEO <video_id>",
+            "Removes a flag from a video.", 1, 1,
+            "Please enter ALLOW_VIDEO command followed by a "
+            "video_id.")
+        self.register_command(
+            "FLAG_VIDEOS", player.flag_videos,
+            "FLAG_VIDEOS [<video_id> ...] [--tag <tag_name>] [--reason <flag_reason>]",
+            "Mark several videos, or every video with a tag, as flagged.", 0, None,
+            options={"tag": _text, "reason": _text})
+        self.register_command(
+            "ALLOW_VIDEOS", player.allow_videos,
+            "ALLOW_VIDEOS [<video_id> ...] [--tag <tag_name>]",
+            "Removes the flag from several videos, or every flagged video with a tag.", 0, None,
+            options={"tag": _text})
+        self.register_command(
+            "SHOW_FLAGGED", player.show_flagged, "SHOW_FLAGGED",
+            "Display all the flagged videos and their flag reasons.")
+        self.register_command(
+            "RELOAD_LIBRARY", player.reload_library, "RELOAD_LIBRARY [<catalog_path>]",
+            "Reads the video catalog again and applies the videos added, removed or changed in it.", 0, 1,
+            "Please enter RELOAD_LIBRARY command followed by an optional catalog path.")
+        self.register_command(
+            "STATS", self._get_stats, "STATS [<file>]",
+            "Shows how often and how fast each command ran, or writes every metric to the file.", 0, 1,
+            "Please enter STATS command followed by an optional file name.")
+        self.register_command(
+            "PROFILE", self._profile, "PROFILE <command>",
+            "Runs the command and shows where its time went.", 1, None,
+            "Please enter PROFILE command followed by the command to profile.")
+        self.register_command(
+            "HELP", self._get_help, "HELP",
+            "Displays help.")
+
+    def execute_command(self, command: Sequence[str]):
+        """Executes the user command. Expects the command to be upper case.
+           Raises CommandException if a command cannot be parsed.
+        """
+        if self._metrics is not None:
+            return self._execute_measured(command)
+        return self._execute(command)
+
+    def _execute_measured(self, command):
+        """Executes the user command, counting and timing it."""
+        name = command[0].upper() if command else ""
+        labels = (("command", name if name in self._commands else "UNKNOWN"),) # Don't make a label per typo
+        start = time.perf_counter()
+        try:
+            self._execute(command)
+        except CommandException:
+            self._metrics.inc("yt_command_errors_total", labels)
+            raise
+        finally:
+            self._metrics.observe("yt_command_duration_seconds", labels, time.perf_counter() - start)
+            self._metrics.inc("yt_commands_total", labels)
+
+    def _execute(self, command):
+        if not command:
+            raise CommandException(
+                "Please enter a valid command, "
+                "type HELP for a list of available commands.")
+
+        spec = self._commands.get(command[0].upper())
+        if spec is None:
+            print(
+                "Please enter a valid command, type HELP for a list of "
+                "available commands.")
+            return
+
+        args, options = self._parse_options(list(command[1:]), spec.options)
+        if len(args) < spec.min_args or (spec.max_args is not None and len(args) > spec.max_args):
+            if spec.error is not None:
+                raise CommandException(spec.error)
+            args = args[:spec.max_args] # Commands without an error message never minded extra words
+        spec.handler(*args, **options)
+
+    def _parse_options(self, words, options):
+        """Takes the --name value options a command accepts out of its words.
+
+        Returns:
+            The arguments left, and the options as keyword arguments for
+            the handler.
+        """
+        if not options:
+            return words, {}
+
+        args, parsed = [], {}
+        words = iter(words)
+        for word in words:
+            name = word[2:].lower()
+            if word.startswith("--") and name in options:
+                parsed[name] = options[name](name, next(words, None))
+            else:
+                args.append(word)
+        return args, parsed
+
+    def complete(self, words, prefix, k=50):
+        """Returns what the word being typed could be, for tab completion.
+
+        The first word completes to a command name. After it, a word where
+        the command's usage has a <video_id> completes to a video id, and
+        one where it has a <playlist_name> to a playlist name.
+
+        Args:
+            words: The words before the one being typed.
+            prefix: What has been typed of the word.
+            k: The most completions to return.
+
+        Returns:
+            A list of the words it could be, in order.
+        """
+        if not words:
+            return sorted(name for name in chain(self._commands, ["EXIT"]) if name.startswith(prefix.upper()))[:k]
+
+        spec = self._commands.get(words[0].upper())
+        if spec is None or words[-1].startswith("--"): # No such command, or an option's value
+            return []
+        position = 0
+        option_value = False
+        for word in words[1:]:
+            if option_value:
+                option_value = False
+            elif word.startswith("--") and word[2:].lower() in spec.options:
+                option_value = True
+            else:
+                position += 1
+
+        kind = _argument_kind(spec.usage, position)
+        session = self._player.session
+        if kind == "<video_id>":
+            return session.video_library.complete_video_ids(prefix, k)
+        if kind == "<playlist_name>":
+            return session.complete_playlist_names(prefix, k)
+        return []
+
+    def _get_stats(self, file_name=None):
+        """Displays the command statistics, or writes every metric to a file."""
+        if self._metrics is None:
+            print("Metrics are not being collected, start with --metrics to collect them")
+            return
+
+        if file_name is not None:
+            try:
+                self._metrics.write(file_name)
+            except OSError as e:
+                print(f"Cannot write metrics: {e}")
+                return
+            print(f"Wrote metrics to {file_name}")
+            return
+
+        print("Command statistics:")
+        for labels, histogram in sorted(self._metrics.histograms("yt_command_duration_seconds").items()):
+            errors = self._metrics.value("yt_command_errors_total", labels)
+            print(f"    {labels[0][1]} - {histogram.count} runs, {errors} errors, "
+                  f"mean {histogram.sum / histogram.count * 1000:.3f} ms, "
+                  f"p50 <= {histogram.quantile(0.5) * 1000:g} ms, p99 <= {histogram.quantile(0.99) * 1000:g} ms")
+        print("Other statistics:")
+        for line in self._metrics.describe(skip=("yt_commands_total", "yt_command_errors_total")):
+            print(f"    {line}")
+
+    def _profile(self, *command):
+        """Runs a command under cProfile, then displays the functions it spent the most time in."""
+        if command[0].upper() == "PROFILE":
+            raise CommandException("Please enter PROFILE command followed by the command to profile.")
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            self.execute_command(list(command))
+        finally:
+            profiler.disable()
+        stats = pstats.Stats(profiler, stream=sys.stdout)
+        stats.sort_stats("cumulative").print_stats(15)
+
+    def _get_help(self):
+        """Displays all available commands to the user."""
+        lines = [f"    {spec.usage} - {spec.description}" for spec in self._commands.values()]
+        lines.append("    EXIT - Terminates the program execution.") # Handled by run.py, not the parser
+        print("\nAvailable commands:\n" + "\n".join(lines) + "\n")
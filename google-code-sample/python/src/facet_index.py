@@ -0,0 +1,205 @@
+"""A facet index class."""
+
+from bisect import insort
+from collections import Counter
+from functools import reduce
+from itertools import chain
+from operator import and_, or_
+
+from .related_index import signature_of
+from .tag_index import TagIndex
+
+BITSET_RATIO = 16 # Count results with bitsets once they are over 1/this of the library
+
+
+def top_facets(counts, k=10):
+    """Returns the k (tag, count) pairs of a dict of tag -> count with the
+    biggest counts, ties in tag order, leaving out tags with none.
+
+    Args:
+        counts: Dict (or Counter) of tag -> count.
+        k: How many tags to return, None for every tag.
+    """
+    facets = sorted((item for item in counts.items() if item[1] > 0), key=lambda item: (-item[1], item[0]))
+    return facets if k is None else facets[:k]
+
+
+def count_tags(videos):
+    """Counts the videos with each tag by reading every video's tags, for a
+    library without the index.
+
+    Args:
+        videos: Iterable of Video objects.
+
+    Returns:
+        A Counter of normalized tag -> videos with it.
+    """
+    return Counter(chain.from_iterable(signature_of(video.tags) for video in videos))
+
+
+class FacetIndex:
+    """A class used to count how many videos have each tag.
+
+    It keeps the number of playable (unflagged) videos with each tag up to
+    date as videos are added, removed, flagged and allowed, and counts the
+    tags of a set of videos (the results of a search) in one of two ways:
+
+    A few results are counted by adding up the normalized tags (signature)
+    kept for every video, which Counter does without running any Python per
+    video, though looking up each one's signature still takes a while.
+
+    Many results, up to most of the library, are counted with bitsets
+    instead. Each video has a bit position, and a tag's bitset (a Python
+    int) has the bits of its playable videos set, so the count for a tag is
+    the number of bits set in its bitset AND the results' one, which for a
+    tag search is the AND (or OR) of the searched tags' bitsets. Only the
+    top k tags are wanted: the tags are tried most common first, and as no
+    tag can be on more results than it is on playable videos, trying stops
+    at the first tag that couldn't make the top k. A tag's bitset is made
+    from the tag index the first time it is needed, then kept, with changes
+    to it saved up until it is next used.
+    """
+
+    def __init__(self, videos_with_tag):
+        """
+        Args:
+            videos_with_tag: Function returning the ids of the videos (flagged
+                or not) with a normalized tag, e.g. TagIndex.videos_with_tag.
+        """
+        self._videos_with_tag = videos_with_tag
+        self._counts = {} # tag -> playable videos with it
+        self._signatures = {} # video_id -> its normalized tags
+        self._shared = {} # tags as given -> their signature, so videos share one tuple
+        self._flagged = set()
+        self._positions = {} # video_id -> bit
+        self._free = [] # bits of removed videos, handed out again
+        self._bits = {} # tag -> bitset of its playable videos, for the tags used so far
+        self._pending = {} # tag -> {bit: set or not} not in its bitset yet
+
+    @property
+    def counts(self):
+        """Dict of normalized tag -> how many playable videos have it. Not to be changed."""
+        return self._counts
+
+    def add(self, video_id, tags, flagged=False):
+        """Adds a video.
+
+        Args:
+            video_id: The video url, not in the index.
+            tags: The tags of the video.
+            flagged: Whether the video is flagged.
+        """
+        key = tuple(tags)
+        signature = self._shared.get(key)
+        if signature is None:
+            signature = self._shared[key] = signature_of(tags)
+        self._signatures[video_id] = signature
+        self._positions[video_id] = self._free.pop() if self._free else len(self._positions)
+        if flagged:
+            self._flagged.add(video_id)
+        else:
+            self._playable(video_id, True)
+
+    def remove(self, video_id):
+        """Removes a video."""
+        if video_id not in self._signatures:
+            return
+        if video_id in self._flagged:
+            self._flagged.discard(video_id)
+        else:
+            self._playable(video_id, False)
+        del self._signatures[video_id]
+        self._free.append(self._positions.pop(video_id))
+
+    def flag(self, video_id):
+        """Takes a flagged video out of the counts."""
+        if video_id in self._signatures and video_id not in self._flagged:
+            self._flagged.add(video_id)
+            self._playable(video_id, False)
+
+    def allow(self, video_id):
+        """Puts a video whose flag was removed back in the counts."""
+        if video_id in self._flagged:
+            self._flagged.discard(video_id)
+            self._playable(video_id, True)
+
+    def _playable(self, video_id, playable):
+        """Counts a video in or out of its tags."""
+        change = 1 if playable else -1
+        position = self._positions[video_id]
+        for tag in self._signatures[video_id]:
+            count = self._counts[tag] = self._counts.get(tag, 0) + change
+            if not count:
+                del self._counts[tag]
+            if tag in self._bits:
+                self._pending.setdefault(tag, {})[position] = playable
+
+    def count(self, video_ids, k=10, tags=None, match_all=True):
+        """Returns the top k tags of some playable videos.
+
+        Args:
+            video_ids: A list or set of the ids of the videos, all of them in
+                the index and not flagged.
+            k: How many tags to return, None for every tag.
+            tags: The tags of the tag search the videos are the results of,
+                if they are, so the results' bitset can be made from theirs.
+            match_all: True if the search was for videos having every tag,
+                False for videos having any of them.
+
+        Returns:
+            A list of (normalized tag, videos with it), most videos first,
+            ties in tag order.
+        """
+        # The bitsets are as long as the library whatever the results, so
+        # only use them once reading the results' signatures would cost more
+        if k is None or len(video_ids) * BITSET_RATIO < len(self._positions):
+            return top_facets(Counter(chain.from_iterable(map(self._signatures.__getitem__, video_ids))), k)
+
+        if tags is not None:
+            results = reduce(and_ if match_all else or_, (self._bitset(TagIndex.normalize(tag)) for tag in tags))
+        else:
+            results = bytearray(self._length())
+            for position in map(self._positions.__getitem__, video_ids):
+                results[position >> 3] |= 1 << (position & 7)
+            results = int.from_bytes(results, "little")
+
+        best = [] # (-count, tag) of the top k so far, best first
+        for tag, playable in sorted(self._counts.items(), key=lambda item: (-item[1], item[0])):
+            if len(best) == k and (-playable, tag) > best[-1]:
+                break # Not even on all of the results would it make the top k, nor would any after it
+            count = (self._bitset(tag) & results).bit_count()
+            if count:
+                insort(best, (-count, tag))
+                del best[k:]
+        return [(tag, -count) for count, tag in best]
+
+    def _length(self):
+        """Returns how many bytes a bitset of every position takes."""
+        return (len(self._positions) + len(self._free) + 7) // 8
+
+    def _bitset(self, tag):
+        """Returns the bitset of the playable videos with a normalized tag,
+        making it or applying the changes saved up for it first."""
+        bits = self._bits.get(tag)
+        if bits is None:
+            if tag not in self._counts:
+                return 0
+            positions = self._positions
+            flagged = self._flagged
+            bits = bytearray(self._length())
+            for video_id in self._videos_with_tag(tag):
+                if video_id not in flagged:
+                    position = positions[video_id]
+                    bits[position >> 3] |= 1 << (position & 7)
+            bits = self._bits[tag] = int.from_bytes(bits, "little")
+        elif tag in self._pending:
+            # One copy for every change since the tag was last used
+            pending = self._pending.pop(tag)
+            bits = bytearray(bits.to_bytes(self._length(), "little"))
+            for position, playable in pending.items():
+                if playable:
+                    bits[position >> 3] |= 1 << (position & 7)
+                else:
+                    bits[position >> 3] &= ~(1 << (position & 7)) & 0xFF
+            bits = self._bits[tag] = int.from_bytes(bits, "little")
+        return bits
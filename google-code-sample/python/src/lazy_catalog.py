@@ -0,0 +1,179 @@
+"""A lazily loaded video catalog class."""
+
+from .catalog_file import parse_line
+from .video import Video
+from collections import OrderedDict
+from heapq import merge
+import mmap
+import weakref
+
+
+class TextCatalogSource:
+    """A class used to find videos in a memory-mapped videos.txt file.
+
+    The file is scanned once to index video_id -> byte offset of its line,
+    lines are only parsed again when a video is read.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # An empty file can't be mapped
+            self._map = None
+
+        self._offsets = {} # video_id -> byte offset of its line
+        for offset, line in self._lines():
+            fields = parse_line(line)
+            if fields is not None:
+                # A repeated id replaces the earlier line, like a dict would
+                self._offsets[fields[1]] = offset
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def _lines(self):
+        """Yields (offset, raw line) for every line of the catalog file."""
+        if self._map is None:
+            return
+        offset = 0
+        while offset < len(self._map):
+            end = self._map.find(b"\n", offset)
+            end = len(self._map) if end == -1 else end + 1
+            yield offset, self._map[offset:end]
+            offset = end
+
+    def find(self, video_id):
+        """Returns the key to read video_id with, None if it isn't in the file."""
+        return self._offsets.get(video_id)
+
+    def read(self, offset):
+        """Returns (title, video_id, tags) for the line starting at offset."""
+        end = self._map.find(b"\n", offset)
+        return parse_line(self._map[offset:end if end != -1 else len(self._map)])
+
+    def ids(self):
+        """Returns the video ids in catalog order."""
+        return iter(self._offsets)
+
+    def records(self):
+        """Yields (title, video_id, tags) for every video in catalog order."""
+        for offset, line in self._lines():
+            fields = parse_line(line)
+            if fields is not None and self._offsets.get(fields[1]) == offset:
+                yield fields # Not a blank line or one replaced by a later line
+
+    def keys_by_title(self):
+        """Returns every (title, video_id) pair sorted by title."""
+        return sorted((title, video_id) for title, video_id, _ in self.records())
+
+
+class LazyCatalog:
+    """A class used to create Video objects only when they are needed.
+
+    Videos are read from a catalog source (a memory-mapped videos.txt or
+    compiled snapshot) when they are asked for, and the most recently used
+    ones are kept in a bounded LRU cache. Behaves like a dict of
+    video_id -> Video, videos added or removed after loading are kept on
+    top of the source.
+
+    Flags are looked up in a registry when a Video is created, since they
+    aren't in the source and an evicted Video takes its flag with it.
+    """
+
+    def __init__(self, source, cache_size=4096, flags=None):
+        self._source = source
+        self._cache_size = cache_size
+        self._flags = flags if flags is not None else {} # video_id -> flag reason
+        self._cache = OrderedDict() # video_id -> Video, least recently used first
+        self._live = weakref.WeakValueDictionary() # videos still held elsewhere (playlists, current video)
+        self._added = {} # videos added after loading, video_id -> Video
+        self._removed = set() # ids in the source that were removed or replaced
+        self.hits = 0 # videos found in memory
+        self.misses = 0 # videos read from the source
+
+    def _in_source(self, video_id):
+        return video_id not in self._removed and self._source.find(video_id) is not None
+
+    def _remember(self, video):
+        """Puts a video in the LRU cache, evicting the oldest if it is full."""
+        self._cache[video.video_id] = video
+        self._live[video.video_id] = video
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def _create(self, fields):
+        """Creates the Video for (title, video_id, tags) read from the source."""
+        video = Video(*fields)
+        video.set_flag(self._flags.get(video.video_id))
+        return video
+
+    def __len__(self):
+        return len(self._source) - len(self._removed) + len(self._added)
+
+    def __contains__(self, video_id):
+        return video_id in self._added or self._in_source(video_id)
+
+    def __iter__(self):
+        for video_id in self._source.ids():
+            if video_id not in self._removed:
+                yield video_id
+        yield from self._added
+
+    def __getitem__(self, video_id):
+        video = self.get(video_id)
+        if video is None:
+            raise KeyError(video_id)
+        return video
+
+    def get(self, video_id, default=None):
+        """Returns the Video for video_id, reading it from the source if needed."""
+        if video_id in self._added:
+            return self._added[video_id]
+        if video_id in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(video_id)
+            return self._cache[video_id]
+        if not self._in_source(video_id):
+            return default
+
+        # Hand back the same object as before if it is still around
+        video = self._live.get(video_id)
+        if video is None:
+            self.misses += 1
+            video = self._create(self._source.read(self._source.find(video_id)))
+        else:
+            self.hits += 1
+        self._remember(video)
+        return video
+
+    def __setitem__(self, video_id, video):
+        self.pop(video_id, None)
+        self._added[video_id] = video
+
+    def pop(self, video_id, default=None):
+        """Removes video_id from the catalog and returns its Video."""
+        if video_id in self._added:
+            return self._added.pop(video_id)
+        if not self._in_source(video_id):
+            return default
+        video = self.get(video_id)
+        self._removed.add(video_id)
+        self._cache.pop(video_id, None)
+        return video
+
+    def keys_by_title(self):
+        """Yields every (title, video_id) pair sorted by title, without
+        creating Video objects for the videos read from the source."""
+        source_keys = (key for key in self._source.keys_by_title() if key[1] not in self._removed)
+        added_keys = sorted((video.title, video_id) for video_id, video in self._added.items())
+        yield from merge(source_keys, added_keys)
+
+    def values(self):
+        """Yields every Video, reading the source from start to end."""
+        for fields in self._source.records():
+            if fields[1] in self._removed:
+                continue
+            video = self._live.get(fields[1])
+            yield video if video is not None else self._create(fields)
+        yield from self._added.values()
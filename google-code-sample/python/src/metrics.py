@@ -0,0 +1,148 @@
+"""Counters, histograms and gauges about the running player.
+
+Nothing is measured unless a Metrics object is handed to CommandParser,
+so by default the commands run exactly as fast as without it. The
+metrics can be shown with the STATS command, or written to a file in the
+Prometheus text exposition format, which most monitoring tools read.
+"""
+
+from bisect import bisect_left
+import os
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    """A class used to count observations into buckets."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # The last one is past every bucket
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Returns the upper bound of the bucket holding the q quantile,
+        infinity if it is past the last bucket."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+               for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """A class used to collect metrics.
+
+    Every metric has a name, a type (counter, gauge or histogram) and help
+    text, and a value for each set of labels, given as a tuple of
+    (label name, value) pairs. A metric can also be read from a function
+    when it is shown, for numbers something else already keeps count of.
+    """
+
+    def __init__(self):
+        self._metrics = {} # name -> [type, help, {labels: value, Histogram or function}]
+
+    def define(self, name, kind, help_text):
+        """Declares a metric, if it isn't already.
+
+        Args:
+            name: The metric name, e.g. yt_commands_total.
+            kind: "counter", "gauge" or "histogram".
+            help_text: What the metric measures.
+        """
+        self._metrics.setdefault(name, [kind, help_text, {}])
+
+    def inc(self, name, labels=(), amount=1):
+        """Adds to a counter."""
+        values = self._metrics[name][2]
+        values[labels] = values.get(labels, 0) + amount
+
+    def observe(self, name, labels, value):
+        """Adds an observation to a histogram."""
+        values = self._metrics[name][2]
+        histogram = values.get(labels)
+        if histogram is None:
+            histogram = values[labels] = Histogram()
+        histogram.observe(value)
+
+    def read_from(self, name, function, labels=()):
+        """Makes a counter or gauge read its value from function() when shown."""
+        self._metrics[name][2][labels] = function
+
+    def value(self, name, labels=()):
+        """Returns the current value of a counter or gauge, 0 if it has none."""
+        value = self._metrics[name][2].get(labels, 0)
+        return value() if callable(value) else value
+
+    def histograms(self, name):
+        """Returns labels -> Histogram for a histogram metric."""
+        return dict(self._metrics[name][2])
+
+    def describe(self, skip=()):
+        """Returns a "help text: value" line for each counter and gauge value.
+
+        Args:
+            skip: Names of metrics to leave out.
+        """
+        lines = []
+        for name, (kind, help_text, values) in self._metrics.items():
+            if kind == "histogram" or name in skip:
+                continue
+            for labels, value in values.items():
+                value = value() if callable(value) else value
+                label_text = "".join(f" ({label}: {label_value})" for label, label_value in labels)
+                lines.append(f"{help_text.rstrip('.')}{label_text}: {_format_value(value)}")
+        return lines
+
+    def to_prometheus(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        for name, (kind, help_text, values) in self._metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in values.items():
+                if kind != "histogram":
+                    value = value() if callable(value) else value
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(value.buckets + (float("inf"),), value.counts):
+                    cumulative += count
+                    bucket_labels = labels + (("le", _format_value(bound)),)
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes every metric to a file in the Prometheus text format."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as output:
+            output.write(self.to_prometheus())
+        os.replace(temp_path, path) # A scraper never sees a half written file
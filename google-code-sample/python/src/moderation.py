@@ -0,0 +1,57 @@
+"""A moderation registry class."""
+
+
+class ModerationRegistry:
+    """A class used to keep track of flagged videos.
+
+    Holds the id and flag reason of every flagged video in one dict, so the
+    flagged videos can be listed, counted or taken out of a set of search
+    candidates without looking at each Video.
+    """
+
+    def __init__(self):
+        self._reasons = {} # video_id -> flag reason
+
+    def __len__(self):
+        return len(self._reasons)
+
+    def __contains__(self, video_id):
+        return video_id in self._reasons
+
+    def __iter__(self):
+        return iter(self._reasons)
+
+    def get(self, video_id, default=None):
+        """Returns the flag reason of a video, default if it isn't flagged."""
+        return self._reasons.get(video_id, default)
+
+    def flag(self, video_id, reason):
+        """Flags a video.
+
+        Returns:
+            False if the video was already flagged.
+        """
+        if video_id in self._reasons:
+            return False
+        self._reasons[video_id] = reason
+        return True
+
+    def allow(self, video_id):
+        """Removes the flag from a video.
+
+        Returns:
+            False if the video wasn't flagged.
+        """
+        return self._reasons.pop(video_id, None) is not None
+
+    def unflagged(self, video_ids):
+        """Returns the set of video_ids that aren't flagged.
+
+        Args:
+            video_ids: A set of video ids, it may be changed and returned.
+        """
+        # Set difference goes through whichever side is smaller
+        if len(self._reasons) < len(video_ids):
+            video_ids.difference_update(self._reasons)
+            return video_ids
+        return {video_id for video_id in video_ids if video_id not in self._reasons}
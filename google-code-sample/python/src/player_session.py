@@ -0,0 +1,596 @@
+"""A player session class."""
+
+from .query_cache import QueryCache
+from .prefix_index import PrefixIndex
+from .state_store import SavedState
+from .tag_index import TagIndex
+from .video_library import VideoLibrary
+from .video_playlist import Playlist
+from collections import namedtuple
+from itertools import islice
+from random import Random
+
+# Why a command wasn't done, the error of its Outcome
+NO_SUCH_VIDEO = "Video does not exist"
+VIDEO_FLAGGED = "Video is currently flagged"
+NOTHING_PLAYING = "No video is currently playing"
+ALREADY_PAUSED = "Video already paused"
+NOT_PAUSED = "Video is not paused"
+NO_PLAYABLE_VIDEOS = "No videos avaliable"
+PLAYLIST_EXISTS = "A playlist with the same name already exists"
+NO_SUCH_PLAYLIST = "Playlist does not exist"
+ALREADY_IN_PLAYLIST = "Video already added"
+NOT_IN_PLAYLIST = "Video is not in playlist"
+ALREADY_FLAGGED = "Video is already flagged"
+NOT_FLAGGED = "Video is not flagged"
+
+# What a command did: error is None if it was done, else why not (one of
+# the reasons above); video is the video it was about, None if there isn't
+# one; stopped is the video it stopped playing on the way, if any; and
+# videos is what it found, for a command that finds some
+Outcome = namedtuple("Outcome", "error video stopped videos", defaults=(None, None, None))
+
+# What a prefix completes to: the video ids starting with it, the videos
+# whose titles start with it and the names of the playlists starting with
+# it (both ignoring case)
+Completions = namedtuple("Completions", "video_ids videos playlists")
+
+
+def _query_matches(query, video):
+    """Returns True if a cached search query would find video."""
+    if query[0] == "title":
+        return query[1] in video.title.lower()
+    video_tags = {TagIndex.normalize(tag) for tag in video.tags}
+    return query[1] <= video_tags if query[2] else not query[1].isdisjoint(video_tags)
+
+
+class PlayerSession:
+    """A class used to control a video player from code.
+
+    It holds everything a user of the player changes: the current video,
+    the playlists and the flags. Every method returns what happened (an
+    Outcome, or the videos asked for) rather than printing it, and nothing
+    waits on the user, so it can be used from other programs; VideoPlayer
+    renders it as text.
+    """
+
+    def __init__(self, video_library=None, store=None, query_cache=None):
+        """
+        Args:
+            video_library: The library to play from, loads the default one if not given.
+            store: A StateStore to load the playlists and flags from and save every change to,
+                None to keep them in memory only.
+            query_cache: The search result cache of another session of the same library, to
+                share it. A new QueryCache, kept up to date as the library changes, if not given.
+        """
+        self._video_library = video_library if video_library is not None else VideoLibrary()
+        self._current_video = None
+        self._paused = False
+        self._playlists = {}
+        self._playlist_completions = PrefixIndex() # (key, name) of every playlist
+        self._random = Random()
+        self._store = store
+        self._query_cache = query_cache
+        if query_cache is None:
+            self._query_cache = QueryCache()
+            self._listener = self._library_changed
+        else: # Another session looks after the shared cache and playlists
+            self._listener = self._playback_changed
+        self._video_library.add_listener(self._listener)
+        if store is not None:
+            self._restore(store.recover())
+
+    def new_session(self):
+        """Returns a session for another user of the same library.
+
+        It shares this session's library, playlists, store and search
+        cache, but has its own current video and paused state.
+        """
+        session = PlayerSession(self._video_library, query_cache=self._query_cache)
+        session._playlists = self._playlists
+        session._playlist_completions = self._playlist_completions
+        session._store = self._store
+        return session
+
+    def close(self):
+        """Stops following changes to the library, for a session no longer in use."""
+        self._video_library.remove_listener(self._listener)
+
+    @property
+    def video_library(self):
+        """The VideoLibrary the session plays from."""
+        return self._video_library
+
+    @property
+    def query_cache(self):
+        """The QueryCache of search results, with its hit and miss counts."""
+        return self._query_cache
+
+    @property
+    def current_video(self):
+        """The Video playing (or paused), None if there isn't one."""
+        return self._current_video
+
+    @property
+    def paused(self):
+        """Whether the current video is paused."""
+        return self._paused
+
+    def register_metrics(self, metrics):
+        """Adds gauges for the library, playlists and search cache to a Metrics."""
+        self._video_library.register_metrics(metrics)
+        metrics.define("yt_playlists", "gauge", "Playlists that exist.")
+        metrics.read_from("yt_playlists", self._playlists.__len__)
+        cache = self._query_cache
+        for name, help_text, read in (
+                ("yt_search_cache_hits_total", "Searches answered from the cache.", lambda: cache.hits),
+                ("yt_search_cache_misses_total", "Searches that weren't in the cache.", lambda: cache.misses),
+                ("yt_search_cache_evictions_total", "Searches dropped to make room in the cache.",
+                 lambda: cache.evictions),
+                ("yt_search_cache_invalidations_total", "Searches dropped from the cache as the library changed.",
+                 lambda: cache.invalidations)):
+            metrics.define(name, "counter", help_text)
+            metrics.read_from(name, read)
+        metrics.define("yt_search_cache_entries", "gauge", "Searches in the cache.")
+        metrics.read_from("yt_search_cache_entries", cache.__len__)
+
+    def _library_changed(self, event, video):
+        """Keeps the cached searches and the playlists up to date with a change to the library."""
+        if event != "added":
+            self._query_cache.invalidate_video(video.video_id)
+        if event in ("added", "changed"): # May belong in searches it wasn't found by
+            self._query_cache.invalidate_where(lambda query: _query_matches(query, video))
+
+        if event == "removed":
+            for key, playlist in self._playlists.items():
+                if playlist.remove(video.video_id) is not None:
+                    self._record("remove", key, video.video_id)
+            if video.flag is not None: # The library dropped the flag with the video, so the saved state must too
+                self._record("allow", video.video_id)
+        elif event == "changed":
+            for playlist in self._playlists.values():
+                playlist.replace(video)
+        self._playback_changed(event, video)
+
+    def _playback_changed(self, event, video):
+        """Keeps the current video up to date with a change to the library."""
+        if self._current_video is None or self._current_video.video_id != video.video_id:
+            return
+        if event == "removed":
+            self._current_video = None
+            self._paused = False
+        elif event == "changed":
+            self._current_video = video
+
+    def _cached_search(self, query, search):
+        """Returns the ids of the unflagged videos a search finds, in order.
+
+        Args:
+            query: The normalized query the results are cached under.
+            search: Function returning every matching video, flagged or not.
+        """
+        video_ids = self._query_cache.get(query)
+        if video_ids is None:
+            matches = list(search())
+            video_ids = [video.video_id for video in matches if video.flag is None]
+            self._query_cache.put(query, video_ids, [video.video_id for video in matches])
+        return video_ids
+
+    def _restore(self, state):
+        """Puts back the playlists and flags of a SavedState, skipping videos no longer in the library."""
+        for video_id, reason in state.flags.items():
+            self._video_library.flag_video(video_id, reason)
+        for key, (name, video_ids) in state.playlists.items():
+            playlist = self._playlists[key] = Playlist(name)
+            self._playlist_completions.add(key, name)
+            for video_id in video_ids:
+                video = self._video_library.get_video(video_id)
+                if video is not None:
+                    playlist.add(video)
+
+    def _record(self, operation, *args):
+        """Saves a change to the playlists or flags, if there is a store."""
+        if self._store is None:
+            return
+        self._store.append(operation, *args)
+        if self._store.needs_compaction:
+            state = SavedState(flags={video.video_id: video.flag for video in self._video_library.flagged_videos()})
+            for key, playlist in self._playlists.items():
+                state.playlists[key] = [playlist.name, dict.fromkeys(video.video_id for video in playlist)]
+            self._store.compact(state)
+
+    def number_of_videos(self):
+        """Returns how many videos are in the library."""
+        return len(self._video_library)
+
+    def videos_by_title(self, offset=0):
+        """Returns an iterator of every video, sorted by title.
+
+        Args:
+            offset: How many videos to skip from the beginning.
+        """
+        return self._video_library.iter_videos_by_title(offset)
+
+    def _stop(self):
+        """Stops the current video and returns it, None if there wasn't one."""
+        video = self._current_video
+        self._current_video = None
+        return video
+
+    def play_video(self, video_id):
+        """Plays a video, stopping the current one.
+
+        Args:
+            video_id: The video_id to be played.
+        """
+        video = self._video_library.get_video(video_id)
+        if video is None:
+            return Outcome(NO_SUCH_VIDEO)
+        stopped = self._stop()
+        if video.flag is not None:
+            return Outcome(VIDEO_FLAGGED, video, stopped)
+        self._current_video = video
+        self._paused = False
+        return Outcome(None, video, stopped)
+
+    def stop_video(self):
+        """Stops the current video."""
+        video = self._stop()
+        if video is None:
+            return Outcome(NOTHING_PLAYING)
+        return Outcome(None, video)
+
+    def play_random_video(self, seed=None, weights=None):
+        """Plays a random video that isn't flagged, stopping the current one.
+
+        Args:
+            seed: Seed for the random choice, the same seed picks the same video every time.
+            weights: Dict of tag -> weight, to make videos with those tags more (or less) likely.
+        """
+        stopped = self._stop()
+        if seed is not None:
+            self._random.seed(seed)
+        # The library keeps track of the videos that aren't flagged, so this doesn't go through them all
+        video = self._video_library.random_video(self._random, weights)
+        if video is None:
+            return Outcome(NO_PLAYABLE_VIDEOS, stopped=stopped)
+        return self.play_video(video.video_id)._replace(stopped=stopped)
+
+    def pause_video(self):
+        """Pauses the current video."""
+        if self._current_video is None:
+            return Outcome(NOTHING_PLAYING)
+        if self._paused:
+            return Outcome(ALREADY_PAUSED, self._current_video)
+        self._paused = True
+        return Outcome(None, self._current_video)
+
+    def continue_video(self):
+        """Resumes playing the current video."""
+        if self._current_video is None:
+            return Outcome(NOTHING_PLAYING)
+        if not self._paused:
+            return Outcome(NOT_PAUSED, self._current_video)
+        self._paused = False
+        return Outcome(None, self._current_video)
+
+    def create_playlist(self, playlist_name):
+        """Creates a playlist, its name unique ignoring case and surrounding whitespace.
+
+        Args:
+            playlist_name: The playlist name.
+        """
+        key = playlist_name.lower().strip()
+        if key in self._playlists:
+            return Outcome(PLAYLIST_EXISTS)
+        self._playlists[key] = Playlist(playlist_name)
+        self._playlist_completions.add(key, playlist_name)
+        self._record("create", key, playlist_name)
+        return Outcome(None)
+
+    def add_to_playlist(self, playlist_name, *video_ids):
+        """Adds videos to the end of a playlist.
+
+        Args:
+            playlist_name: The playlist name.
+            video_ids: The video_ids to be added, in order.
+
+        Returns:
+            A list of the Outcome of each video, or the one Outcome of
+            NO_SUCH_PLAYLIST.
+        """
+        playlist = self._playlists.get(playlist_name.lower())
+        if playlist is None:
+            return [Outcome(NO_SUCH_PLAYLIST)]
+
+        outcomes = []
+        added = []
+        for video_id in video_ids:
+            video = self._video_library.get_video(video_id)
+            if video is None:
+                outcomes.append(Outcome(NO_SUCH_VIDEO))
+            elif video.flag is not None:
+                outcomes.append(Outcome(VIDEO_FLAGGED, video))
+            elif not playlist.add(video): # Playlist tells us if it was already there
+                outcomes.append(Outcome(ALREADY_IN_PLAYLIST, video))
+            else:
+                outcomes.append(Outcome(None, video))
+                added.append(video_id)
+        if added:
+            self._record("add", playlist_name.lower(), *added) # One log record for the whole batch
+        return outcomes
+
+    def playlist_names(self):
+        """Returns the name of every playlist, in lexicographical order."""
+        return [self._playlists[key].name for key in sorted(self._playlists)]
+
+    def playlist_videos(self, playlist_name):
+        """Returns a list of the videos in a playlist, in the order they
+        were added. None if the playlist does not exist."""
+        playlist = self._playlists.get(playlist_name.lower())
+        return None if playlist is None else playlist.videos
+
+    def remove_from_playlist(self, playlist_name, video_id):
+        """Removes a video from a playlist.
+
+        Args:
+            playlist_name: The playlist name.
+            video_id: The video_id to be removed.
+        """
+        video = self._video_library.get_video(video_id)
+        playlist = self._playlists.get(playlist_name.lower())
+        if playlist is None:
+            return Outcome(NO_SUCH_PLAYLIST)
+        if video is None:
+            return Outcome(NO_SUCH_VIDEO)
+        if video_id not in playlist:
+            return Outcome(NOT_IN_PLAYLIST, video)
+        playlist.remove(video_id)
+        self._record("remove", playlist_name.lower(), video_id)
+        return Outcome(None, video)
+
+    def clear_playlist(self, playlist_name):
+        """Removes every video from a playlist.
+
+        Args:
+            playlist_name: The playlist name.
+        """
+        playlist = self._playlists.get(playlist_name.lower())
+        if playlist is None:
+            return Outcome(NO_SUCH_PLAYLIST)
+        playlist.clear()
+        self._record("clear", playlist_name.lower())
+        return Outcome(None)
+
+    def delete_playlist(self, playlist_name):
+        """Deletes a playlist.
+
+        Args:
+            playlist_name: The playlist name.
+        """
+        playlist = self._playlists.pop(playlist_name.lower(), None)
+        if playlist is None:
+            return Outcome(NO_SUCH_PLAYLIST)
+        self._playlist_completions.remove(playlist_name.lower(), playlist.name)
+        self._record("delete", playlist_name.lower())
+        return Outcome(None)
+
+    def complete(self, prefix, top=10):
+        """Finds what a prefix of a video id, title or playlist name could be.
+
+        Args:
+            prefix: The start of what is being typed.
+            top: How many of each kind to find, the first in order.
+
+        Returns:
+            The Completions.
+        """
+        return Completions(self._video_library.complete_video_ids(prefix, top),
+                           self._video_library.complete_titles(prefix, top),
+                           self.complete_playlist_names(prefix, top))
+
+    def complete_playlist_names(self, prefix, top=10):
+        """Returns the names of the first top playlists, in lexicographical
+        order, whose names start with prefix ignoring case."""
+        return [name for _, name in self._playlist_completions.complete(prefix.lower(), top)]
+
+    def search_videos(self, search_term, offset=0):
+        """Returns an iterator of the unflagged videos whose titles contain
+        the search_term, sorted by title.
+
+        Args:
+            search_term: The query to be used in search.
+            offset: How many results to skip from the beginning.
+        """
+        return self._playable_videos(islice(self._title_search(search_term), offset, None))
+
+    def _playable_videos(self, video_ids):
+        """Yields the videos of some ids as they are when each is read,
+        skipping those removed or flagged since the ids were found (a
+        paged search reads its later pages after other commands)."""
+        for video_id in video_ids:
+            video = self._video_library.get_video(video_id)
+            if video is not None and video.flag is None:
+                yield video
+
+    def _title_search(self, search_term):
+        """Returns the ids of the unflagged videos whose titles contain the search_term, in title order."""
+        # Repeated searches come from the cache, else the library's title index only hands back the videos that match
+        query = ("title", search_term.lower().strip())
+        return self._cached_search(
+            query, lambda: self._video_library.search_titles(search_term, include_flagged=True))
+
+    def search_facets(self, search_term, top=10):
+        """Returns the tags most of the videos search_videos finds have.
+
+        Args:
+            search_term: The query to be used in search.
+            top: How many tags to return.
+
+        Returns:
+            A list of (normalized tag, videos with it), most videos first.
+        """
+        return self._video_library.facets(self._title_search(search_term), top)
+
+    def search_videos_ranked(self, search_term, top=10, offset=0):
+        """Returns an iterator of the top unflagged videos whose titles best
+        match the words of the search_term, best first.
+
+        Args:
+            search_term: The words to search for.
+            top: How many of the best matches to find.
+            offset: How many results to skip from the beginning.
+        """
+        # Not cached: a change to any title can change how every other one ranks
+        found = islice(self._video_library.ranked_search(search_term, top), offset, None)
+        return self._playable_videos(video.video_id for video in found)
+
+    def search_videos_tag(self, video_tag, offset=0):
+        """Returns an iterator of the unflagged videos with a tag, sorted by title.
+
+        Args:
+            video_tag: The video tag, or several joined with & (videos with
+                every tag) or with | (videos with any of the tags).
+            offset: How many results to skip from the beginning.
+        """
+        video_ids, _, _ = self._tag_search(video_tag)
+        return self._playable_videos(islice(video_ids, offset, None))
+
+    def _tag_search(self, video_tag):
+        """Returns the ids of the unflagged videos search_videos_tag finds, in
+        title order, and the tags and whether the videos must have them all."""
+        if "|" in video_tag:
+            tags, match_all = video_tag.split("|"), False
+        else:
+            tags, match_all = video_tag.split("&"), True
+
+        # Repeated searches come from the cache, else the library's tag index gives back the matching videos in title order
+        query = ("tags", frozenset(map(TagIndex.normalize, tags)), match_all or len(tags) == 1)
+        video_ids = self._cached_search(
+            query, lambda: self._video_library.videos_with_tags(tags, match_all, include_flagged=True))
+        return video_ids, tags, match_all
+
+    def search_tag_facets(self, video_tag, top=10):
+        """Returns the tags most of the videos search_videos_tag finds have.
+
+        Args:
+            video_tag: The video tag, or several joined with & or |, see search_videos_tag.
+            top: How many tags to return.
+
+        Returns:
+            A list of (normalized tag, videos with it), most videos first.
+        """
+        video_ids, tags, match_all = self._tag_search(video_tag)
+        return self._video_library.facets(video_ids, top, tags, match_all)
+
+    def related_videos(self, video_id, top=10):
+        """Finds the unflagged videos sharing the most tags with a video.
+
+        Args:
+            video_id: The video_id of the video, which mustn't be flagged.
+            top: How many related videos to find.
+
+        Returns:
+            An Outcome whose videos are the related ones, most related first.
+        """
+        video = self._video_library.get_video(video_id)
+        if video is None:
+            return Outcome(NO_SUCH_VIDEO)
+        if video.flag is not None:
+            return Outcome(VIDEO_FLAGGED, video)
+        # Not cached here: the library keeps the related videos of each set of tags already
+        return Outcome(None, video, videos=self._video_library.related_videos(video_id, top))
+
+    def flag_video(self, video_id, flag_reason="Not supplied"):
+        """Flags a video so it can't be played, stopping it if it's playing.
+
+        Args:
+            video_id: The video_id to be flagged.
+            flag_reason: Reason for flagging the video.
+        """
+        video = self._video_library.get_video(video_id)
+        if video is None:
+            return Outcome(NO_SUCH_VIDEO)
+        if video.flag is not None:
+            return Outcome(ALREADY_FLAGGED, video)
+
+        self._video_library.flag_video(video_id, flag_reason)
+        self._record("flag", video_id, flag_reason)
+        stopped = None
+        if self._current_video is not None and self._current_video.video_id == video_id:
+            stopped = self._stop()
+        return Outcome(None, video, stopped)
+
+    def allow_video(self, video_id):
+        """Removes the flag from a video.
+
+        Args:
+            video_id: The video_id to be allowed again.
+        """
+        video = self._video_library.get_video(video_id)
+        if video is None:
+            return Outcome(NO_SUCH_VIDEO)
+        if video.flag is None:
+            return Outcome(NOT_FLAGGED, video)
+        self._video_library.allow_video(video_id)
+        self._record("allow", video_id)
+        return Outcome(None, video)
+
+    def flag_videos(self, video_ids=(), tag=None, reason="Not supplied"):
+        """Flags several videos at once.
+
+        Args:
+            video_ids: The video_ids to be flagged.
+            tag: Flag every video with this tag that isn't flagged yet,
+                instead of the given video_ids.
+            reason: Reason for flagging the videos.
+
+        Returns:
+            A list of the Outcome of each video.
+        """
+        if tag is not None:
+            video_ids = [video.video_id for video in self._video_library.videos_with_tags([tag])]
+        return [self.flag_video(video_id, reason) for video_id in video_ids]
+
+    def allow_videos(self, video_ids=(), tag=None):
+        """Removes the flag from several videos at once.
+
+        Args:
+            video_ids: The video_ids to be allowed again.
+            tag: Allow every flagged video with this tag, instead of the
+                given video_ids.
+
+        Returns:
+            A list of the Outcome of each video.
+        """
+        if tag is not None:
+            video_ids = [video.video_id for video in self._video_library.videos_with_tags([tag], include_flagged=True)
+                         if video.flag is not None]
+        return [self.allow_video(video_id) for video_id in video_ids]
+
+    def flagged_videos(self):
+        """Returns a list of every flagged video, sorted by title."""
+        return self._video_library.flagged_videos()
+
+    def read_library_changes(self, catalog_path=None):
+        """Compares the catalog file with the library, see VideoLibrary.read_changes.
+
+        Raises:
+            OSError: If the file can't be read.
+            ValueError: If the file is wrong, or the library is lazy.
+        """
+        return self._video_library.read_changes(catalog_path)
+
+    def apply_library_changes(self, changes):
+        """Applies the CatalogChanges read from a catalog file.
+
+        Playlists and the current video follow along: removed videos are
+        taken out of them and changed ones swapped for their new versions.
+
+        Returns:
+            An Outcome whose stopped is the current video, if it was removed.
+        """
+        playing = self._current_video
+        self._video_library.apply_changes(changes)
+        stopped = playing if playing is not None and self._current_video is None else None
+        return Outcome(None, stopped=stopped)
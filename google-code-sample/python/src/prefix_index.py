@@ -0,0 +1,57 @@
+"""A prefix index class."""
+
+from bisect import bisect_left
+from itertools import takewhile
+
+
+class PrefixIndex:
+    """A class used to find the keys starting with a prefix, for completion.
+
+    The (key, value) pairs are kept in one list sorted by key, so the keys
+    starting with a prefix are next to each other: a binary search finds
+    the first of them, and the first k are read from there. Finding them
+    takes O(len(prefix) * log n + k) whatever number of keys start with it.
+    """
+
+    def __init__(self):
+        self._entries = [] # (key, value)
+        self._sorted = True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _sorted_entries(self):
+        """Returns the entries, sorting them if any were added since the last time."""
+        if not self._sorted:
+            # Adding only appends, so loading a big library doesn't insert in order every time
+            self._entries.sort()
+            self._sorted = True
+        return self._entries
+
+    def add(self, key, value):
+        """Adds a key.
+
+        Args:
+            key: The key, matched as it is (lowercase it to match ignoring case).
+            value: What to return for the key, e.g. the video_id of a title.
+        """
+        self._entries.append((key, value))
+        self._sorted = False
+
+    def remove(self, key, value):
+        """Removes a key added with add, if it is there."""
+        entries = self._sorted_entries()
+        i = bisect_left(entries, (key, value))
+        if i < len(entries) and entries[i] == (key, value):
+            del entries[i]
+
+    def complete(self, prefix, k=10):
+        """Returns the first k (key, value) pairs, in key order, whose key starts with prefix.
+
+        Args:
+            prefix: The start of the keys.
+            k: How many to return.
+        """
+        entries = self._sorted_entries()
+        start = bisect_left(entries, (prefix,)) # A 1-tuple sorts before every pair with that key
+        return list(takewhile(lambda entry: entry[0].startswith(prefix), entries[start:start + k]))
@@ -0,0 +1,110 @@
+"""A search result cache class."""
+
+from collections import OrderedDict
+import time
+
+
+class QueryCache:
+    """A class used to remember the results of searches.
+
+    Maps a normalized query to the ids of the videos it found, in order,
+    dropping the least recently used queries past max_entries queries or
+    max_ids ids in total, and any older than ttl seconds.
+
+    Each query also remembers every video that matched it, flagged or
+    not, so a change to one video only evicts the queries it is part of.
+    """
+
+    def __init__(self, max_entries=1024, max_ids=1_000_000, ttl=None, clock=time.monotonic):
+        """
+        Args:
+            max_entries: Most queries to keep.
+            max_ids: Most matching video ids to keep, over all queries.
+            ttl: Seconds a result is kept for, None to keep it until it
+                is evicted or invalidated.
+            clock: Function returning the time in seconds.
+        """
+        self._max_entries = max_entries
+        self._max_ids = max_ids
+        self._ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict() # query -> (expiry time, result ids, matched ids), least recently used first
+        self._queries_with = {} # video_id -> queries it matched
+        self._size = 0 # matched ids over all queries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        """Iterates over the cached queries."""
+        return iter(list(self._entries))
+
+    def get(self, query):
+        """Returns the result ids for query, None if they aren't cached."""
+        entry = self._entries.get(query)
+        if entry is not None and entry[0] is not None and entry[0] <= self._clock():
+            self._discard(query)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(query)
+        return entry[1]
+
+    def put(self, query, result_ids, matched_ids):
+        """Caches the result of a query.
+
+        Args:
+            query: The normalized query, any hashable value.
+            result_ids: The ids to hand back, in order.
+            matched_ids: Every video id that matched, including any left
+                out of the results (like flagged videos).
+        """
+        if len(matched_ids) > self._max_ids:
+            return # Would push everything else out
+        self._discard(query)
+        expiry = self._clock() + self._ttl if self._ttl is not None else None
+        matched_ids = frozenset(matched_ids)
+        self._entries[query] = (expiry, tuple(result_ids), matched_ids)
+        for video_id in matched_ids:
+            self._queries_with.setdefault(video_id, set()).add(query)
+        self._size += len(matched_ids)
+
+        while len(self._entries) > self._max_entries or self._size > self._max_ids:
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _discard(self, query):
+        """Removes a query and its entries in the video -> queries index."""
+        entry = self._entries.pop(query, None)
+        if entry is None:
+            return
+        for video_id in entry[2]:
+            queries = self._queries_with[video_id]
+            queries.discard(query)
+            if not queries:
+                del self._queries_with[video_id]
+        self._size -= len(entry[2])
+
+    def invalidate_video(self, video_id):
+        """Evicts every query the video matched."""
+        for query in list(self._queries_with.get(video_id, ())):
+            self._discard(query)
+            self.invalidations += 1
+
+    def invalidate_where(self, predicate):
+        """Evicts every query for which predicate(query) is true."""
+        for query in [query for query in self._entries if predicate(query)]:
+            self._discard(query)
+            self.invalidations += 1
+
+    def clear(self):
+        """Evicts every query."""
+        self._entries.clear()
+        self._queries_with.clear()
+        self._size = 0
@@ -0,0 +1,299 @@
+"""A ranked title index class."""
+
+from heapq import heapify, heappop, heappush, nsmallest
+import math
+import re
+import sys
+
+# BM25 parameters: how quickly repeating a word stops adding to the score,
+# and how much longer titles are penalized
+K1 = 1.2
+B = 0.75
+# Score multiplier for each typo between a search word and a title word
+TYPO_PENALTY = 0.5
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def tokenize(text):
+    """Returns the lowercased words of text."""
+    return _WORD.findall(text.lower())
+
+
+def allowed_typos(word):
+    """Returns how many typos a search word may have: none for short words
+    or words with digits (ids, numbers), one from 4 letters, two from 8."""
+    if len(word) < 4 or not word.isalpha():
+        return 0
+    return 1 if len(word) < 8 else 2
+
+
+def edit_distance(a, b, limit):
+    """Returns the number of typos between a and b (letters inserted, deleted,
+    changed or swapped with the next one), None if it is over limit."""
+    if abs(len(a) - len(b)) > limit:
+        return None
+    before, previous = None, list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        if min(current) > limit and min(previous) > limit: # Every path through the rest is longer still
+            return None
+        before, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else None
+
+
+def _grams_of(word):
+    """Returns the trigrams of a word padded with $, so short words have some."""
+    padded = f"${word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _idf(document_count, documents):
+    return math.log(1 + (documents - document_count + 0.5) / (document_count + 0.5))
+
+
+def _saturation(term_count, length, average_length):
+    return term_count * (K1 + 1) / (term_count + K1 * (1 - B + B * length / average_length))
+
+
+class RankedIndex:
+    """A class used to find the titles most relevant to a search.
+
+    Titles are scored with BM25: a title scores higher the more of the
+    search's words it has, the rarer those words are in the library, and
+    the shorter it is. A search word also matches title words a typo or
+    two away from it (found through a trigram index of the distinct title
+    words), at TYPO_PENALTY of the score per typo.
+
+    Each word's postings are grouped by (times in the title, title
+    length), which fixes the word's score in every title of a group, so
+    a search works out which combinations of groups score highest and
+    only intersects those, rather than scoring every title having one of
+    its words.
+    """
+
+    def __init__(self):
+        self._documents = 0
+        self._postings = {} # word -> {(times in title, title length): set of video ids}
+        self._document_counts = {} # word -> titles with it
+        self._grams = {} # trigram -> set of words without digits
+        self._total_length = 0
+
+    def __len__(self):
+        return self._documents
+
+    def add(self, video_id, title):
+        """Adds a title to the index.
+
+        Args:
+            video_id: The video url, not already in the index.
+            title: The title of the video.
+        """
+        words = [sys.intern(word) for word in tokenize(title)] # One copy of each word
+        self._documents += 1
+        self._total_length += len(words)
+        for word in set(words):
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = {}
+                self._document_counts[word] = 0
+                if word.isalpha(): # A search word may be a typo of it
+                    for gram in _grams_of(word):
+                        self._grams.setdefault(gram, set()).add(word)
+            postings.setdefault((words.count(word), len(words)), set()).add(video_id)
+            self._document_counts[word] += 1
+
+    def remove(self, video_id, title):
+        """Removes a title from the index.
+
+        Args:
+            video_id: The video url.
+            title: The title it was added with.
+        """
+        words = tokenize(title)
+        self._documents -= 1
+        self._total_length -= len(words)
+        for word in set(words):
+            postings = self._postings[word]
+            group = (words.count(word), len(words))
+            postings[group].discard(video_id)
+            if not postings[group]:
+                del postings[group]
+            self._document_counts[word] -= 1
+            if postings: # Don't keep words no title has
+                continue
+            del self._postings[word]
+            del self._document_counts[word]
+            for gram in _grams_of(word) if word.isalpha() else ():
+                self._grams[gram].discard(word)
+                if not self._grams[gram]:
+                    del self._grams[gram]
+
+    def _variants(self, word, documents):
+        """Returns title word -> weight for the words matching a search word.
+
+        A title word's weight is its idf, times TYPO_PENALTY for each typo.
+        A typo's idf is at most the search word's own, else a rare
+        misspelling would beat the word itself.
+        """
+        exact = word in self._postings
+        variants = {word: _idf(self._document_counts[word], documents)} if exact else {}
+        typos = allowed_typos(word)
+        if not typos:
+            return variants
+
+        # Each typo changes at most 4 trigrams, so a match shares the rest
+        grams = _grams_of(word)
+        shared = {}
+        for gram in grams:
+            for other in self._grams.get(gram, ()):
+                shared[other] = shared.get(other, 0) + 1
+        needed = len(grams) - 4 * typos
+        for other, count in shared.items():
+            if count >= needed and other != word:
+                distance = edit_distance(word, other, typos)
+                if distance is not None:
+                    idf = _idf(self._document_counts[other], documents)
+                    variants[other] = TYPO_PENALTY ** distance * (min(idf, variants[word]) if exact else idf)
+        return variants
+
+    def search(self, search_term, k=10, skip=()):
+        """Returns the k titles scoring highest for a search.
+
+        Args:
+            search_term: The words to search for, matched ignoring case.
+            k: How many results to return.
+            skip: Video ids to leave out of the results, e.g. flagged ones.
+
+        Returns:
+            A list of (video_id, score), best first. Titles with the same
+            score are ordered by video id.
+        """
+        documents = self._documents
+        variants = [self._variants(word, documents) for word in dict.fromkeys(tokenize(search_term))]
+        variants = [matching for matching in variants if matching]
+        if not variants:
+            return []
+        average_length = self._total_length / documents
+
+        # For each title length, each search word's groups of titles of that
+        # length as (score of the word in them, ids)
+        by_length = {}
+        for position, matching in enumerate(variants):
+            for variant, weight in matching.items():
+                for (count, length), ids in self._postings[variant].items():
+                    groups = by_length.setdefault(length, [[] for _ in variants])
+                    groups[position].append((weight * _saturation(count, length, average_length), ids))
+
+        # A cell is one group (or none) for each search word at one length,
+        # and every title in it has the same score, the sum of its groups'.
+        # Cells are taken best first, each one's titles found by intersecting
+        # its groups (less the titles having the words it has no group of),
+        # until the next cell can't beat the top k
+        cells = []
+        for length, groups in by_length.items():
+            for options in groups:
+                options.sort(key=lambda group: group[0], reverse=True)
+                options.append((0, None)) # Not having the word
+            cells.append((-sum(options[0][0] for options in groups), length, (0,) * len(groups), 0))
+        heapify(cells)
+
+        found = [] # (score, video_id) of the titles found, best cells first
+        seen = set() # A title matching a word more than one way is in several cells
+        while cells:
+            negated, length, choice, changeable = heappop(cells)
+            score = -negated
+            if score == 0 or (len(found) >= k and score < found[k - 1][0]):
+                break
+
+            groups = by_length[length]
+            # The cells next down from this one, each pushed only once
+            for position in range(changeable, len(groups)):
+                if choice[position] + 1 < len(groups[position]):
+                    following = choice[:position] + (choice[position] + 1,) + choice[position + 1:]
+                    following_score = sum(options[index][0] for options, index in zip(groups, following))
+                    heappush(cells, (-following_score, length, following, position))
+
+            chosen = sorted((options[index][1] for options, index in zip(groups, choice)
+                             if options[index][1] is not None), key=len)
+            members = chosen[0].intersection(*chosen[1:])
+            for options, index in zip(groups, choice):
+                if options[index][1] is None:
+                    for _, ids in options[:-1]:
+                        members = members - ids
+            # Only k of them can make it, ties go to the lowest ids
+            members = nsmallest(k, (video_id for video_id in members
+                                    if video_id not in seen and video_id not in skip))
+            seen.update(members)
+            found.extend((score, video_id) for video_id in members)
+
+        found.sort(key=lambda result: (-result[0], result[1]))
+        return [(video_id, score) for score, video_id in found[:k]]
+
+
+def rank_titles(search_term, titles, k=10, skip=()):
+    """Returns the k titles scoring highest for a search, like
+    RankedIndex.search, reading the titles once instead of indexing them.
+
+    Args:
+        search_term: The words to search for, matched ignoring case.
+        titles: Iterable of (video_id, title).
+        k: How many results to return.
+        skip: Video ids to leave out of the results.
+
+    Returns:
+        A list of (video_id, score), best first.
+    """
+    words = list(dict.fromkeys(tokenize(search_term)))
+    matches = {} # title word -> [(search word position, score multiplier)]
+
+    def matches_of(title_word):
+        found = matches.get(title_word)
+        if found is None:
+            found = []
+            for position, word in enumerate(words):
+                typos = allowed_typos(word) if title_word.isalpha() else 0 # Like RankedIndex._grams
+                distance = 0 if title_word == word else edit_distance(word, title_word, typos) if typos else None
+                if distance is not None:
+                    found.append((position, TYPO_PENALTY ** distance))
+            if found or title_word.isalpha(): # Words with digits are mostly unique, don't keep them
+                matches[title_word] = found
+        return found
+
+    # One pass for the title lengths and how many titles have each word,
+    # keeping only the titles with a matching word
+    documents = total_length = 0
+    document_counts = {}
+    candidates = []
+    for video_id, title in titles:
+        title_words = tokenize(title)
+        documents += 1
+        total_length += len(title_words)
+        matched = [word for word in set(title_words) if matches_of(word)]
+        for word in matched:
+            document_counts[word] = document_counts.get(word, 0) + 1
+        if matched and video_id not in skip:
+            candidates.append((video_id, title_words, matched))
+    if not candidates:
+        return []
+
+    average_length = total_length / documents
+    # A typo's idf is at most the search word's own, as in RankedIndex
+    exact_idfs = [_idf(document_counts[word], documents) if word in document_counts else float("inf")
+                  for word in words]
+    scored = []
+    for video_id, title_words, matched in candidates:
+        best = [0] * len(words)
+        for word in matched:
+            saturation = _saturation(title_words.count(word), len(title_words), average_length)
+            idf = _idf(document_counts[word], documents)
+            for position, multiplier in matches[word]:
+                best[position] = max(best[position],
+                                     multiplier * min(idf, exact_idfs[position]) * saturation)
+        scored.append((video_id, sum(best)))
+    return nsmallest(k, scored, key=lambda result: (-result[1], result[0]))
@@ -0,0 +1,309 @@
+"""A related videos index class."""
+
+from bisect import bisect_left
+from collections import Counter
+from heapq import nsmallest
+from itertools import combinations
+from itertools import islice
+
+from .tag_index import TagIndex
+
+
+def signature_of(tags):
+    """Returns the normalized tags of a video, sorted and without repeats."""
+    return tuple(sorted({TagIndex.normalize(tag) for tag in tags}))
+
+
+def similarity(signature, other):
+    """Returns the Jaccard similarity of two tag signatures: the tags they
+    share over the tags either of them has."""
+    shared = len(set(signature).intersection(other))
+    return shared / (len(signature) + len(other) - shared)
+
+
+def rank_related(video_id, tags, videos, k=10, skip=()):
+    """Returns the ids of the k videos whose tags are most like the given
+    ones, ranked like RelatedIndex.related, by reading through every video
+    once. For a library without the index.
+
+    Args:
+        video_id: A video url to leave out, e.g. the one whose tags these are.
+        tags: The tags to compare with.
+        videos: Iterable of (video_id, title, tags) of every video.
+        k: How many video ids to return.
+        skip: Video ids to leave out, e.g. the flagged ones.
+
+    Returns:
+        A list of video ids, the most related first.
+    """
+    signature = signature_of(tags)
+    if not signature:
+        return []
+    ranked = ((-similarity(signature, signature_of(other_tags)), title, other_id)
+              for other_id, title, other_tags in videos
+              if other_id != video_id and other_id not in skip)
+    return [other_id for score, _, other_id in nsmallest(k, ranked) if score < 0]
+
+
+class RelatedIndex:
+    """A class used to find the videos sharing the most tags with a video.
+
+    Videos are related by the Jaccard similarity of their tags, the most
+    similar first and ties in title order. Every video with the same tags
+    (the same signature) has the same related videos, so they are worked
+    out once per signature: the first lookup of a signature finds its most
+    similar videos and keeps the first depth of them, later lookups just
+    walk that list, skipping the video itself and any flagged ones.
+
+    Finding them doesn't score every video sharing a tag. A video sharing
+    exactly the tags I of a signature of n tags, with m tags of its own, is
+    |I| / (n + m - |I|) similar to it, so each (I, m) is a cell of videos
+    that are all as similar, and the cells are read most similar first
+    until there are enough videos. A cell of one shared tag is read from
+    that tag's title-sorted list of videos with m tags, skipping those with
+    another of the signature's tags; a cell of several is the intersection
+    of their sets of signatures with m tags, whose videos are then merged.
+    There is a cell for every subset of the signature's tags, so for a
+    signature of many tags it is cheaper to count the tags each signature
+    sharing one of them has in common with it, and read the videos of the
+    most similar signatures.
+
+    Adding or removing a video bumps the version of each of its tags, and a
+    kept list is only used while the versions of its signature's tags are
+    unchanged (a video sharing no tag with a signature can't be related to
+    it), so changes cost nothing until the next lookup.
+    """
+
+    def __init__(self, depth=20):
+        """
+        Args:
+            depth: How many related videos to keep per signature, more are
+                found when flags leave too few of them.
+        """
+        self._depth = depth
+        # (title, video_id, signature) of each video, one tuple shared by
+        # every list the video is in, kept sorted like TagIndex's
+        self._groups = {} # signature -> entries of its videos
+        self._postings = {} # (tag, signature size) -> entries of its videos
+        self._unsorted = set() # keys of either whose list needs sorting (a
+                               # signature's tags are never followed by a size)
+        self._signatures = {} # tag -> {signature size -> set of signatures}
+        self._versions = {} # tag -> changes to its videos so far
+        self._related = {} # signature -> (versions of its tags, how many were asked for, video ids)
+
+    def add(self, video_id, title, tags):
+        """Adds a video.
+
+        Args:
+            video_id: The video url.
+            title: The title of the video.
+            tags: The tags of the video.
+        """
+        signature = signature_of(tags)
+        if not signature:
+            return
+        entry = (title, video_id, signature)
+        group = self._groups.get(signature)
+        if group is None:
+            group = self._groups[signature] = []
+            for tag in signature:
+                self._signatures.setdefault(tag, {}).setdefault(len(signature), set()).add(signature)
+        group.append(entry)
+        self._unsorted.add(signature)
+        for tag in signature:
+            self._postings.setdefault((tag, len(signature)), []).append(entry)
+            self._unsorted.add((tag, len(signature)))
+            self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def remove(self, video_id, title, tags):
+        """Removes a video.
+
+        Args:
+            video_id: The video url.
+            title: The title the video was added with.
+            tags: The tags the video was added with.
+        """
+        signature = signature_of(tags)
+        if not self._discard(self._groups, signature, (title, video_id, signature)):
+            return
+        if signature not in self._groups: # It was the last one
+            self._related.pop(signature, None)
+            for tag in signature:
+                sizes = self._signatures[tag]
+                sizes[len(signature)].discard(signature)
+                if not sizes[len(signature)]:
+                    del sizes[len(signature)]
+                if not sizes:
+                    del self._signatures[tag]
+        for tag in signature:
+            self._discard(self._postings, (tag, len(signature)), (title, video_id, signature))
+            self._versions[tag] += 1
+
+    def _entries(self, lists, key):
+        """Returns the sorted entries of a signature in _groups or a
+        (tag, size) in _postings."""
+        entries = lists.get(key)
+        if entries is None:
+            return []
+        if key in self._unsorted:
+            # Adding only appends, so sort once when the list is next needed
+            entries.sort()
+            self._unsorted.discard(key)
+        return entries
+
+    def _discard(self, lists, key, entry):
+        """Removes an entry from the list of a signature in _groups or a
+        (tag, size) in _postings, and the list if that was its last entry.
+
+        Returns:
+            Whether the entry was there.
+        """
+        entries = self._entries(lists, key)
+        i = bisect_left(entries, entry)
+        if i == len(entries) or entries[i] != entry:
+            return False
+        del entries[i]
+        if not entries:
+            del lists[key]
+            self._unsorted.discard(key)
+        return True
+
+    def related(self, video_id, tags, k=10, skip=()):
+        """Returns the ids of the k videos most related to a video.
+
+        Args:
+            video_id: The video url, never one of the results.
+            tags: The tags of the video, which needn't be those of a video
+                in the index (another shard's, say).
+            k: How many video ids to return.
+            skip: Video ids to leave out, e.g. the flagged ones.
+
+        Returns:
+            A list of video ids, the most related first.
+        """
+        signature = signature_of(tags)
+        if not signature:
+            return []
+        need = self._depth + 1 # The video itself is in its own list
+        while True:
+            video_ids = self._related_ids(signature, need)
+            found = []
+            for related_id in video_ids:
+                if related_id != video_id and related_id not in skip:
+                    found.append(related_id)
+                    if len(found) == k:
+                        return found
+            if len(video_ids) < need: # There are no more
+                return found
+            need = 2 * max(need, k + 1) # Too many of them were skipped
+
+    def precompute(self):
+        """Finds the related videos of every signature that hasn't got them.
+
+        Returns:
+            How many signatures were worked out.
+        """
+        count = 0
+        for signature in list(self._groups):
+            if signature not in self._related or not self._is_current(signature):
+                self._related_ids(signature, self._depth + 1)
+                count += 1
+        return count
+
+    def _is_current(self, signature):
+        """Returns whether the videos of a signature's tags are the same as
+        when its related videos were kept."""
+        return self._related[signature][0] == self._versions_of(signature)
+
+    def _versions_of(self, signature):
+        return tuple(self._versions.get(tag, 0) for tag in signature)
+
+    def _related_ids(self, signature, need):
+        """Returns the ids of the need videos most similar to a signature
+        (fewer if there aren't that many), including its own videos."""
+        if signature in self._related and self._is_current(signature):
+            _, asked, video_ids = self._related[signature]
+            if len(video_ids) >= need or len(video_ids) < asked: # Enough, or all there are
+                return video_ids
+
+        size = len(signature)
+        by_size = [self._signatures.get(tag, {}) for tag in signature]
+        other_sizes = set().union(*by_size)
+        # Every subset of two or more tags is a cell for each size, against
+        # one count per signature sharing a tag
+        if (2 ** size - size - 1) * len(other_sizes) > sum(len(others) for sizes in by_size
+                                                           for others in sizes.values()):
+            levels = self._counted_levels(signature, by_size) # similarity -> signatures
+            runs = lambda others: [self._entries(self._groups, other) for other in others]
+        else:
+            levels = self._cell_levels(signature, other_sizes) # similarity -> (shared tags, other size) of its cells
+            runs = lambda cells: [run for shared, other_size in cells
+                                  for shared_tags in combinations(signature, shared)
+                                  for run in self._cell(signature, shared_tags, other_size)]
+
+        video_ids = []
+        for score in sorted(levels, reverse=True):
+            wanted = need - len(video_ids)
+            entries = [] # the first wanted of each cell as similar
+            for run in runs(levels[score]):
+                entries.extend(islice(run, wanted))
+            # Ties are in title order, across every cell as similar
+            entries.sort()
+            video_ids.extend(entry[1] for entry in islice(entries, wanted))
+            if len(video_ids) == need:
+                break
+        self._related[signature] = (self._versions_of(signature), need, video_ids)
+        return video_ids
+
+    @staticmethod
+    def _cell_levels(signature, other_sizes):
+        """Returns a dict of similarity -> (shared tags, other size) of the
+        cells that similar to a signature."""
+        size = len(signature)
+        levels = {}
+        for shared in range(1, size + 1):
+            for other_size in other_sizes:
+                if other_size >= shared:
+                    levels.setdefault(shared / (size + other_size - shared), []).append((shared, other_size))
+        return levels
+
+    @staticmethod
+    def _counted_levels(signature, by_size):
+        """Returns a dict of similarity -> signatures that similar to a
+        signature, by counting the tags each one sharing any has in common
+        with it.
+
+        Args:
+            signature: The signature.
+            by_size: The dict of signature size -> set of signatures of
+                each of its tags.
+        """
+        shared = Counter()
+        for sizes in by_size:
+            for others in sizes.values():
+                shared.update(others)
+        size = len(signature)
+        levels = {}
+        for other, count in shared.items():
+            levels.setdefault(count / (size + len(other) - count), []).append(other)
+        return levels
+
+    def _cell(self, signature, shared_tags, other_size):
+        """Returns the sorted runs of entries of the videos with other_size
+        tags sharing exactly shared_tags with a signature."""
+        others = set(signature).difference(shared_tags)
+        if len(shared_tags) == 1:
+            key = (shared_tags[0], other_size)
+            if key not in self._postings:
+                return []
+            entries = self._entries(self._postings, key)
+            if not others or other_size == 1:
+                return [entries]
+            return [(entry for entry in entries if others.isdisjoint(entry[2]))]
+
+        by_size = [self._signatures.get(tag, {}).get(other_size) for tag in shared_tags]
+        if not all(by_size):
+            return []
+        by_size.sort(key=len) # Start from the smallest set
+        return [self._entries(self._groups, other) for other in by_size[0].intersection(*by_size[1:])
+                if others.isdisjoint(other)]
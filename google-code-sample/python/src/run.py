@@ -1,21 +1,164 @@
-"""A youtube terminal simulator."""
-from .video_player import VideoPlayer
-from .command_parser import CommandException
-from .command_parser import CommandParser
-
-
-if __name__ == "__main__":
-    print("""Hello and welcome to YouTube, what would you like to do?
-    Enter HELP for list of available commands or EXIT to terminate.""")
-    video_player = VideoPlayer()
-    parser = CommandParser(video_player)
-    while True:
-        command = input("YT> ")
-        if command.upper() == "EXIT":
-            break
-        try:
-            parser.execute_command(command.split())
-        except CommandException as e:
-            print(e)
-    print("YouTube has now terminated its execution. "
-          "Thank you and goodbye!")
+"""A youtube terminal simulator."""
+import argparse
+import contextlib
+import io
+import sys
+import threading
+import time
+
+from .sharded_library import ShardedVideoLibrary
+from .video_library import VideoLibrary
+from .video_player import VideoPlayer
+from .command_parser import CommandException
+from .command_parser import CommandParser
+from .state_store import StateStore
+from .catalog_watcher import CatalogWatcher
+from .metrics import Metrics
+
+
+def _complete_with_tab(parser, lock):
+    """Makes the tab key complete commands, video ids and playlist names
+    (see CommandParser.complete) where the readline module is available."""
+    try:
+        import readline
+    except ImportError: # Not on every platform
+        return
+
+    matches = []
+    def complete(text, state):
+        if state == 0: # Asked for each match in turn, find them all on the first
+            with lock:
+                matches[:] = parser.complete(readline.get_line_buffer()[:readline.get_begidx()].split(), text)
+        return matches[state] if state < len(matches) else None
+
+    readline.set_completer(complete)
+    readline.set_completer_delims(" ")
+    readline.parse_and_bind("tab: complete")
+
+
+def run_interactive(parser, lock=None):
+    """Reads commands from the user until they enter EXIT.
+
+    Args:
+        parser: The CommandParser to run the commands with.
+        lock: Held while a command runs, if another thread changes the library.
+    """
+    lock = lock if lock is not None else contextlib.nullcontext()
+    _complete_with_tab(parser, lock)
+    print("""Hello and welcome to YouTube, what would you like to do?
+    Enter HELP for list of available commands or EXIT to terminate.""")
+    while True:
+        command = input("YT> ")
+        if command.upper() == "EXIT":
+            break
+        try:
+            with lock:
+                parser.execute_command(command.split())
+        except CommandException as e:
+            print(e)
+    print("YouTube has now terminated its execution. "
+          "Thank you and goodbye!")
+
+
+def run_script(parser, video_player, lines, lock=None):
+    """Runs every command in lines without waiting on the user.
+
+    The player must have been made with prompt=None: when a command asks a
+    question (which search result to play), the next line is the answer,
+    just like it would be typed in the interactive session.
+
+    Args:
+        parser: The CommandParser to run the commands with.
+        video_player: The VideoPlayer the parser runs commands on.
+        lines: The commands, one per line.
+        lock: Held while a command runs, if another thread changes the library.
+
+    Returns:
+        How many lines were run.
+    """
+    lock = lock if lock is not None else contextlib.nullcontext()
+    count = 0
+    for line in lines:
+        count += 1
+        if line.strip().upper() == "EXIT" and not video_player.has_pending_prompt:
+            break
+        try:
+            with lock:
+                if video_player.has_pending_prompt:
+                    video_player.answer_prompt(line.strip())
+                else:
+                    parser.execute_command(line.split())
+        except CommandException as e:
+            print(e)
+    return count
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--catalog", help="video catalog to load instead of the bundled videos.txt")
+    arg_parser.add_argument("--lazy", action="store_true",
+                            help="memory-map the catalog and only load videos as they are used")
+    arg_parser.add_argument("--workers", type=int, default=1,
+                            help="processes to parse the catalog with (default: %(default)s)")
+    arg_parser.add_argument("--script", metavar="FILE",
+                            help="run the commands in FILE (- for stdin) instead of asking for them")
+    arg_parser.add_argument("--precompute-related", action="store_true",
+                            help="work out every video's related videos while loading, not on their first lookup")
+    arg_parser.add_argument("--shards", type=int, default=1,
+                            help="processes to split the library between (default: %(default)s, this one)")
+    arg_parser.add_argument("--state", metavar="DIR",
+                            help="keep playlists and flags in DIR, so they are still there next time")
+    arg_parser.add_argument("--watch", action="store_true",
+                            help="reload the catalog whenever its file changes")
+    arg_parser.add_argument("--metrics", action="store_true",
+                            help="count and time every command, see the STATS command")
+    arg_parser.add_argument("--metrics-file", metavar="FILE",
+                            help="collect metrics and write them to FILE (Prometheus text format) on exit")
+    args = arg_parser.parse_args()
+    if args.shards > 1 and args.lazy:
+        arg_parser.error("--shards can't be used with --lazy")
+
+    if args.shards > 1:
+        video_library = ShardedVideoLibrary(args.catalog, args.shards,
+                                            precompute_related=args.precompute_related)
+    else:
+        video_library = VideoLibrary(args.catalog, lazy=args.lazy, workers=args.workers,
+                                     precompute_related=args.precompute_related)
+    store = StateStore(args.state) if args.state is not None else None
+    lock = threading.RLock() if args.watch else None
+    metrics = Metrics() if args.metrics or args.metrics_file else None
+    watcher = None
+    try:
+        if args.script is None:
+            video_player = VideoPlayer(video_library, store=store)
+        else: # Questions are answered by the next line of the script
+            video_player = VideoPlayer(video_library, prompt=None, store=store)
+        if metrics is not None:
+            video_player.register_metrics(metrics)
+        if args.watch:
+            watcher = CatalogWatcher(video_library, video_player, lock)
+            watcher.start()
+        if args.script is None:
+            run_interactive(CommandParser(video_player, metrics), lock)
+            sys.exit()
+
+        parser = CommandParser(video_player, metrics)
+        script = sys.stdin if args.script == "-" else open(args.script)
+        # Write the output in big blocks rather than a line at a time
+        output = io.TextIOWrapper(open(sys.stdout.fileno(), "wb", buffering=1 << 16, closefd=False))
+        with script, contextlib.redirect_stdout(output):
+            start = time.perf_counter()
+            count = run_script(parser, video_player, script, lock)
+            elapsed = time.perf_counter() - start
+            output.flush()
+        print(f"Ran {count} commands in {elapsed:.3f}s "
+              f"({count / elapsed if elapsed else 0:.0f} commands/sec)", file=sys.stderr)
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        if store is not None:
+            store.close() # Sync the last batch of changes
+        if args.metrics_file is not None:
+            metrics.write(args.metrics_file)
+        if args.shards > 1:
+            video_library.close()
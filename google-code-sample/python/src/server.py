@@ -0,0 +1,223 @@
+"""A server letting many users use one video library at the same time.
+
+Clients connect over TCP or a Unix socket and send the same commands as
+the terminal, one per line. Each reply is the command's output followed
+by a line holding only ".", and output lines starting with "." get
+another "." in front (as in SMTP), so a client reads until the lone ".".
+The welcome message is sent the same way when a client connects, and the
+line after a search answers its "play which video?" question.
+
+Every connection gets its own VideoPlayer session (current video, paused
+state, pages), sharing the library, its indexes, the playlists and the
+flags with the others. RELOAD_LIBRARY only reloads the catalog the server
+was started with: a client can't make it read another file of the
+server's.
+
+To serve on localhost port 8765, from the python directory:
+    python3 -m src.server --port 8765
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import threading
+import time
+
+from .command_parser import CommandException
+from .command_parser import CommandParser
+from .catalog_watcher import CatalogWatcher
+from .metrics import Metrics
+from .sharded_library import ShardedVideoLibrary
+from .state_store import StateStore
+from .video_library import VideoLibrary
+from .video_player import VideoPlayer
+
+WELCOME = ("Hello and welcome to YouTube, what would you like to do?\n"
+           "Enter HELP for list of available commands or EXIT to terminate.\n")
+GOODBYE = "YouTube has now terminated its execution. Thank you and goodbye!\n"
+
+
+def frame(output):
+    """Returns command output as a reply for the line protocol."""
+    lines = output.splitlines()
+    return "".join(("." + line if line.startswith(".") else line) + "\n" for line in lines) + ".\n"
+
+
+class VideoServer:
+    """A class used to serve one video player to many connections."""
+
+    def __init__(self, video_player, metrics=None):
+        """
+        Args:
+            video_player: The player whose library, playlists and flags
+                every session shares.
+            metrics: A Metrics every session's commands are counted and
+                timed in, None to not measure anything.
+        """
+        self._player = video_player
+        self._metrics = metrics
+        if metrics is not None:
+            video_player.register_metrics(metrics)
+            metrics.define("yt_server_sessions", "gauge", "Clients connected to the server.")
+            metrics.read_from("yt_server_sessions", lambda: self.sessions)
+        # Held while a command runs. Commands run one at a time on the event
+        # loop, so this only matters to threads outside it changing the same
+        # playlists, flags or library, which take it too.
+        self.lock = threading.RLock()
+        # Held from reading a catalog until its changes are applied, so
+        # reloads run one after another and each one compares the catalog
+        # with the library the one before it left.
+        self.reload_lock = threading.Lock()
+        self.sessions = 0
+
+    def run_command(self, parser, session, line):
+        """Runs one line for a session and returns what it printed."""
+        output = io.StringIO()
+        with self.lock, contextlib.redirect_stdout(output):
+            if session.has_pending_prompt:
+                session.answer_prompt(line.strip())
+            else:
+                try:
+                    parser.execute_command(line.split())
+                except CommandException as e:
+                    print(e)
+        return output.getvalue()
+
+    async def reload_library(self, session, args=()):
+        """Runs RELOAD_LIBRARY for a session and returns what it printed.
+
+        The library's own catalog is read and compared with the library in
+        another thread while the other sessions' commands carry on, only
+        applying the changes holds them up. A catalog path is refused. It
+        is counted and timed as a RELOAD_LIBRARY command, as the parser
+        does for the others.
+
+        Args:
+            session: The VideoPlayer of the connection.
+            args: The words after RELOAD_LIBRARY.
+        """
+        labels = (("command", "RELOAD_LIBRARY"),)
+        start = time.perf_counter()
+        try:
+            if args:
+                if self._metrics is not None:
+                    self._metrics.inc("yt_command_errors_total", labels)
+                return ("Please enter RELOAD_LIBRARY without a catalog path, "
+                        "the server only reloads the catalog it was started with.\n")
+            return await asyncio.to_thread(self._reload, session)
+        finally:
+            if self._metrics is not None:
+                self._metrics.observe("yt_command_duration_seconds", labels, time.perf_counter() - start)
+                self._metrics.inc("yt_commands_total", labels)
+
+    def _reload(self, session):
+        """Reads the library's catalog and applies its changes for a
+        session, holding the reload lock throughout, and returns what it
+        printed."""
+        output = io.StringIO()
+        with self.reload_lock:
+            try:
+                changes = session.video_library.read_changes()
+            except (OSError, ValueError) as e:
+                return f"Cannot reload library: {e}\n"
+            with self.lock, contextlib.redirect_stdout(output):
+                session.apply_library_changes(changes)
+        return output.getvalue()
+
+    async def handle_connection(self, reader, writer):
+        """Serves one client until it sends EXIT or disconnects."""
+        session = self._player.new_session()
+        parser = CommandParser(session, self._metrics)
+        self.sessions += 1
+        try:
+            writer.write(frame(WELCOME).encode("utf-8"))
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode("utf-8", errors="replace")
+                if not session.has_pending_prompt and line.strip().upper() == "EXIT":
+                    writer.write(frame(GOODBYE).encode("utf-8"))
+                    await writer.drain()
+                    break
+                words = line.split()
+                if not session.has_pending_prompt and words and words[0].upper() == "RELOAD_LIBRARY":
+                    output = await self.reload_library(session, words[1:])
+                else:
+                    output = self.run_command(parser, session, line)
+                writer.write(frame(output).encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass # The client went away, nothing to tell it
+        finally:
+            self.sessions -= 1
+            session.close()
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, path=None):
+        """Accepts connections until cancelled.
+
+        Args:
+            host: The address to listen on.
+            port: The TCP port to listen on.
+            path: A Unix socket to listen on instead of TCP.
+        """
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path, backlog=4096)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Serves the video player to many clients at once.")
+    arg_parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    arg_parser.add_argument("--port", type=int, default=8765, help="TCP port to listen on")
+    arg_parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    arg_parser.add_argument("--catalog", help="video catalog to load instead of the bundled videos.txt")
+    arg_parser.add_argument("--lazy", action="store_true",
+                            help="memory-map the catalog and only load videos as they are used")
+    arg_parser.add_argument("--precompute-related", action="store_true",
+                            help="work out every video's related videos while loading, not on their first lookup")
+    arg_parser.add_argument("--shards", type=int, default=1,
+                            help="processes to split the library between (default: %(default)s, this one)")
+    arg_parser.add_argument("--state", metavar="DIR",
+                            help="keep playlists and flags in DIR, so they are still there next time")
+    arg_parser.add_argument("--watch", action="store_true",
+                            help="reload the catalog whenever its file changes")
+    arg_parser.add_argument("--metrics", action="store_true",
+                            help="count and time every command, see the STATS command")
+    arg_parser.add_argument("--metrics-file", metavar="FILE",
+                            help="collect metrics and write them to FILE (Prometheus text format) on exit")
+    args = arg_parser.parse_args()
+    if args.shards > 1 and args.lazy:
+        arg_parser.error("--shards can't be used with --lazy")
+
+    store = StateStore(args.state) if args.state is not None else None
+    if args.shards > 1:
+        video_library = ShardedVideoLibrary(args.catalog, args.shards,
+                                            precompute_related=args.precompute_related)
+    else:
+        video_library = VideoLibrary(args.catalog, lazy=args.lazy, precompute_related=args.precompute_related)
+    player = VideoPlayer(video_library, prompt=None, store=store)
+    metrics = Metrics() if args.metrics or args.metrics_file else None
+    server = VideoServer(player, metrics)
+    watcher = CatalogWatcher(video_library, player, server.lock, server.reload_lock) if args.watch else None
+    try:
+        if watcher is not None:
+            watcher.start()
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        if store is not None:
+            store.close()
+        if args.metrics_file is not None:
+            metrics.write(args.metrics_file)
+        if args.shards > 1:
+            video_library.close()
@@ -0,0 +1,487 @@
+"""A sharded video library class."""
+
+from .facet_index import top_facets
+from .related_index import signature_of
+from .related_index import similarity
+from .video_library import CatalogChanges
+from .video_library import VideoLibrary
+from .video_library import shard_of
+from collections import Counter
+from heapq import merge, nsmallest
+from itertools import islice
+from pathlib import Path
+import multiprocessing
+import random
+import threading
+import weakref
+
+PAGE_SIZE = 1024 # Videos a shard sends at a time when listing them all
+
+
+def _title_order(video):
+    return video.title, video.video_id
+
+
+class _Shard:
+    """A class used to run a shard's requests on its VideoLibrary, in the shard's process.
+
+    Requests are VideoLibrary's methods, except the ones below, which send
+    back what the parent needs (lists instead of iterators, seeds instead
+    of random generators, what add_video did).
+    """
+
+    def __init__(self, video_library):
+        self._library = video_library
+
+    def __getattr__(self, name):
+        return getattr(self._library, name)
+
+    def add_video(self, video):
+        replaced = self._library.get_video(video.video_id) is not None
+        self._library.add_video(video)
+        return replaced, video.flag # Its flag may have been in the registry already
+
+    def videos_by_title(self, start, count):
+        return list(islice(self._library.iter_videos_by_title(start), count))
+
+    def videos(self, start, count):
+        return list(islice(self._library.iter_videos(), start, start + count))
+
+    def videos_with_tags(self, tags, match_all, include_flagged):
+        return list(self._library.videos_with_tags(tags, match_all, include_flagged))
+
+    def random_video(self, seed, tag_weights):
+        return self._library.random_video(random.Random(seed), tag_weights)
+
+
+def _serve_shard(connection, catalog_path, shard, use_snapshot, precompute_related):
+    """Loads one shard of a catalog, then answers requests for it until told to stop."""
+    try:
+        shard_library = _Shard(VideoLibrary(catalog_path, use_snapshot=use_snapshot, shard=shard,
+                                                   precompute_related=precompute_related))
+    except Exception as e:
+        connection.send(("error", e))
+        return
+    connection.send(("ok", None))
+
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError: # The parent has gone
+            return
+        if request is None:
+            return
+        method, args = request
+        try:
+            connection.send(("ok", getattr(shard_library, method)(*args)))
+        except Exception as e:
+            connection.send(("error", e))
+
+
+class ShardedVideoLibrary:
+    """A class used to spread a Video Library over worker processes.
+
+    Videos are split between shards by a hash of their video_id (see
+    shard_of), and each shard is a VideoLibrary of its own videos, with
+    their indexes and flags, in a process of its own. A lookup by
+    video_id goes to the shard that has it, while a search goes to every
+    shard at once and their title ordered results are merged. It has the
+    methods of VideoLibrary a VideoPlayer uses, so a player can play from
+    it unchanged.
+
+    The videos it hands out are copies made by the shards. The ones still
+    in use somewhere (playlists, the current video) are remembered, so a
+    video_id always gives the same object and a flag shows on it.
+    """
+
+    def __init__(self, catalog_path=None, shards=2, use_snapshot=True, precompute_related=False):
+        """
+        Args:
+            catalog_path: The catalog file to load, videos.txt next to
+                this module by default.
+            shards: How many processes to split the videos between.
+            use_snapshot: True for each shard to read the catalog's
+                snapshot when it is up to date, see VideoLibrary.
+            precompute_related: True for each shard to work out its videos'
+                related videos while loading, see VideoLibrary.
+        """
+        if catalog_path is None:
+            catalog_path = Path(__file__).parent / "videos.txt"
+        self._catalog_path = catalog_path
+        self._listeners = [] # called with (event, video) on every change
+        self._live = weakref.WeakValueDictionary() # videos still held elsewhere
+        self._lock = threading.Lock() # One request and reply at a time on the pipes
+        self._connections = []
+        self._processes = []
+        # New interpreters rather than forks, so a shard's heap only holds its own videos
+        context = multiprocessing.get_context("spawn")
+        for index in range(shards):
+            connection, shard_connection = context.Pipe()
+            process = context.Process(
+                target=_serve_shard, args=(shard_connection, catalog_path, (index, shards), use_snapshot,
+                                            precompute_related),
+                name=f"VideoLibraryShard-{index}", daemon=True)
+            process.start()
+            shard_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+        # Every shard loads at the same time, wait for all of them
+        try:
+            self._receive_all()
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        """Stops the shard processes."""
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except OSError: # Already stopped
+                pass
+        for process in self._processes:
+            process.join()
+        self._connections, self._processes = [], []
+
+    @staticmethod
+    def _receive(connection):
+        status, value = connection.recv()
+        if status == "error":
+            raise value
+        return value
+
+    def _receive_all(self):
+        """Reads every shard's reply, then raises the first error among them
+        (reading them all keeps the replies in step with the requests)."""
+        replies = [connection.recv() for connection in self._connections]
+        for status, value in replies:
+            if status == "error":
+                raise value
+        return [value for _, value in replies]
+
+    def _call(self, video_id, method, *args):
+        """Runs a request on the shard that has video_id and returns its reply."""
+        connection = self._connections[shard_of(video_id, len(self._connections))]
+        with self._lock:
+            connection.send((method, args))
+            return self._receive(connection)
+
+    def _scatter(self, method, *args):
+        """Runs a request on every shard at once and returns their replies, in shard order."""
+        with self._lock:
+            for connection in self._connections:
+                connection.send((method, args))
+            return self._receive_all()
+
+    def _adopt(self, video):
+        """Returns the object in use for a video a shard sent, if there is
+        one, else starts using the one sent."""
+        if video is None:
+            return None
+        live = self._live.get(video.video_id)
+        if live is not None:
+            return live
+        self._live[video.video_id] = video
+        return video
+
+    def __len__(self):
+        return sum(self._scatter("__len__"))
+
+    @property
+    def catalog_path(self):
+        """The catalog file the library was loaded from."""
+        return self._catalog_path
+
+    def register_metrics(self, metrics):
+        """Adds gauges for the size of the library to a Metrics."""
+        metrics.define("yt_library_videos", "gauge", "Videos in the library.")
+        metrics.read_from("yt_library_videos", self.__len__)
+        metrics.define("yt_library_playable_videos", "gauge", "Videos in the library that aren't flagged.")
+        metrics.read_from("yt_library_playable_videos", self.number_of_playable_videos)
+        metrics.define("yt_library_shards", "gauge", "Processes the library is split between.")
+        metrics.read_from("yt_library_shards", self._connections.__len__)
+
+    def add_listener(self, listener):
+        """Asks to be told about every change to the library, see VideoLibrary.add_listener."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Stops telling a listener about changes."""
+        self._listeners.remove(listener)
+
+    def _notify(self, event, video):
+        for listener in self._listeners:
+            listener(event, video)
+
+    def add_video(self, video):
+        """Adds a video to the shard it belongs in.
+
+        Args:
+            video: The Video object to add. Replaces any video with the
+                same video_id.
+        """
+        replaced, flag = self._call(video.video_id, "add_video", video)
+        video.set_flag(flag)
+        self._live[video.video_id] = video
+        self._notify("changed" if replaced else "added", video)
+
+    def remove_video(self, video_id):
+        """Removes a video from its shard.
+
+        Returns:
+            The removed Video object. None if the video does not exist.
+        """
+        video = self._call(video_id, "remove_video", video_id)
+        if video is not None:
+            video = self._live.pop(video_id, video)
+            self._notify("removed", video)
+        return video
+
+    def read_changes(self, catalog_path=None):
+        """Compares a catalog file with the videos in the library, each shard
+        with its own, see VideoLibrary.read_changes.
+
+        Returns:
+            The CatalogChanges.
+        """
+        if catalog_path is None:
+            catalog_path = self._catalog_path
+        changes = self._scatter("read_changes", catalog_path)
+        return CatalogChanges(*([video for shard in changes for video in getattr(shard, field)]
+                                for field in CatalogChanges._fields))
+
+    def apply_changes(self, changes):
+        """Makes the changes read_changes found.
+
+        Args:
+            changes: The CatalogChanges.
+        """
+        for video_id in changes.removed:
+            self.remove_video(video_id)
+        for video in changes.changed:
+            self.add_video(video)
+        for video in changes.added:
+            self.add_video(video)
+
+    def reload(self, catalog_path=None):
+        """Reads a catalog file again and applies only what changed in it.
+
+        Returns:
+            The CatalogChanges made.
+        """
+        changes = self.read_changes(catalog_path)
+        self.apply_changes(changes)
+        return changes
+
+    def get_all_videos(self):
+        """Returns all available video information from the video library."""
+        return list(self.iter_videos())
+
+    def _pages(self, method, shard):
+        """Yields one shard's videos, asking for a page of them at a time."""
+        connection = self._connections[shard]
+        start = 0
+        while True:
+            with self._lock:
+                connection.send((method, (start, PAGE_SIZE)))
+                page = self._receive(connection)
+            yield from map(self._adopt, page)
+            if len(page) < PAGE_SIZE:
+                return
+            start += PAGE_SIZE
+
+    def iter_videos(self):
+        """Yields every video, a shard at a time."""
+        for shard in range(len(self._connections)):
+            yield from self._pages("videos", shard)
+
+    def iter_videos_by_title(self, start=0):
+        """Yields every video sorted by title, merging the shards' listings.
+
+        Args:
+            start: How many videos to skip from the beginning.
+        """
+        listings = [self._pages("videos_by_title", shard) for shard in range(len(self._connections))]
+        yield from islice(merge(*listings, key=_title_order), start, None)
+
+    def flag_video(self, video_id, flag_reason):
+        """Flags a video so it can't be played.
+
+        Returns:
+            The flagged Video object. None if the video does not exist.
+        """
+        flagged = self._call(video_id, "flag_video", video_id, flag_reason)
+        video = self._adopt(flagged)
+        if video is not None:
+            video.set_flag(flagged.flag)
+            self._notify("flagged", video)
+        return video
+
+    def allow_video(self, video_id):
+        """Removes the flag from a video.
+
+        Returns:
+            The allowed Video object. None if the video does not exist.
+        """
+        video = self._adopt(self._call(video_id, "allow_video", video_id))
+        if video is not None:
+            video.set_flag(None)
+            self._notify("allowed", video)
+        return video
+
+    def flag_reason(self, video_id):
+        """Returns why a video was flagged, None if it isn't flagged."""
+        return self._call(video_id, "flag_reason", video_id)
+
+    def flagged_videos(self):
+        """Returns every flagged video, sorted by title."""
+        return [self._adopt(video) for video in merge(*self._scatter("flagged_videos"), key=_title_order)]
+
+    def number_of_playable_videos(self):
+        """Returns how many videos aren't flagged."""
+        return sum(self._scatter("number_of_playable_videos"))
+
+    def random_video(self, rng=random, tag_weights=None):
+        """Returns a random video that isn't flagged.
+
+        A shard is picked with a chance in proportion to its playable
+        videos, then picks one of them. Unweighted, every video is as
+        likely as in a VideoLibrary. With tag_weights the shards don't
+        weigh their videos against each other's, which hashing video ids
+        evenly between them makes close.
+
+        Args:
+            rng: The random number generator to use.
+            tag_weights: Optional dict of tag -> weight, see VideoLibrary.random_video.
+
+        Returns:
+            A Video object. None if every video is flagged.
+        """
+        playable = self._scatter("number_of_playable_videos")
+        if not any(playable):
+            return None
+        shard = rng.choices(range(len(playable)), weights=playable)[0]
+        with self._lock:
+            connection = self._connections[shard]
+            connection.send(("random_video", (rng.getrandbits(64), tag_weights)))
+            return self._adopt(self._receive(connection))
+
+    def get_video(self, video_id):
+        """Returns the video object (title, url, tags) from the shard that has it.
+
+        Returns:
+            The Video object for the requested video_id. None if the video
+            does not exist.
+        """
+        video = self._live.get(video_id)
+        if video is None: # Not in use, ask its shard
+            video = self._adopt(self._call(video_id, "get_video", video_id))
+        return video
+
+    def search_titles(self, search_term, include_flagged=False):
+        """Returns the videos whose titles contain the search_term, searching every shard at once.
+
+        Returns:
+            A list of Video objects, sorted by title.
+        """
+        found = self._scatter("search_titles", search_term, include_flagged)
+        return [self._adopt(video) for video in merge(*found, key=_title_order)]
+
+    def ranked_search(self, search_term, k=10, include_flagged=False, with_scores=False):
+        """Returns the k videos whose titles best match the search_term, see
+        VideoLibrary.ranked_search.
+
+        Every shard ranks its own titles, by how rare the words are among
+        them rather than the whole library (which hashing video ids evenly
+        between the shards makes close), and the best k of all are kept.
+        """
+        found = self._scatter("ranked_search", search_term, k, include_flagged, True)
+        best = nsmallest(k, (result for shard in found for result in shard),
+                         key=lambda result: (-result[1], result[0].video_id))
+        if with_scores:
+            return [(self._adopt(video), score) for video, score in best]
+        return [self._adopt(video) for video, _ in best]
+
+    def related_videos(self, video_id, k=10, include_flagged=False):
+        """Returns the k videos sharing the most tags with a video, see
+        VideoLibrary.related_videos.
+
+        Returns:
+            A list of Video objects, most related first. None if the video
+            does not exist.
+        """
+        video = self.get_video(video_id)
+        if video is None:
+            return None
+        return self.similar_videos(video.tags, k, include_flagged, exclude=video_id)
+
+    def similar_videos(self, tags, k=10, include_flagged=False, exclude=None):
+        """Returns the k videos whose tags are most like the given ones, the
+        best k of every shard's best k.
+
+        Returns:
+            A list of Video objects, most similar first.
+        """
+        signature = signature_of(tags)
+        found = self._scatter("similar_videos", list(tags), k, include_flagged, exclude)
+        best = nsmallest(k, (video for shard in found for video in shard),
+                         key=lambda video: (-similarity(signature, signature_of(video.tags)),) + _title_order(video))
+        return [self._adopt(video) for video in best]
+
+    def videos_with_tags(self, tags, match_all=True, include_flagged=False):
+        """Returns the videos with the given tags, sorted by title, searching every shard at once.
+
+        Returns:
+            An iterable of Video objects.
+        """
+        found = self._scatter("videos_with_tags", list(tags), match_all, include_flagged)
+        return map(self._adopt, merge(*found, key=_title_order))
+
+    def tag_counts(self):
+        """Returns how many playable videos have each tag, adding up every shard's counts.
+
+        Returns:
+            A dict of normalized tag -> videos with it.
+        """
+        counts = Counter()
+        for shard in self._scatter("tag_counts"):
+            counts.update(shard)
+        return dict(counts)
+
+    def facets(self, video_ids, k=10, tags=None, match_all=True):
+        """Returns the tags most of some videos have, see VideoLibrary.facets.
+
+        Each shard counts every tag of its own videos (the top k of each
+        shard needn't add up to the top k of all), at the same time.
+
+        Returns:
+            A list of (normalized tag, videos with it), most videos first,
+            ties in tag order.
+        """
+        shards = [[] for _ in self._connections]
+        for video_id in video_ids:
+            shards[shard_of(video_id, len(shards))].append(video_id)
+        with self._lock:
+            for connection, shard_ids in zip(self._connections, shards):
+                connection.send(("facets", (shard_ids, None)))
+            found = self._receive_all()
+        counts = Counter()
+        for shard in found:
+            counts.update(dict(shard))
+        return top_facets(counts, k)
+
+    def complete_video_ids(self, prefix, k=10):
+        """Returns the first k video ids, in order, that start with prefix, the first k of every shard's."""
+        return list(islice(merge(*self._scatter("complete_video_ids", prefix, k)), k))
+
+    def complete_titles(self, prefix, k=10):
+        """Returns the first k videos whose titles start with prefix, ignoring
+        case, the first k of every shard's.
+
+        Returns:
+            A list of Video objects, sorted by lowercased title.
+        """
+        found = self._scatter("complete_titles", prefix, k)
+        videos = merge(*found, key=lambda video: (video.title.lower(), video.video_id))
+        return [self._adopt(video) for video in islice(videos, k)]
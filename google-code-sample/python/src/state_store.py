@@ -0,0 +1,230 @@
+"""A persistent store for playlists and flags.
+
+Every change to a playlist or flag is appended to a write-ahead log as it
+happens, and every so often the whole state is written to a snapshot and
+the log emptied, so recovering only has to read the snapshot and the
+changes made since.
+
+Each log line is "<crc32> <json record>", the record being
+[sequence number, operation, arguments...]. A line that was only half
+written when the program died fails its checksum and is dropped along
+with anything after it. The snapshot holds the sequence number of the
+last record it includes, so records still in the log from before a
+snapshot (if the program died between writing one and emptying the log)
+are skipped rather than applied twice.
+"""
+
+from pathlib import Path
+import json
+import os
+import time
+import zlib
+
+LOG_NAME = "state.log"
+SNAPSHOT_NAME = "state.snapshot"
+
+
+def _fsync_directory(directory):
+    """Makes a file created or renamed in directory survive a crash."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError: # Directories can't be opened on Windows, nor need to be
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SavedState:
+    """A class used to hold the playlists and flags read back from a store.
+
+    Attributes:
+        playlists: playlist key (lower case name) -> [name, {video_id: None}],
+            the video_ids in the order they were added.
+        flags: video_id -> flag reason.
+    """
+
+    def __init__(self, playlists=None, flags=None):
+        self.playlists = playlists if playlists is not None else {}
+        self.flags = flags if flags is not None else {}
+
+    def apply(self, operation, *args):
+        """Applies one logged change."""
+        if operation == "create":
+            key, name = args
+            self.playlists[key] = [name, {}]
+        elif operation == "delete":
+            self.playlists.pop(args[0], None)
+        elif operation == "add":
+            key, *video_ids = args
+            if key in self.playlists:
+                self.playlists[key][1].update(dict.fromkeys(video_ids))
+        elif operation == "remove":
+            key, video_id = args
+            if key in self.playlists:
+                self.playlists[key][1].pop(video_id, None)
+        elif operation == "clear":
+            if args[0] in self.playlists:
+                self.playlists[args[0]][1].clear()
+        elif operation == "flag":
+            video_id, reason = args
+            self.flags[video_id] = reason
+        elif operation == "allow":
+            self.flags.pop(args[0], None)
+        else:
+            raise ValueError(f"Unknown logged operation: {operation}")
+
+    def to_json(self):
+        return {"playlists": {key: [name, list(video_ids)] for key, (name, video_ids) in self.playlists.items()},
+                "flags": self.flags}
+
+    @classmethod
+    def from_json(cls, data):
+        playlists = {key: [name, dict.fromkeys(video_ids)] for key, (name, video_ids) in data["playlists"].items()}
+        return cls(playlists, data["flags"])
+
+
+class StateStore:
+    """A class used to keep playlists and flags on disk.
+
+    Writes are flushed to the operating system straight away, so nothing is
+    lost if the program dies, but fsync (which waits for the disk) is only
+    called once per sync_every records or sync_interval seconds. A power cut
+    can lose that last batch, never corrupt what came before it.
+    """
+
+    def __init__(self, directory, sync_every=64, sync_interval=0.5, compact_every=10_000):
+        """
+        Args:
+            directory: Where to keep the log and snapshot, created if needed.
+            sync_every: Most records written before waiting on an fsync.
+            sync_interval: Most seconds a record goes without an fsync,
+                checked when the next one is written.
+            compact_every: How many records the log grows to before
+                needs_compaction asks for a snapshot.
+        """
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._log_path = self._directory / LOG_NAME
+        self._snapshot_path = self._directory / SNAPSHOT_NAME
+        self._sync_every = sync_every
+        self._sync_interval = sync_interval
+        self._compact_every = compact_every
+
+        self._log = None
+        self._sequence = 0 # Number of the last record written
+        self._log_records = 0 # Records in the log since the last snapshot
+        self._unsynced = 0
+        self._unsynced_since = None
+
+    def recover(self):
+        """Reads the snapshot and replays the log after it.
+
+        Must be called once before anything is written. Cuts off a half
+        written record at the end of the log, if there is one.
+
+        Returns:
+            The SavedState.
+        """
+        state = SavedState()
+        if self._snapshot_path.exists():
+            with open(self._snapshot_path, encoding="utf-8") as snapshot:
+                data = json.load(snapshot)
+            state = SavedState.from_json(data)
+            self._sequence = data["sequence"]
+
+        good_length = 0
+        if self._log_path.exists():
+            with open(self._log_path, "rb") as log:
+                for line in log:
+                    record = self._decode(line)
+                    if record is None:
+                        break # Torn write, nothing after it can be trusted
+                    good_length += len(line)
+                    sequence, operation, *args = record
+                    if sequence <= self._sequence:
+                        continue # Already in the snapshot
+                    state.apply(operation, *args)
+                    self._sequence = sequence
+                    self._log_records += 1
+
+        self._log = open(self._log_path, "ab")
+        if self._log.tell() != good_length:
+            self._log.truncate(good_length)
+            self._log.seek(good_length)
+        return state
+
+    @staticmethod
+    def _decode(line):
+        """Returns the record on a log line, None if the line is damaged."""
+        checksum, _, payload = line.rstrip(b"\n").partition(b" ")
+        if not line.endswith(b"\n"):
+            return None
+        try:
+            if int(checksum, 16) != zlib.crc32(payload):
+                return None
+            return json.loads(payload)
+        except ValueError:
+            return None
+
+    def append(self, operation, *args):
+        """Logs one change to the playlists or flags.
+
+        Args:
+            operation: One of create, delete, add, remove, clear (with the
+                playlist key first), flag or allow (with the video_id first).
+            args: The operation's arguments, see SavedState.apply.
+        """
+        self._sequence += 1
+        payload = json.dumps([self._sequence, operation, *args], separators=(",", ":")).encode("utf-8")
+        self._log.write(b"%08x %s\n" % (zlib.crc32(payload), payload))
+        self._log.flush()
+        self._log_records += 1
+
+        now = time.monotonic()
+        if self._unsynced == 0:
+            self._unsynced_since = now
+        self._unsynced += 1
+        if self._unsynced >= self._sync_every or now - self._unsynced_since >= self._sync_interval:
+            self.sync()
+
+    def sync(self):
+        """Waits until everything logged so far is on disk."""
+        if self._unsynced:
+            os.fsync(self._log.fileno())
+            self._unsynced = 0
+
+    @property
+    def needs_compaction(self):
+        """True once the log has grown to compact_every records."""
+        return self._log_records >= self._compact_every
+
+    def compact(self, state):
+        """Writes state to a new snapshot and empties the log.
+
+        Args:
+            state: A SavedState with every change logged so far applied.
+        """
+        data = state.to_json()
+        data["sequence"] = self._sequence
+        temp_path = self._snapshot_path.with_name(SNAPSHOT_NAME + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as snapshot:
+            json.dump(data, snapshot, separators=(",", ":"))
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temp_path, self._snapshot_path) # Never leave a half written snapshot behind
+        _fsync_directory(self._directory)
+
+        self._log.truncate(0)
+        self._log.seek(0)
+        os.fsync(self._log.fileno())
+        self._log_records = 0
+        self._unsynced = 0
+
+    def close(self):
+        """Syncs and closes the log."""
+        if self._log is not None:
+            self.sync()
+            self._log.close()
+            self._log = None
@@ -0,0 +1,121 @@
+"""A tag index class."""
+
+from bisect import bisect_left
+from heapq import merge
+
+
+class TagIndex:
+    """A class used to index videos by tag.
+
+    Each normalized (lowercased) tag maps to a posting list of
+    (title, video_id) pairs kept sorted by title, so a tag lookup comes back
+    already in display order and several lookups can be intersected or
+    merged without sorting again.
+    """
+
+    def __init__(self):
+        self._postings = {} # tag -> list of (title, video_id)
+        self._unsorted = set() # tags whose posting list needs sorting
+
+    @staticmethod
+    def normalize(tag):
+        """Returns the form a tag is stored and looked up under."""
+        return tag.strip().lower()
+
+    def _posting(self, tag):
+        """Returns the sorted posting list for a normalized tag."""
+        postings = self._postings.get(tag)
+        if postings is None:
+            return []
+        if tag in self._unsorted:
+            # Adding only appends, so sort once when the list is next needed
+            # rather than inserting in order every time (which would make
+            # loading a big library quadratic)
+            postings.sort()
+            self._unsorted.discard(tag)
+        return postings
+
+    def add(self, video_id, title, tags):
+        """Adds a video to the posting list of each of its tags.
+
+        Args:
+            video_id: The video url.
+            title: The title of the video.
+            tags: The tags of the video.
+        """
+        for tag in {self.normalize(tag) for tag in tags}:
+            self._postings.setdefault(tag, []).append((title, video_id))
+            self._unsorted.add(tag)
+
+    def merge(self, other):
+        """Adds every video of another TagIndex, e.g. one built in another
+        process. Its posting lists are taken over rather than copied, so it
+        shouldn't be used afterwards.
+
+        Args:
+            other: The index to add, with none of the video ids in this one.
+        """
+        for tag, postings in other._postings.items():
+            mine = self._postings.get(tag)
+            if mine is None:
+                self._postings[tag] = postings
+                if tag not in other._unsorted:
+                    continue
+            else:
+                mine.extend(postings)
+            self._unsorted.add(tag)
+
+    def remove(self, video_id, title, tags):
+        """Removes a video from the posting list of each of its tags.
+
+        Args:
+            video_id: The video url.
+            title: The title the video was added with.
+            tags: The tags the video was added with.
+        """
+        for tag in {self.normalize(tag) for tag in tags}:
+            postings = self._posting(tag)
+            i = bisect_left(postings, (title, video_id))
+            if i < len(postings) and postings[i] == (title, video_id):
+                del postings[i]
+            if not postings: # Don't keep empty tags around
+                self._postings.pop(tag, None)
+
+    def videos_with_tag(self, tag):
+        """Yields the ids of the videos with a tag, sorted by title.
+
+        Args:
+            tag: The video tag, matched ignoring case.
+        """
+        return (video_id for _, video_id in self._posting(self.normalize(tag)))
+
+    def videos_with_all_tags(self, tags):
+        """Yields the ids of the videos having every tag, sorted by title.
+
+        Args:
+            tags: The video tags, matched ignoring case.
+        """
+        postings = sorted((self._posting(self.normalize(tag)) for tag in tags), key=len)
+        if not postings:
+            return
+
+        # Walk the shortest list and binary search for each entry in the rest
+        for entry in postings[0]:
+            for other in postings[1:]:
+                i = bisect_left(other, entry)
+                if i == len(other) or other[i] != entry:
+                    break
+            else:
+                yield entry[1]
+
+    def videos_with_any_tag(self, tags):
+        """Yields the ids of the videos having at least one tag, sorted by title.
+
+        Args:
+            tags: The video tags, matched ignoring case.
+        """
+        previous = None
+        for entry in merge(*(self._posting(self.normalize(tag)) for tag in set(tags))):
+            if entry != previous: # A video with several of the tags shows up once per tag
+                yield entry[1]
+                previous = entry
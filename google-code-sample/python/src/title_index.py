@@ -0,0 +1,153 @@
+"""A title index class."""
+
+from array import array
+from collections import defaultdict
+from functools import partial
+
+
+class TitleIndex:
+    """A class used to index video titles for substring search.
+
+    Every lowercased title is broken into its n-grams (substrings of
+    gram_size characters), and each n-gram maps to the titles containing
+    it. A search only has to look at the titles having the rarest n-gram of
+    the search term instead of scanning the whole library.
+
+    Each title added gets the next number, and an n-gram's postings are an
+    array of the numbers of its titles (4 bytes each, in the order they
+    were added) rather than a set of video ids, which takes several times
+    the memory and time to build. Removing a title only forgets its number,
+    so the postings still have it until the removed numbers outnumber the
+    titles, when every title is numbered again.
+    """
+
+    def __init__(self, gram_size=3):
+        self._gram_size = gram_size
+        self._grams = defaultdict(partial(array, "I")) # n-gram -> numbers of the titles with it
+        self._ids = [] # number -> video id, None once removed
+        self._titles = [] # number -> lowercased title, used to verify candidates, None once removed
+        self._numbers = {} # video id -> number
+        self._short = set() # numbers of titles too short to have an n-gram
+        self._removed = 0 # numbers still in the postings whose title was removed
+
+    def __len__(self):
+        return len(self._numbers)
+
+    def _grams_of(self, text):
+        """Returns the set of n-grams found in text."""
+        size = self._gram_size
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+    def add(self, video_id, title):
+        """Adds a title to the index, replacing any previous one for the id.
+
+        Args:
+            video_id: The video url.
+            title: The title of the video.
+        """
+        if video_id in self._numbers:
+            self.remove(video_id)
+
+        title = title.lower()
+        number = len(self._ids)
+        self._ids.append(video_id)
+        self._titles.append(title)
+        self._numbers[video_id] = number
+        if len(title) < self._gram_size:
+            self._short.add(number)
+        grams = self._grams
+        for gram in self._grams_of(title):
+            grams[gram].append(number)
+
+    def merge(self, other):
+        """Adds every title of another TitleIndex, e.g. one built in
+        another process. Its postings are taken over rather than copied
+        where they can be, so it shouldn't be used afterwards.
+
+        Args:
+            other: The index to add, with none of the video ids in this one.
+        """
+        offset = len(self._ids)
+        self._ids.extend(other._ids)
+        self._titles.extend(other._titles)
+        self._numbers.update((video_id, number + offset) for video_id, number in other._numbers.items())
+        self._short.update(number + offset for number in other._short)
+        self._removed += other._removed
+        grams = self._grams
+        for gram, postings in other._grams.items():
+            if offset:
+                grams[gram].extend(map(offset.__add__, postings))
+            elif gram in grams:
+                grams[gram].extend(postings)
+            else:
+                grams[gram] = postings
+
+    def remove(self, video_id):
+        """Removes a title from the index, if it is there.
+
+        Args:
+            video_id: The video url.
+        """
+        number = self._numbers.pop(video_id, None)
+        if number is None:
+            return
+
+        self._ids[number] = None
+        self._titles[number] = None
+        self._short.discard(number)
+        self._removed += 1
+        if self._removed > len(self._numbers): # Most of the postings are of removed titles
+            self._renumber()
+
+    def _renumber(self):
+        """Numbers the titles again from 0, leaving the removed ones out of the postings."""
+        titles = [(video_id, title) for video_id, title in zip(self._ids, self._titles) if video_id is not None]
+        self._grams.clear()
+        self._ids, self._titles, self._numbers = [], [], {}
+        self._short.clear()
+        self._removed = 0
+        for video_id, title in titles:
+            self.add(video_id, title)
+
+    def _ids_of(self, numbers):
+        """Returns the set of video ids of some numbers, leaving out removed titles."""
+        found = set(map(self._ids.__getitem__, numbers))
+        found.discard(None)
+        return found
+
+    def search(self, search_term):
+        """Returns the set of video ids whose title contains search_term.
+
+        Args:
+            search_term: The query to be used in search, matched ignoring case.
+        """
+        search_term = search_term.lower()
+        if not search_term: # Every title contains the empty string
+            return set(self._numbers)
+
+        # A term of exactly one n-gram is answered by its postings
+        if len(search_term) == self._gram_size:
+            return self._ids_of(self._grams.get(search_term, ()))
+
+        # A shorter term is inside an n-gram of every title containing it
+        # (or the title is too short to have any), and there are far fewer
+        # distinct n-grams than titles
+        titles = self._titles
+        if len(search_term) < self._gram_size:
+            numbers = {number for number in self._short if search_term in titles[number]}
+            for gram, postings in self._grams.items():
+                if search_term in gram:
+                    numbers.update(postings)
+            return self._ids_of(numbers)
+
+        # Only titles with the rarest n-gram of the term can contain it,
+        # check which really do (sharing n-grams doesn't guarantee that)
+        postings = []
+        for gram in self._grams_of(search_term):
+            if gram not in self._grams:
+                return set()
+            postings.append(self._grams[gram])
+        rarest = min(postings, key=len)
+        ids = self._ids
+        return {ids[number] for number in rarest
+                if titles[number] is not None and search_term in titles[number]}
@@ -1,45 +1,800 @@
-"""A video library class."""
-
-from .video import Video
-from pathlib import Path
-import csv
-
-
-# Helper Wrapper around CSV reader to strip whitespace from around
-# each item.
-def _csv_reader_with_strip(reader):
-    yield from ((item.strip() for item in line) for line in reader)
-
-
-class VideoLibrary:
-    """A class used to represent a Video Library."""
-
-    def __init__(self):
-        """The VideoLibrary class is initialized."""
-        self._videos = {}
-        with open(Path(__file__).parent / "videos.txt") as video_file:
-            reader = _csv_reader_with_strip(
-                csv.reader(video_file, delimiter="|"))
-            for video_info in reader:
-                title, url, tags = video_info
-                self._videos[url] = Video(
-                    title,
-                    url,
-                    [tag.strip() for tag in tags.split(",")] if tags else [],
-                )
-
-    def get_all_videos(self):
-        """Returns all available video information from the video library."""
-        return list(self._videos.values())
-
-    def get_video(self, video_id):
-        """Returns the video object (title, url, tags) from the video library.
-
-        Args:
-            video_id: The video url.
-
-        Returns:
-            The Video object for the requested video_id. None if the video
-            does not exist.
-        """
-        return self._videos.get(video_id, None)
+"""A video library class."""
+
+from .video import Video
+from .catalog_file import chunk_ranges
+from .catalog_file import read_catalog
+from .catalog_file import read_range
+from .catalog_snapshot import open_snapshot
+from .facet_index import FacetIndex
+from .facet_index import count_tags
+from .facet_index import top_facets
+from .lazy_catalog import LazyCatalog
+from .lazy_catalog import TextCatalogSource
+from .moderation import ModerationRegistry
+from .prefix_index import PrefixIndex
+from .ranked_index import RankedIndex
+from .ranked_index import rank_titles
+from .related_index import RelatedIndex
+from .related_index import rank_related
+from .tag_index import TagIndex
+from .title_index import TitleIndex
+from bisect import bisect_left
+from heapq import nsmallest
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from itertools import repeat
+from pathlib import Path
+import gc
+import random
+import sys
+import zlib
+
+# What reloading a catalog file changes: the Video objects to add, the
+# video_ids to remove, and the new Video objects for videos whose title or
+# tags are different
+CatalogChanges = namedtuple("CatalogChanges", "added removed changed")
+
+
+def _index_range(path, start, end):
+    """Reads and indexes a byte range of a catalog, in a worker process.
+
+    Returns:
+        The (title, video_id, tags) of each video, a later line with the
+        same id replacing an earlier one in its place (like a dict), and a
+        TitleIndex and TagIndex of them.
+    """
+    latest = {}
+    for record in read_range(path, start, end):
+        latest[record[1]] = record
+    title_index = TitleIndex()
+    tag_index = TagIndex()
+    for title, video_id, tags in latest.values():
+        title_index.add(video_id, title)
+        tag_index.add(video_id, title, tags)
+    return list(latest.values()), title_index, tag_index
+
+
+def shard_of(video_id, shards):
+    """Returns which of shards shards a video belongs in. The same in every
+    process, unlike hash(), which is salted per process."""
+    return zlib.crc32(video_id.encode()) % shards
+
+
+class VideoLibrary:
+    """A class used to represent a Video Library."""
+
+    def __init__(self, catalog_path=None, lazy=False, cache_size=4096, use_snapshot=True, workers=1, shard=None,
+                 precompute_related=False):
+        """The VideoLibrary class is initialized.
+
+        Args:
+            catalog_path: The catalog file to load, videos.txt next to this
+                module by default.
+            lazy: True to memory-map the catalog and only create Video
+                objects when they are accessed, instead of loading them all
+                up front. Searches then stream through the catalog rather
+                than using the indexes.
+            cache_size: How many videos a lazy library keeps in memory.
+            use_snapshot: True to load the catalog's compiled snapshot
+                (see catalog_snapshot) when it is up to date, instead of
+                parsing the text.
+            workers: How many processes to parse the text with, when not
+                lazy and there is no snapshot. The videos end up the same
+                as parsing it in this process.
+            shard: (index, count) to only load (and reload) the videos
+                shard_of puts in shard index of count, for a shard of a
+                ShardedVideoLibrary. Not for a lazy library.
+            precompute_related: True to build the related videos index and
+                work out every video's related videos while loading, False
+                to leave both to the first lookups. Not for a lazy library.
+        """
+        if catalog_path is None:
+            catalog_path = Path(__file__).parent / "videos.txt"
+        self._catalog_path = catalog_path
+        self._shard = shard
+        snapshot = open_snapshot(catalog_path) if use_snapshot else None
+
+        # Ids of the videos that can be played (not flagged), in no
+        # particular order, and where each one is in that list. Removing
+        # swaps the last id into the gap, so picking a random playable
+        # video and keeping this up to date are all O(1). Only listed when
+        # first needed (see _playable_ids), so loading doesn't go through
+        # every id for it.
+        self._eligible = None
+        self._eligible_positions = None
+        # The flag reasons, which Video.flag mirrors
+        self._moderation = ModerationRegistry()
+        self._listeners = [] # called with (event, video) on every change
+        self._ranked_index = None # Built by the first ranked search
+        self._related_index = None # Built by the first related videos lookup, or while loading
+        self._facet_index = None # Built by the first tag count
+        self._title_index = None # Built by the first title search, or by the workers loading the catalog
+        self._id_completions = None # Both built by the first completion
+        self._title_completions = None
+
+        if lazy:
+            source = snapshot if snapshot is not None else TextCatalogSource(catalog_path)
+            self._videos = LazyCatalog(source, cache_size, flags=self._moderation)
+            self._tag_index = None
+            self._title_order = None
+            return
+
+        self._videos = {}
+        self._tag_index = TagIndex()
+        self._title_order = [] # (title, video_id) of every video, sorted when read
+        self._title_order_sorted = True
+        if snapshot is None and workers > 1 and shard is None:
+            self._load_parallel(catalog_path, workers)
+        else:
+            in_order = snapshot is not None and shard is None
+            if in_order: # It already knows the order (of unique ids), no need to build one and sort it
+                self._title_order = list(snapshot.keys_by_title())
+            records = self._in_shard(snapshot if snapshot is not None else read_catalog(catalog_path))
+            for title, url, tags in records:
+                self._add_video(Video(title, url, tags), not in_order)
+        if precompute_related:
+            self._get_related_index(precompute=True)
+
+    def _load_parallel(self, catalog_path, workers):
+        """Loads a catalog file by reading and indexing byte ranges of it in
+        worker processes, then merging their indexes into the library's.
+
+        The ranges are merged in file order and a repeated video_id
+        replaces the earlier video, so the library ends up the same as
+        adding the videos one at a time.
+        """
+        ranges = chunk_ranges(catalog_path, workers * 4) # More ranges than workers evens out their work
+        tag_tuples = {}
+        with ProcessPoolExecutor(workers) as executor:
+            starts_and_ends = zip(*ranges) if ranges else ((), ())
+            for records, title_index, tag_index in executor.map(
+                    _index_range, repeat(catalog_path), *starts_and_ends):
+                for title, video_id, tags in records:
+                    old_video = self._videos.get(video_id)
+                    if old_video is not None: # Also in an earlier range
+                        self._unindex_video(old_video)
+                    shared_tags = tag_tuples.get(tags)
+                    if shared_tags is None: # Each process interned its own copies
+                        shared_tags = tag_tuples[tags] = tuple(map(sys.intern, tags))
+                    self._videos[video_id] = Video(title, video_id, shared_tags)
+                    self._set_eligible(video_id, True)
+                    self._title_order.append((title, video_id))
+                    self._title_order_sorted = False
+                if self._title_index is None: # They had it built anyway, keep it
+                    self._title_index = title_index
+                else:
+                    self._title_index.merge(title_index)
+                self._tag_index.merge(tag_index)
+
+    def _in_shard(self, records):
+        """Returns the (title, video_id, tags) records this library holds."""
+        if self._shard is None:
+            return records
+        index, count = self._shard
+        return (record for record in records if shard_of(record[1], count) == index)
+
+    def __len__(self):
+        return len(self._videos)
+
+    @property
+    def catalog_path(self):
+        """The catalog file the library was loaded from."""
+        return self._catalog_path
+
+    def register_metrics(self, metrics):
+        """Adds gauges for the size of the library to a Metrics."""
+        metrics.define("yt_library_videos", "gauge", "Videos in the library.")
+        metrics.read_from("yt_library_videos", self.__len__)
+        metrics.define("yt_library_playable_videos", "gauge", "Videos in the library that aren't flagged.")
+        metrics.read_from("yt_library_playable_videos", self.number_of_playable_videos)
+        if isinstance(self._videos, LazyCatalog):
+            metrics.define("yt_lazy_catalog_hits_total", "counter", "Videos a lazy library found in memory.")
+            metrics.read_from("yt_lazy_catalog_hits_total", lambda: self._videos.hits)
+            metrics.define("yt_lazy_catalog_misses_total", "counter", "Videos a lazy library read from its catalog.")
+            metrics.read_from("yt_lazy_catalog_misses_total", lambda: self._videos.misses)
+
+    def add_listener(self, listener):
+        """Asks to be told about every change to the library.
+
+        Args:
+            listener: Called with ("added", video) or ("removed", video)
+                when a video is added or removed, ("changed", video) when
+                a new Video object replaces the one with its video_id, and
+                ("flagged", video) or ("allowed", video) when its flag
+                changes.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Stops telling a listener about changes."""
+        self._listeners.remove(listener)
+
+    def _notify(self, event, video):
+        for listener in self._listeners:
+            listener(event, video)
+
+    def add_video(self, video):
+        """Adds a video to the library and its indexes.
+
+        Args:
+            video: The Video object to add. Replaces any video with the
+                same video_id.
+        """
+        self._add_video(video)
+
+    def _add_video(self, video, title_order=True):
+        """Adds a video, putting it in the title order unless title_order
+        is False (when loading a snapshot, which has the order already)."""
+        old_video = self._videos.get(video.video_id)
+        if old_video is not None:
+            self._unindex_video(old_video)
+        self._videos[video.video_id] = video
+        if video.flag is not None:
+            self._moderation.flag(video.video_id, video.flag)
+        video.set_flag(self._moderation.get(video.video_id))
+        self._set_eligible(video.video_id, video.video_id not in self._moderation)
+        if self._title_index is not None:
+            self._title_index.add(video.video_id, video.title)
+        if self._tag_index is not None:
+            self._tag_index.add(video.video_id, video.title, video.tags)
+            if title_order:
+                # Appending and sorting on the next read is as cheap as an
+                # ordered insert for one video, and far cheaper while loading
+                self._title_order.append((video.title, video.video_id))
+                self._title_order_sorted = False
+        if self._ranked_index is not None:
+            self._ranked_index.add(video.video_id, video.title)
+        if self._related_index is not None:
+            self._related_index.add(video.video_id, video.title, video.tags)
+        if self._facet_index is not None:
+            self._facet_index.add(video.video_id, video.tags, video.video_id in self._moderation)
+        if self._id_completions is not None:
+            if old_video is None:
+                self._id_completions.add(video.video_id, video.video_id)
+            self._title_completions.add(video.title.lower(), video.video_id)
+        self._notify("added" if old_video is None else "changed", video)
+
+    def remove_video(self, video_id):
+        """Removes a video from the library and its indexes.
+
+        Args:
+            video_id: The video url.
+
+        Returns:
+            The removed Video object. None if the video does not exist.
+        """
+        video = self._videos.pop(video_id, None)
+        if video is not None:
+            self._unindex_video(video)
+            if self._id_completions is not None:
+                self._id_completions.remove(video_id, video_id)
+            self._set_eligible(video_id, False)
+            self._moderation.allow(video_id)
+            self._notify("removed", video)
+        return video
+
+    def read_changes(self, catalog_path=None):
+        """Compares a catalog file with the videos in the library.
+
+        Nothing in the library is changed, so this (which reads the whole
+        file) can run in another thread while commands go on using the
+        library, then apply_changes makes the changes.
+
+        Args:
+            catalog_path: The catalog file, the one the library was
+                loaded from by default.
+
+        Returns:
+            The CatalogChanges.
+
+        Raises:
+            ValueError: For a lazy library, whose catalog file must not
+                change while it is in use.
+        """
+        if self._tag_index is None:
+            raise ValueError("A lazy library can't be reloaded, restart it instead")
+        if catalog_path is None:
+            catalog_path = self._catalog_path
+
+        videos = {} # Same replace semantics for repeated ids as loading
+        for title, video_id, tags in self._in_shard(read_catalog(catalog_path)):
+            videos[video_id] = (title, tags)
+
+        added, changed = [], []
+        for video_id, (title, tags) in videos.items():
+            video = self._videos.get(video_id)
+            if video is None:
+                added.append(Video(title, video_id, tags))
+            elif video.title != title or tuple(video.tags) != tags:
+                changed.append(Video(title, video_id, tags))
+        # list() takes the keys in one go, so another thread changing the
+        # library can't break the loop
+        removed = [video_id for video_id in list(self._videos) if video_id not in videos]
+        return CatalogChanges(added, removed, changed)
+
+    def apply_changes(self, changes):
+        """Makes the changes read_changes found.
+
+        Flags stay with their video_id, so a changed video stays flagged.
+
+        Args:
+            changes: The CatalogChanges.
+        """
+        for video_id in changes.removed:
+            self.remove_video(video_id)
+        for video in changes.changed:
+            self.add_video(video)
+        for video in changes.added:
+            self.add_video(video)
+
+    def reload(self, catalog_path=None):
+        """Reads a catalog file again and applies only what changed in it.
+
+        Returns:
+            The CatalogChanges made.
+        """
+        changes = self.read_changes(catalog_path)
+        self.apply_changes(changes)
+        return changes
+
+    def _set_eligible(self, video_id, eligible):
+        """Adds a video to or removes it from the playable videos."""
+        positions = self._eligible_positions
+        if positions is None: # Not listed yet, it will be from the videos and flags as they are then
+            return
+        if eligible and video_id not in positions:
+            positions[video_id] = len(self._eligible)
+            self._eligible.append(video_id)
+        elif not eligible and video_id in positions:
+            # Move the last id into the removed one's place
+            position = positions.pop(video_id)
+            last = self._eligible.pop()
+            if last != video_id:
+                self._eligible[position] = last
+                positions[last] = position
+
+    def _unindex_video(self, video):
+        """Removes a video from every index."""
+        if self._tag_index is None:
+            return
+        if self._title_index is not None:
+            self._title_index.remove(video.video_id)
+        self._tag_index.remove(video.video_id, video.title, video.tags)
+        if self._ranked_index is not None:
+            self._ranked_index.remove(video.video_id, video.title)
+        if self._related_index is not None:
+            self._related_index.remove(video.video_id, video.title, video.tags)
+        if self._facet_index is not None:
+            self._facet_index.remove(video.video_id)
+        if self._id_completions is not None:
+            self._title_completions.remove(video.title.lower(), video.video_id)
+        title_order = self._sorted_title_order()
+        del title_order[bisect_left(title_order, (video.title, video.video_id))]
+
+    def _sorted_title_order(self):
+        """Returns the (title, video_id) of every video, sorted by title."""
+        if not self._title_order_sorted:
+            self._title_order.sort()
+            self._title_order_sorted = True
+        return self._title_order
+
+    def get_all_videos(self):
+        """Returns all available video information from the video library."""
+        return list(self._videos.values())
+
+    def iter_videos(self):
+        """Yields every video, streaming them from the catalog for a lazy library."""
+        yield from self._videos.values()
+
+    def iter_videos_by_title(self, start=0):
+        """Yields every video sorted by title.
+
+        The library keeps its videos in title order as they are added and
+        removed, so nothing is sorted here. A lazy library only sorts the
+        (title, video_id) pairs, then creates each Video as it is yielded.
+
+        Args:
+            start: How many videos to skip from the beginning.
+        """
+        if self._title_order is None:
+            keys = self._videos.keys_by_title()
+        else:
+            keys = self._sorted_title_order()
+        for _, video_id in islice(keys, start, None):
+            yield self._videos[video_id]
+
+    def flag_video(self, video_id, flag_reason):
+        """Flags a video so it can't be played.
+
+        Args:
+            video_id: The video url.
+            flag_reason: Reason for flagging the video.
+
+        Returns:
+            The flagged Video object. None if the video does not exist.
+        """
+        video = self._videos.get(video_id)
+        if video is not None:
+            self._moderation.flag(video_id, flag_reason)
+            video.set_flag(self._moderation.get(video_id))
+            self._set_eligible(video_id, False)
+            if self._facet_index is not None:
+                self._facet_index.flag(video_id)
+            self._notify("flagged", video)
+        return video
+
+    def allow_video(self, video_id):
+        """Removes the flag from a video.
+
+        Args:
+            video_id: The video url.
+
+        Returns:
+            The allowed Video object. None if the video does not exist.
+        """
+        video = self._videos.get(video_id)
+        if video is not None:
+            self._moderation.allow(video_id)
+            video.set_flag(None)
+            self._set_eligible(video_id, True)
+            if self._facet_index is not None:
+                self._facet_index.allow(video_id)
+            self._notify("allowed", video)
+        return video
+
+    def flag_reason(self, video_id):
+        """Returns why a video was flagged, None if it isn't flagged."""
+        return self._moderation.get(video_id)
+
+    def flagged_videos(self):
+        """Returns every flagged video, sorted by title."""
+        videos = [self._videos[video_id] for video_id in self._moderation]
+        videos.sort(key=lambda x: (x.title, x.video_id))
+        return videos
+
+    def _playable_ids(self):
+        """Returns the list of the ids of the playable videos, listing them
+        the first time it is needed."""
+        if self._eligible is None:
+            # Only the ids, a lazy library reads no videos for this
+            self._eligible = [video_id for video_id in self._videos if video_id not in self._moderation]
+            self._eligible_positions = {video_id: i for i, video_id in enumerate(self._eligible)}
+        return self._eligible
+
+    def number_of_playable_videos(self):
+        """Returns how many videos aren't flagged."""
+        if self._eligible is None: # Every flag is on a video in the library
+            return len(self._videos) - len(self._moderation)
+        return len(self._eligible)
+
+    def random_video(self, rng=random, tag_weights=None):
+        """Returns a random video that isn't flagged.
+
+        Args:
+            rng: The random number generator to use, e.g. a seeded
+                random.Random to get the same picks every time.
+            tag_weights: Optional dict of tag -> weight to make some videos
+                more or less likely. A video's weight is the biggest weight
+                of its tags, 1 if none of them are given.
+
+        Returns:
+            A Video object. None if every video is flagged, or every video
+            has a weight of 0.
+        """
+        eligible = self._playable_ids()
+        if not eligible:
+            return None
+        if not tag_weights:
+            return self._videos[rng.choice(eligible)]
+
+        tag_weights = {TagIndex.normalize(tag): weight for tag, weight in tag_weights.items()}
+        def weight_of(video):
+            weights = [tag_weights[tag] for tag in map(TagIndex.normalize, video.tags) if tag in tag_weights]
+            return max(weights) if weights else 1
+
+        # Rejection sampling: pick uniformly and keep the pick with
+        # probability weight / heaviest weight, which gives exactly the
+        # weighted distribution in a few O(1) tries unless the weights are
+        # very lopsided
+        heaviest = max(max(tag_weights.values()), 1)
+        for _ in range(64):
+            video = self._videos[rng.choice(eligible)]
+            if rng.random() * heaviest < weight_of(video):
+                return video
+
+        # Too many misses, weigh every playable video instead
+        videos = [self._videos[video_id] for video_id in eligible]
+        weights = [weight_of(video) for video in videos]
+        if not any(weights):
+            return None
+        return rng.choices(videos, weights)[0]
+
+    def get_video(self, video_id):
+        """Returns the video object (title, url, tags) from the video library.
+
+        Args:
+            video_id: The video url.
+
+        Returns:
+            The Video object for the requested video_id. None if the video
+            does not exist.
+        """
+        return self._videos.get(video_id, None)
+
+    def search_titles(self, search_term, include_flagged=False):
+        """Returns the videos whose titles contain the search_term.
+
+        Args:
+            search_term: The query to be used in search, matched ignoring
+                case and surrounding whitespace.
+            include_flagged: True to return flagged videos too.
+
+        Returns:
+            A list of Video objects, sorted by title.
+        """
+        if self._tag_index is None:
+            search_term = search_term.lower().strip()
+            return sorted((video for video in self._videos.values()
+                           if search_term in video.title.lower()
+                           and (include_flagged or video.video_id not in self._moderation)),
+                          key=lambda x: (x.title, x.video_id))
+
+        video_ids = self._get_title_index().search(search_term.strip())
+        if not include_flagged:
+            video_ids = self._moderation.unflagged(set(video_ids))
+        # Only the matches get sorted, not the whole library
+        videos = [self._videos[video_id] for video_id in video_ids]
+        videos.sort(key=lambda x: (x.title, x.video_id))
+        return videos
+
+    def _get_title_index(self):
+        """Returns the TitleIndex of the titles, building it if it isn't yet."""
+        if self._title_index is None:
+            index = TitleIndex()
+            collecting = gc.isenabled()
+            gc.disable() # As for the RankedIndex
+            try:
+                for video_id, video in self._videos.items():
+                    index.add(video_id, video.title)
+            finally:
+                if collecting:
+                    gc.enable()
+            self._title_index = index
+        return self._title_index
+
+    def ranked_search(self, search_term, k=10, include_flagged=False, with_scores=False):
+        """Returns the k videos whose titles best match the search_term.
+
+        Titles having more of its words, rarer ones and fewer others rank
+        higher, and a word may be matched with a typo or two (see
+        RankedIndex). The index is built by the first ranked search, so a
+        library never searched this way doesn't pay for it. A lazy library
+        reads through its catalog instead.
+
+        Args:
+            search_term: The words to search for, matched ignoring case.
+            k: How many videos to return.
+            include_flagged: True to return flagged videos too.
+            with_scores: True to return (Video, score) pairs.
+
+        Returns:
+            A list of Video objects, best match first.
+        """
+        skip = () if include_flagged else self._moderation
+        if self._tag_index is None:
+            titles = ((video.video_id, video.title) for video in self._videos.values())
+            results = rank_titles(search_term, titles, k, skip)
+        else:
+            results = self._get_ranked_index().search(search_term, k, skip)
+        if with_scores:
+            return [(self._videos[video_id], score) for video_id, score in results]
+        return [self._videos[video_id] for video_id, _ in results]
+
+    def _get_ranked_index(self):
+        """Returns the RankedIndex of the titles, building it if it isn't yet."""
+        if self._ranked_index is None:
+            index = RankedIndex()
+            # The collector would keep scanning the millions of new sets
+            # for cycles there are none of, doubling the time this takes
+            collecting = gc.isenabled()
+            gc.disable()
+            try:
+                for video_id, video in self._videos.items():
+                    index.add(video_id, video.title)
+            finally:
+                if collecting:
+                    gc.enable()
+            self._ranked_index = index
+        return self._ranked_index
+
+    def related_videos(self, video_id, k=10, include_flagged=False):
+        """Returns the k videos sharing the most tags with a video.
+
+        Args:
+            video_id: The video url.
+            k: How many videos to return.
+            include_flagged: True to return flagged videos too.
+
+        Returns:
+            A list of Video objects, most related first. None if the video
+            does not exist.
+        """
+        video = self._videos.get(video_id)
+        if video is None:
+            return None
+        return self.similar_videos(video.tags, k, include_flagged, exclude=video_id)
+
+    def similar_videos(self, tags, k=10, include_flagged=False, exclude=None):
+        """Returns the k videos whose tags are most like the given ones.
+
+        Videos are ranked by the Jaccard similarity of their tags, ties in
+        title order (see RelatedIndex). The index is built by the first
+        lookup, and each distinct set of tags has its related videos worked
+        out the first time it is looked up, then kept (or all of them while
+        loading, with precompute_related). A set of tags whose videos have
+        changed since is worked out again the next time it is looked up. A lazy library reads through its
+        catalog instead.
+
+        Args:
+            tags: The tags to compare with, matched ignoring case.
+            k: How many videos to return.
+            include_flagged: True to return flagged videos too.
+            exclude: A video_id to leave out, e.g. the one whose tags these are.
+
+        Returns:
+            A list of Video objects, most similar first.
+        """
+        skip = () if include_flagged else self._moderation
+        if self._tag_index is None:
+            videos = ((video.video_id, video.title, video.tags) for video in self._videos.values())
+            video_ids = rank_related(exclude, tags, videos, k, skip)
+        else:
+            video_ids = self._get_related_index().related(exclude, tags, k, skip)
+        return [self._videos[video_id] for video_id in video_ids]
+
+    def _get_related_index(self, precompute=False):
+        """Returns the RelatedIndex of the tags, building it if it isn't yet,
+        and working out every video's related videos too if precompute."""
+        if self._related_index is None:
+            index = RelatedIndex()
+            collecting = gc.isenabled()
+            gc.disable() # As for the RankedIndex
+            try:
+                for video_id, video in self._videos.items():
+                    index.add(video_id, video.title, video.tags)
+                if precompute:
+                    index.precompute()
+            finally:
+                if collecting:
+                    gc.enable()
+            self._related_index = index
+        return self._related_index
+
+    def tag_counts(self):
+        """Returns how many playable (unflagged) videos have each tag.
+
+        The counts are kept up to date as videos are added, removed,
+        flagged and allowed, from the first time tags are counted on. A
+        lazy library reads through its catalog instead.
+
+        Returns:
+            A dict of normalized tag -> videos with it.
+        """
+        if self._tag_index is None:
+            return dict(count_tags(video for video in self._videos.values()
+                                   if video.video_id not in self._moderation))
+        return dict(self._get_facet_index().counts)
+
+    def facets(self, video_ids, k=10, tags=None, match_all=True):
+        """Returns the tags most of some videos have, e.g. the results of a search.
+
+        Many videos are counted with bitsets, see FacetIndex. A lazy library
+        reads each video's tags instead.
+
+        Args:
+            video_ids: A list or set of the ids of unflagged videos in the library.
+            k: How many tags to return, None for every tag.
+            tags: The tags of the tag search the videos were found by, if
+                they were, which makes counting many of them quicker.
+            match_all: True if that search was for videos having every tag,
+                False for videos having any of them.
+
+        Returns:
+            A list of (normalized tag, videos with it), most videos first,
+            ties in tag order.
+        """
+        if self._tag_index is None:
+            return top_facets(count_tags(map(self._videos.__getitem__, video_ids)), k)
+        return self._get_facet_index().count(video_ids, k, tags, match_all)
+
+    def _get_facet_index(self):
+        """Returns the FacetIndex of the tags, building it if it isn't yet."""
+        if self._facet_index is None:
+            index = FacetIndex(self._tag_index.videos_with_tag)
+            collecting = gc.isenabled()
+            gc.disable() # As for the RankedIndex
+            try:
+                for video_id, video in self._videos.items():
+                    index.add(video_id, video.tags, video_id in self._moderation)
+            finally:
+                if collecting:
+                    gc.enable()
+            self._facet_index = index
+        return self._facet_index
+
+    def complete_video_ids(self, prefix, k=10):
+        """Returns the first k video ids, in order, that start with prefix.
+
+        A lazy library reads through its catalog's ids instead of the index.
+        """
+        if self._tag_index is None:
+            return sorted(video_id for video_id in self._videos if video_id.startswith(prefix))[:k]
+        return [video_id for _, video_id in self._get_completions()[0].complete(prefix, k)]
+
+    def complete_titles(self, prefix, k=10):
+        """Returns the first k videos whose titles start with prefix, ignoring case.
+
+        The titles are kept in a PrefixIndex, built by the first completion,
+        so this takes as long however many videos there are. A lazy library
+        reads through its catalog instead.
+
+        Returns:
+            A list of Video objects, sorted by lowercased title.
+        """
+        prefix = prefix.lower()
+        if self._tag_index is None:
+            videos = (video for video in self._videos.values() if video.title.lower().startswith(prefix))
+            return nsmallest(k, videos, key=lambda x: (x.title.lower(), x.video_id))
+        return [self._videos[video_id] for _, video_id in self._get_completions()[1].complete(prefix, k)]
+
+    def _get_completions(self):
+        """Returns the PrefixIndex of the video ids and the one of the
+        lowercased titles, building them if they aren't yet."""
+        if self._id_completions is None:
+            ids, titles = PrefixIndex(), PrefixIndex()
+            collecting = gc.isenabled()
+            gc.disable() # As for the RankedIndex
+            try:
+                for video_id, video in self._videos.items():
+                    ids.add(video_id, video_id)
+                    titles.add(video.title.lower(), video_id)
+            finally:
+                if collecting:
+                    gc.enable()
+            self._id_completions, self._title_completions = ids, titles
+        return self._id_completions, self._title_completions
+
+    def videos_with_tags(self, tags, match_all=True, include_flagged=False):
+        """Returns the videos with the given tags, sorted by title.
+
+        They are read from the tag index as they are iterated, so taking the
+        first few is cheap however many videos match.
+
+        Args:
+            tags: The video tags, matched ignoring case and surrounding
+                whitespace.
+            match_all: True to return videos having every tag, False to
+                return videos having any of them.
+            include_flagged: True to return flagged videos too.
+
+        Returns:
+            An iterable of Video objects.
+        """
+        if self._tag_index is None:
+            tags = {TagIndex.normalize(tag) for tag in tags}
+            found = []
+            for video in self._videos.values():
+                if not include_flagged and video.video_id in self._moderation:
+                    continue
+                video_tags = {TagIndex.normalize(tag) for tag in video.tags}
+                if tags <= video_tags if match_all else tags & video_tags:
+                    found.append(video)
+            return sorted(found, key=lambda x: (x.title, x.video_id))
+
+        if match_all:
+            video_ids = self._tag_index.videos_with_all_tags(tags)
+        else:
+            video_ids = self._tag_index.videos_with_any_tag(tags)
+        return (self._videos[video_id] for video_id in video_ids
+                if include_flagged or video_id not in self._moderation)
@@ -1,361 +1,665 @@
-"""A video player class."""
-
-from .video_library import VideoLibrary
-from .video_playlist import Playlist
-from random import choice # To get random video
-
-
-class VideoPlayer:
-    """A class used to represent a Video Player."""
-
-    def __init__(self):
-        # Declaring certain attributes
-        self._video_library = VideoLibrary()
-        self._current_video = None
-        self._paused = False
-        self._playlists = {}
-
-
-    def number_of_videos(self):
-        num_videos = len(self._video_library.get_all_videos())
-        print(f"{num_videos} videos in the library")
-
-
-    def show_all_videos(self):
-        """Returns all videos."""
-        # Sort in lexicographical (alphabetically) order by title using - sorted(array, what to sort by)
-        all_videos = sorted(self._video_library.get_all_videos(), key=lambda x: x.title)
-        
-        for video in all_videos:
-            print(video)
-
-
-    def play_video(self, video_id):
-        """Plays the respective video.
-        Args:
-            video_id: The video_id to be played.
-        """
-        
-        video = self._video_library.get_video(video_id)
-        
-        if video is None:
-            print('Cannot play video: Video does not not exist')
-            return
-        
-        if self._current_video:
-            self.stop_video()
-            
-        if video.flag is not None:
-            print(f"Cannot play video: Video is currently flagged (reason: {video.flag})")
-            return
-            
-        print(f"Playing video: {video.title}")
-        self._current_video = video
-        self._paused = False
-        return
-
-
-    def stop_video(self):
-        """Stops the current video."""
-
-        if self._current_video is None:
-            print("Cannot stop video: No video is currently playing")
-            return
-        
-        print(f"Stopping video: {self._current_video.title}")
-        self._current_video = None
-        return
-        
-        
-    def play_random_video(self):
-        """Plays a random video from the video library."""
-        if self._current_video is not None:
-            self.stop_video()
-
-        all_videos = [video for video in self._video_library.get_all_videos() if video.flag is None]
-        if not all_videos: # Checks there are videos avaliable and they're not flagged
-            print("No videos avaliable")
-            return
-
-        # Call play_video we made earlier, we don't need to stop any existing video as that is handled in play_video
-        self.play_video(choice(all_videos).video_id)
-
-        
-    def pause_video(self):
-        """Pauses the current video."""
-        if self._current_video is None:
-            print("Cannot pause video: No video is currently playing")
-            return
-        
-        if self._paused is True:
-            print(f"Video already paused: {self._current_video.title}")
-            return
-                    
-        print(f"Pausing video: {self._current_video.title}")
-        self._paused = True
-        return
-
-
-    def continue_video(self):
-        """Resumes playing the current video."""
-        if self._current_video is None: # Check there us a video
-            print(f"Cannot continue video: No video is currently playing")
-            return
-        elif self._paused is False: # Check video is actually paused
-            print(f"Cannot continue video: Video is not paused")
-            return
-        
-        print(f"Continuing video: {self._current_video.title}")
-        self._paused = False
-        return
-        
-        
-    def show_playing(self):
-        """Displays video currently playing."""
-        if self._current_video is None:
-            print("No video is currently playing")
-            return
-        
-        # Displays all information
-        print(f"Currently playing: {self._current_video} {'- PAUSED' if self._paused else '- NOT PAUSED'}") # Sneeky way to show if paused or not
-        return
-
-
-    def create_playlist(self, playlist_name):
-        """Creates a playlist with a given name.
-        Args:
-            playlist_name: The playlist name.
-        """
-        
-        if playlist_name.lower().strip() in self._playlists: # Get rid of white space and lower chars
-            print("Cannot create playlist: A playlist with the same name already exists")
-            return
-        
-        print(f"Successfully created new playlist: {playlist_name}")
-        self._playlists[playlist_name.lower().strip()] = Playlist(playlist_name) # Add to playlists new object of Playlist
-        return
-
-
-    def add_to_playlist(self, playlist_name, video_id):
-        """Adds a video to a playlist with a given name.
-        Args:
-            playlist_name: The playlist name.
-            video_id: The video_id to be added.
-        """
-        video_to_add = self._video_library.get_video(video_id)
-        
-        if playlist_name.lower() not in self._playlists:
-            print(f"Cannot add video to {playlist_name}: Playlist does not exist")
-            return
-        
-        if video_to_add is None:
-            print(f"Cannot add video to {playlist_name}: Video does not exist")
-            return
-        
-        if video_to_add.flag is not None:
-            print(f"Cannot add video to {playlist_name}: Video is currently flagged (reason: {video_to_add.flag})")
-            return
-
-        if video_to_add in self._playlists[playlist_name.lower()].videos:
-            print(f"Cannot add video to {playlist_name}: Video already added")
-            return
-        
-        self._playlists[playlist_name.lower()].videos.append(video_to_add) # Add video to playlist
-        print(f"Added video to {playlist_name}: {video_to_add.title}") # Display playlist and video title 
-
-
-    def show_all_playlists(self):
-        """Display all playlists."""
-
-        if not self._playlists: # If no playlists exit
-            print("No playlists exist yet")
-            return
-        
-        print("Showing all playlists:")
-        for playlist in sorted(self._playlists): # Sort in lexicographical order
-            print(f"{self._playlists[playlist].name}") # We don't do print(playlist) as this is the .lower version, we want the real name with .name
-        return
-
-
-    def show_playlist(self, playlist_name):
-        """Display all videos in a playlist with a given name.
-        Args:
-            playlist_name: The playlist name.
-        """
-        if playlist_name.lower() not in self._playlists:
-            print(f"Cannot show playlist {playlist_name}: Playlist does not exist")
-            return
-        
-        print(f"Showing playlist: {playlist_name}")
-        if len(self._playlists[playlist_name.lower()].videos) < 1: # Check playlist has videos
-            print("No videos here yet")
-            return
-        
-        for video in self._playlists[playlist_name.lower()].videos:
-            print(video)
-        return
-            
-    
-    def remove_from_playlist(self, playlist_name, video_id):
-        """Removes a video to a playlist with a given name.
-        Args:
-            playlist_name: The playlist name.
-            video_id: The video_id to be removed.
-        """
-        the_video = self._video_library.get_video(video_id)
-        
-        if playlist_name.lower() not in self._playlists: # Check if play list exists
-            print(f"Cannot remove video {playlist_name}: Playlist does not exist")
-            return
-        
-        if the_video is None: # Check video even exists
-            print(f"Cannot remove video from {playlist_name}: Video does not exist")
-            return
-        
-        if the_video not in self._playlists[playlist_name.lower()].videos: # Check video is in playlist
-            print(f"Cannot remove video from {playlist_name}: Video is not in playlist")
-            return
-        
-        print(f"Removed video from {playlist_name}: {the_video.title}")
-        self._playlists[playlist_name.lower()].videos.remove(the_video)
-        return
-        
-
-    def clear_playlist(self, playlist_name):
-        """Removes all videos from a playlist with a given name.
-
-        Args:
-            playlist_name: The playlist name.
-        """
-        
-        if playlist_name.lower() not in self._playlists: # Check if play list exists
-            print(f"Cannot clear playlist {playlist_name}: Playlist does not exist")
-            return
-        
-        print(f"Successfully removed all videos from {playlist_name}")
-        self._playlists[playlist_name.lower()].videos.clear()
-        return
-        
-
-    def delete_playlist(self, playlist_name):
-        """Deletes a playlist with a given name.
-        Args:
-            playlist_name: The playlist name.
-        """
-        
-        if playlist_name.lower() not in self._playlists: # Check if play list exists
-            print(f"Cannot delete playlist {playlist_name}: Playlist does not exist")
-            return
-        
-        print(f"Deleted playlist: {playlist_name}")
-        self._playlists.pop(playlist_name.lower()) # cant use .remove in dict
-        return
-
-
-    def output_user_search_videos(self, videos, search_term):
-        """ 2nd part! of search_videos function
-        Args:
-            videos: List of valid videos
-            search_term: The query to be used in search.
-        """
-        if len(videos) == 0:
-            print(f"No search results for {search_term}")
-            return
-        
-        result = sorted(videos, key=lambda x:x.title) # Sorting the videos by title
-        print(f"Here are the results for {search_term}:")
-        
-        for i, video in enumerate(result): # Simple way to loop over array and have a counter as well
-            print(f"{i+1}) {video}") # Do + 1 otherwise it starts from 0
-        
-        print("Would you like to play any of the above? If yes, specify the number of the video.")
-        print("If your answer is not a valid number, we will assume it's a no.")
-        
-        try:
-            user_choice = int(input())
-            if user_choice > 0 and user_choice <= len(videos): # See if its a valid range
-                self.play_video(result[user_choice-1].video_id)
-        except Exception:
-            return
-        return
-        
-    def search_videos(self, search_term):  # sourcery skip: list-comprehension
-        """ 1st part!
-        Display all the videos whose titles contain the search_term.
-        Args:
-            search_term: The query to be used in search.
-        """
-        valid_videos = [] # Keep track of found videos
-        for video in self._video_library.get_all_videos():
-            if video.flag is not None:
-                continue
-            if search_term.lower().strip() in video.title.lower():
-                valid_videos.append(video)
-        
-        self.output_user_search_videos(valid_videos, search_term) # Call next function
-    
-
-    def search_videos_tag(self, video_tag):  # sourcery skip: list-comprehension
-        """Display all videos whose tags contains the provided tag.
-        Args:
-            video_tag: The video tag to be used in search.
-        """
-        valid_videos = [] # Keep track of found videos
-        for video in self._video_library.get_all_videos():
-            if video.flag is not None:
-                continue
-            if video_tag.lower().strip() in video.tags:
-                valid_videos.append(video)
-
-        # We can just use the made function again as it still achieves desired result
-        self.output_user_search_videos(valid_videos, video_tag)
-        
-
-    def flag_video(self, video_id, flag_reason="Not supplied"):
-        """Mark a video as flagged.
-
-        Args:
-            video_id: The video_id to be flagged.
-            flag_reason: Reason for flagging the video.
-        """
-        
-        video = self._video_library.get_video(video_id)
-        
-        if video is None:
-            print("Cannot flag video: Video does not exist")
-            return
-            
-        if video.flag is not None: # Check if video has already been flagged
-            print("Cannot flag video: Video is already flagged")
-            return
-        
-        video.set_flag(flag_reason)
-        
-        if self._current_video is not None and self._current_video.video_id == video.video_id: # Stop playing current video if its the flagged video
-            self.stop_video()
-        
-        print(f"Successfully flagged video: {video.title} (reason: {flag_reason})")
-        return
-        
-
-    def allow_video(self, video_id):
-        """Removes a flag from a video.
-        Args:
-            video_id: The video_id to be allowed again.
-        """
-        
-        video = self._video_library.get_video(video_id)
-        
-        if video is None:
-            print("Cannot remove flag from video: Video does not exist")
-            return
-        
-        if video.flag is None: # Check video has even been flagged yet
-            print("Cannot remove flag from video: Video is not flagged")
-            return
-        
-        print(f"Successfully removed flag from video: {video.title}")
-        video.set_flag(None)
-        return
-        
-        
\ No newline at end of file
+"""A video player class."""
+
+from .player_session import NO_PLAYABLE_VIDEOS
+from .player_session import NO_SUCH_PLAYLIST
+from .player_session import NO_SUCH_VIDEO
+from .player_session import VIDEO_FLAGGED
+from .player_session import PlayerSession
+from collections import OrderedDict
+from itertools import chain, islice
+
+MAX_LINES = 100_000 # Most rendered video lines kept, the oldest are dropped past this
+PRINT_BATCH = 1024 # Lines of a listing printed at a time
+_END = object() # What next gives back for a listing with nothing left, as None could be a video
+
+
+def _ask_user():
+    """Reads the user's answer from the terminal (input is looked up on every call, so tests can patch it)."""
+    return input()
+
+
+class VideoPlayer:
+    """A class used to represent a Video Player.
+
+    The text front end of a PlayerSession, which does the work: each method
+    runs the session's and prints what happened, asks which search result
+    to play and pages long listings. How each video is shown is kept once
+    rendered, until the video changes, so listings showing the same videos
+    again don't format them again.
+    """
+
+    def __init__(self, video_library=None, prompt=_ask_user, store=None, query_cache=None, session=None):
+        """
+        Args:
+            video_library: The library to play from, loads the default one if not given.
+            prompt: Function asking the user a question (like "play which search result?") and
+                returning the answer. None to not wait for one: the question is left pending and
+                the caller passes the next thing the user enters to answer_prompt.
+            store: A StateStore to load the playlists and flags from and save every change to,
+                None to keep them in memory only.
+            query_cache: The search result cache of another player of the same library, to share
+                it. A new QueryCache, kept up to date as the library changes, if not given.
+            session: The PlayerSession to show, instead of making one from the arguments above.
+        """
+        # Declaring certain attributes
+        self._session = session if session is not None else PlayerSession(video_library, store, query_cache)
+        self._next_page = None # How to carry on the last paged listing, for NEXT_PAGE
+        self._prompt = prompt
+        self._pending_choice = None # Search results waiting for an answer when prompt is None
+        self._lines = OrderedDict() # video_id -> str(video), oldest first
+        self._listener = self._forget_line
+        self._session.video_library.add_listener(self._listener)
+
+
+    def new_session(self, prompt=None):
+        """Returns a player for another user of the same library.
+
+        It shares this player's library, playlists, store and rendered
+        lines, but has its own current video, paused state, pages and
+        pending question.
+
+        Args:
+            prompt: The new player's prompt function, see __init__.
+        """
+        player = VideoPlayer(prompt=prompt, session=self._session.new_session())
+        # This player's listener looks after the shared lines
+        player.video_library.remove_listener(player._listener)
+        player._listener = None
+        player._lines = self._lines
+        return player
+
+
+    def close(self):
+        """Stops following changes to the library, for a player no longer in use."""
+        self._session.close()
+        if self._listener is not None:
+            self._session.video_library.remove_listener(self._listener)
+
+
+    @property
+    def session(self):
+        """The PlayerSession this player shows, to use it from code."""
+        return self._session
+
+
+    @property
+    def video_library(self):
+        """The VideoLibrary the player plays from."""
+        return self._session.video_library
+
+
+    @property
+    def query_cache(self):
+        """The QueryCache of search results, with its hit and miss counts."""
+        return self._session.query_cache
+
+
+    def register_metrics(self, metrics):
+        """Adds gauges for the library, playlists, search cache and rendered lines to a Metrics."""
+        self._session.register_metrics(metrics)
+        metrics.define("yt_rendered_lines", "gauge", "Videos whose rendered line is kept.")
+        metrics.read_from("yt_rendered_lines", self._lines.__len__)
+
+
+    def _forget_line(self, event, video):
+        """Drops the rendered line of a video that changed (or went)."""
+        if event != "added":
+            self._lines.pop(video.video_id, None)
+
+
+    def _line(self, video):
+        """Returns how a video is shown, rendering it only if it isn't kept."""
+        line = self._lines.get(video.video_id)
+        if line is None:
+            line = str(video)
+            if len(self._lines) >= MAX_LINES:
+                self._lines.popitem(last=False)
+            self._lines[video.video_id] = line
+        return line
+
+
+    def _print_videos(self, videos):
+        """Prints a line for each video, a batch of lines per write."""
+        videos = iter(videos)
+        while True:
+            lines = [self._line(video) for video in islice(videos, PRINT_BATCH)]
+            if not lines:
+                return
+            print("\n".join(lines))
+
+
+    def _refusal(self, prefix, outcome):
+        """Returns the message for a command that wasn't done."""
+        if outcome.error == VIDEO_FLAGGED:
+            return f"{prefix}: {outcome.error} (reason: {outcome.video.flag})"
+        return f"{prefix}: {outcome.error}"
+
+
+    @property
+    def has_pending_prompt(self):
+        """Returns True if a question is waiting for answer_prompt."""
+        return self._pending_choice is not None
+
+
+    def answer_prompt(self, answer):
+        """Answers the question left pending because there is no prompt function.
+        Args:
+            answer: What the user entered.
+        """
+        if self._pending_choice is None:
+            return
+        result, offset = self._pending_choice
+        self._pending_choice = None
+        self._play_search_result(result, offset, answer)
+
+
+    def number_of_videos(self):
+        num_videos = self._session.number_of_videos()
+        print(f"{num_videos} videos in the library")
+
+
+    def show_all_videos(self, limit=None, offset=0):
+        """Returns all videos.
+        Args:
+            limit: Show at most this many videos, the rest can be seen with NEXT_PAGE.
+            offset: How many videos to skip from the beginning.
+        """
+        # The library hands them back in lexicographical (alphabetically) order by title
+        videos = self._session.videos_by_title(offset)
+        if limit is None:
+            self._next_page = None
+            self._print_videos(videos)
+            return
+
+        self._show_videos_page(videos, limit, offset)
+
+
+    def _show_videos_page(self, videos, limit, offset):
+        """Prints the next page of SHOW_ALL_VIDEOS."""
+        page, self._next_page = self._take_page(videos, limit, offset, None)
+        self._print_videos(page)
+        if self._next_page is not None:
+            print("Enter NEXT_PAGE to see more videos.")
+
+
+    def _take_page(self, videos, limit, offset, search_term):
+        """Takes the next page of a listing off an iterator of videos.
+        Args:
+            videos: Iterator of the videos left in the listing.
+            limit: The page size.
+            offset: Position of the first video of the page in the listing.
+            search_term: The search this listing is for, None for SHOW_ALL_VIDEOS.
+        Returns:
+            The videos on the page, and the next page (for NEXT_PAGE) or None if this was the last one.
+        """
+        page = list(islice(videos, limit))
+        peek = next(videos, _END) # Only way to know if an iterator has more in it
+        if peek is _END:
+            return page, None
+        # The rest is read by NEXT_PAGE, after other commands may have changed the video read ahead
+        return page, (chain(self._still_listed(peek, search_term is not None), videos),
+                      limit, offset + len(page), search_term)
+
+
+    def _still_listed(self, video, playable):
+        """Yields a video as it is now, unless it has been removed (or flagged,
+        if the listing only has playable videos) since it was read."""
+        video = self._session.video_library.get_video(video.video_id)
+        if video is not None and (not playable or video.flag is None):
+            yield video
+
+
+    def show_next_page(self):
+        """Shows the next page of the last listing that was given a limit."""
+        if self._next_page is None:
+            print("No more results to show")
+            return
+
+        videos, limit, offset, search_term = self._next_page
+        first = next(videos, _END)
+        if first is _END: # What was left has all been removed or flagged since
+            self._next_page = None
+            print("No more results to show")
+            return
+        videos = chain((first,), videos)
+        if search_term is None:
+            self._show_videos_page(videos, limit, offset)
+        else:
+            self.output_user_search_videos(videos, search_term, limit, offset)
+
+
+    def play_video(self, video_id):
+        """Plays the respective video.
+        Args:
+            video_id: The video_id to be played.
+        """
+        self._print_played(self._session.play_video(video_id))
+
+
+    def _print_played(self, outcome):
+        """Prints what playing a video did, stopping the current one first."""
+        self._print_stopped(outcome)
+        if outcome.error == NO_SUCH_VIDEO:
+            print('Cannot play video: Video does not not exist')
+        elif outcome.error is not None:
+            print(self._refusal("Cannot play video", outcome))
+        else:
+            print(f"Playing video: {outcome.video.title}")
+
+
+    def _print_stopped(self, outcome):
+        """Prints that a command stopped the current video on the way, if it did."""
+        if outcome.stopped is not None:
+            print(f"Stopping video: {outcome.stopped.title}")
+
+
+    def stop_video(self):
+        """Stops the current video."""
+        outcome = self._session.stop_video()
+        if outcome.error is not None:
+            print(self._refusal("Cannot stop video", outcome))
+            return
+
+        print(f"Stopping video: {outcome.video.title}")
+
+
+    def play_random_video(self, seed=None, weights=None):
+        """Plays a random video from the video library.
+        Args:
+            seed: Seed for the random choice, the same seed picks the same video every time.
+            weights: Dict of tag -> weight, to make videos with those tags more (or less) likely.
+        """
+        outcome = self._session.play_random_video(seed, weights)
+        if outcome.error == NO_PLAYABLE_VIDEOS: # Every video is flagged (or there are none)
+            self._print_stopped(outcome)
+            print(outcome.error)
+            return
+
+        self._print_played(outcome)
+
+
+    def pause_video(self):
+        """Pauses the current video."""
+        outcome = self._session.pause_video()
+        if outcome.video is None:
+            print(self._refusal("Cannot pause video", outcome))
+        elif outcome.error is not None: # Already paused
+            print(f"{outcome.error}: {outcome.video.title}")
+        else:
+            print(f"Pausing video: {outcome.video.title}")
+
+
+    def continue_video(self):
+        """Resumes playing the current video."""
+        outcome = self._session.continue_video()
+        if outcome.error is not None:
+            print(self._refusal("Cannot continue video", outcome))
+            return
+
+        print(f"Continuing video: {outcome.video.title}")
+
+
+    def show_playing(self):
+        """Displays video currently playing."""
+        video = self._session.current_video
+        if video is None:
+            print("No video is currently playing")
+            return
+
+        # Displays all information
+        print(f"Currently playing: {self._line(video)} {'- PAUSED' if self._session.paused else '- NOT PAUSED'}") # Sneeky way to show if paused or not
+
+
+    def create_playlist(self, playlist_name):
+        """Creates a playlist with a given name.
+        Args:
+            playlist_name: The playlist name.
+        """
+        outcome = self._session.create_playlist(playlist_name)
+        if outcome.error is not None:
+            print(self._refusal("Cannot create playlist", outcome))
+            return
+
+        print(f"Successfully created new playlist: {playlist_name}")
+
+
+    def add_to_playlist(self, playlist_name, *video_ids):
+        """Adds videos to a playlist with a given name.
+        Args:
+            playlist_name: The playlist name.
+            video_ids: The video_ids to be added, in order.
+        """
+        for outcome in self._session.add_to_playlist(playlist_name, *video_ids):
+            if outcome.error is not None:
+                print(self._refusal(f"Cannot add video to {playlist_name}", outcome))
+            else:
+                print(f"Added video to {playlist_name}: {outcome.video.title}") # Display playlist and video title
+
+
+    def show_all_playlists(self):
+        """Display all playlists."""
+        names = self._session.playlist_names() # In lexicographical order
+        if not names: # If no playlists exit
+            print("No playlists exist yet")
+            return
+
+        print("Showing all playlists:")
+        print("\n".join(names)) # The names as they were given, not the lower case keys
+
+
+    def show_playlist(self, playlist_name):
+        """Display all videos in a playlist with a given name.
+        Args:
+            playlist_name: The playlist name.
+        """
+        videos = self._session.playlist_videos(playlist_name)
+        if videos is None:
+            print(f"Cannot show playlist {playlist_name}: {NO_SUCH_PLAYLIST}")
+            return
+
+        print(f"Showing playlist: {playlist_name}")
+        if not videos: # Check playlist has videos
+            print("No videos here yet")
+            return
+
+        self._print_videos(videos)
+
+
+    def remove_from_playlist(self, playlist_name, video_id):
+        """Removes a video to a playlist with a given name.
+        Args:
+            playlist_name: The playlist name.
+            video_id: The video_id to be removed.
+        """
+        outcome = self._session.remove_from_playlist(playlist_name, video_id)
+        if outcome.error == NO_SUCH_PLAYLIST:
+            print(self._refusal(f"Cannot remove video {playlist_name}", outcome))
+            return
+        if outcome.error is not None:
+            print(self._refusal(f"Cannot remove video from {playlist_name}", outcome))
+            return
+
+        print(f"Removed video from {playlist_name}: {outcome.video.title}")
+
+
+    def clear_playlist(self, playlist_name):
+        """Removes all videos from a playlist with a given name.
+
+        Args:
+            playlist_name: The playlist name.
+        """
+        outcome = self._session.clear_playlist(playlist_name)
+        if outcome.error is not None:
+            print(self._refusal(f"Cannot clear playlist {playlist_name}", outcome))
+            return
+
+        print(f"Successfully removed all videos from {playlist_name}")
+
+
+    def delete_playlist(self, playlist_name):
+        """Deletes a playlist with a given name.
+        Args:
+            playlist_name: The playlist name.
+        """
+        outcome = self._session.delete_playlist(playlist_name)
+        if outcome.error is not None:
+            print(self._refusal(f"Cannot delete playlist {playlist_name}", outcome))
+            return
+
+        print(f"Deleted playlist: {playlist_name}")
+
+
+    def output_user_search_videos(self, videos, search_term, limit=None, offset=0, facets=None):
+        """ 2nd part! of search_videos function
+        Args:
+            videos: Iterable of valid videos, in the order to show them (by title, or best match first)
+            search_term: The query to be used in search.
+            limit: Show at most this many results, the rest can be seen with NEXT_PAGE.
+            offset: Position of the first of the videos in the whole result (they are numbered from it).
+            facets: (tag, count) pairs of the tags of the whole result to show under it, None for none.
+        """
+        videos = iter(videos)
+        if limit is None:
+            result, self._next_page = list(videos), None
+        else:
+            result, self._next_page = self._take_page(videos, limit, offset, search_term)
+
+        if len(result) == 0:
+            print(f"No search results for {search_term}")
+            return
+
+        print(f"Here are the results for {search_term}:")
+        # Numbers carry on from earlier pages
+        print("\n".join(f"{i}) {self._line(video)}" for i, video in enumerate(result, start=offset + 1)))
+        if facets:
+            print("Top tags in the results: " + ", ".join(f"{tag} ({count})" for tag, count in facets))
+
+        if self._next_page is not None:
+            print("Enter NEXT_PAGE to see more results.")
+        print("Would you like to play any of the above? If yes, specify the number of the video.")
+        print("If your answer is not a valid number, we will assume it's a no.")
+
+        if self._prompt is None: # Don't block, the answer comes in through answer_prompt
+            self._pending_choice = (result, offset)
+            return
+        self._play_search_result(result, offset, self._prompt())
+
+
+    def _play_search_result(self, result, offset, answer):
+        """Plays the search result the user picked, if they picked a valid one.
+        Args:
+            result: The results on the page the user picked from.
+            offset: Position of the first of them in the whole result.
+            answer: What the user entered.
+        """
+        try:
+            user_choice = int(answer)
+            if user_choice > offset and user_choice <= offset + len(result): # See if its on this page
+                self.play_video(result[user_choice-offset-1].video_id)
+        except Exception:
+            return
+        return
+
+
+    def search_videos(self, search_term, limit=None, offset=0, facets=None):
+        """ 1st part!
+        Display all the videos whose titles contain the search_term.
+        Args:
+            search_term: The query to be used in search.
+            limit: Show at most this many results, the rest can be seen with NEXT_PAGE.
+            offset: How many results to skip from the beginning.
+            facets: Also show this many of the tags most of the results have.
+        """
+        valid_videos = self._session.search_videos(search_term, offset)
+        if facets is not None:
+            facets = self._session.search_facets(search_term, facets)
+        self.output_user_search_videos(valid_videos, search_term, limit, offset, facets) # Call next function
+
+
+    def search_videos_ranked(self, *words, top=10, limit=None, offset=0):
+        """Display the videos whose titles best match the words, best first.
+        Titles having more of the words, rarer ones and fewer others come first,
+        and a word can be matched with a typo or two.
+        Args:
+            words: The words to search for.
+            top: How many of the best matches to show.
+            limit: Show at most this many results, the rest can be seen with NEXT_PAGE.
+            offset: How many results to skip from the beginning.
+        """
+        search_term = " ".join(words)
+        videos = self._session.search_videos_ranked(search_term, top, offset)
+        self.output_user_search_videos(videos, search_term, limit, offset)
+
+
+    def show_related(self, video_id, top=10):
+        """Display the videos sharing the most tags with a video, most related first.
+        Flagged videos are left out.
+        Args:
+            video_id: The video_id of the video.
+            top: How many related videos to show.
+        """
+        outcome = self._session.related_videos(video_id, top)
+        if outcome.error is not None:
+            print(self._refusal("Cannot show related videos", outcome))
+            return
+
+        if not outcome.videos:
+            print(f"No related videos for {outcome.video.title}")
+            return
+        print(f"Showing videos related to {outcome.video.title}:")
+        self._print_videos(outcome.videos)
+
+
+    def complete(self, *words, top=10):
+        """Display the video ids, titles and playlist names starting with a prefix.
+        Titles and playlist names are matched ignoring case.
+        Args:
+            words: The start of what is being typed, which can be several words of a title.
+            top: How many of each to show, the first in order.
+        """
+        prefix = " ".join(words)
+        completions = self._session.complete(prefix, top)
+        lines = []
+        if completions.video_ids:
+            lines.append(f"Video ids: {', '.join(completions.video_ids)}")
+        if completions.videos:
+            lines.append(f"Titles: {', '.join(f'{video.title} ({video.video_id})' for video in completions.videos)}")
+        if completions.playlists:
+            lines.append(f"Playlists: {', '.join(completions.playlists)}")
+        if not lines:
+            print(f"No completions for {prefix}")
+            return
+
+        print(f"Completions for {prefix}:")
+        print("\n".join(lines))
+
+
+    def search_videos_tag(self, video_tag, limit=None, offset=0, facets=None):
+        """Display all videos whose tags contains the provided tag.
+        Several tags can be joined with & (videos with every tag)
+        or with | (videos with any of the tags), e.g. #cat&#animal
+        Args:
+            video_tag: The video tag to be used in search.
+            limit: Show at most this many results, the rest can be seen with NEXT_PAGE.
+            offset: How many results to skip from the beginning.
+            facets: Also show this many of the tags most of the results have.
+        """
+        valid_videos = self._session.search_videos_tag(video_tag, offset)
+        if facets is not None:
+            facets = self._session.search_tag_facets(video_tag, facets)
+        # We can just use the made function again as it still achieves desired result
+        self.output_user_search_videos(valid_videos, video_tag, limit, offset, facets)
+
+
+    def flag_video(self, video_id, flag_reason="Not supplied"):
+        """Mark a video as flagged.
+
+        Args:
+            video_id: The video_id to be flagged.
+            flag_reason: Reason for flagging the video.
+        """
+        self._print_flagged(self._session.flag_video(video_id, flag_reason), flag_reason)
+
+
+    def _print_flagged(self, outcome, flag_reason):
+        """Prints what flagging a video did."""
+        if outcome.error is not None:
+            print(f"Cannot flag video: {outcome.error}")
+            return
+
+        self._print_stopped(outcome) # Flagging the current video stops it
+        print(f"Successfully flagged video: {outcome.video.title} (reason: {flag_reason})")
+
+
+    def allow_video(self, video_id):
+        """Removes a flag from a video.
+        Args:
+            video_id: The video_id to be allowed again.
+        """
+        self._print_allowed(self._session.allow_video(video_id))
+
+
+    def _print_allowed(self, outcome):
+        """Prints what removing a video's flag did."""
+        if outcome.error is not None:
+            print(f"Cannot remove flag from video: {outcome.error}")
+            return
+
+        print(f"Successfully removed flag from video: {outcome.video.title}")
+
+
+    def reload_library(self, catalog_path=None):
+        """Reads the catalog file again and applies only the videos added, removed or changed in it.
+        Args:
+            catalog_path: The catalog file, the one the library was loaded from by default.
+        """
+        try:
+            changes = self._session.read_library_changes(catalog_path)
+        except (OSError, ValueError) as e:
+            print(f"Cannot reload library: {e}")
+            return
+
+        self.apply_library_changes(changes)
+
+
+    def apply_library_changes(self, changes):
+        """Applies the CatalogChanges read from a catalog file.
+        Playlists and the current video follow along: removed videos are taken out of them
+        and changed ones swapped for their new versions.
+        Args:
+            changes: The CatalogChanges from the library's read_changes.
+        """
+        outcome = self._session.apply_library_changes(changes)
+        self._print_stopped(outcome) # Removing the current video stops it
+        print(f"Reloaded library: {len(changes.added)} added, {len(changes.removed)} removed, "
+              f"{len(changes.changed)} changed")
+
+
+    def flag_videos(self, *video_ids, tag=None, reason="Not supplied"):
+        """Mark several videos as flagged at once.
+
+        Args:
+            video_ids: The video_ids to be flagged.
+            tag: Flag every video with this tag that isn't flagged yet,
+                instead of the given video_ids.
+            reason: Reason for flagging the videos.
+        """
+        if tag is None and not video_ids:
+            print("Cannot flag videos: No video_ids or tag given")
+            return
+
+        outcomes = self._session.flag_videos(video_ids, tag, reason)
+        if tag is not None and not outcomes:
+            print(f"No videos to flag with tag: {tag}")
+        for outcome in outcomes:
+            self._print_flagged(outcome, reason)
+
+
+    def allow_videos(self, *video_ids, tag=None):
+        """Removes the flag from several videos at once.
+
+        Args:
+            video_ids: The video_ids to be allowed again.
+            tag: Allow every flagged video with this tag, instead of the
+                given video_ids.
+        """
+        if tag is None and not video_ids:
+            print("Cannot remove flag from videos: No video_ids or tag given")
+            return
+
+        outcomes = self._session.allow_videos(video_ids, tag)
+        if tag is not None and not outcomes:
+            print(f"No flagged videos with tag: {tag}")
+        for outcome in outcomes:
+            self._print_allowed(outcome)
+
+
+    def show_flagged(self):
+        """Display all the flagged videos and why they were flagged."""
+        flagged = self._session.flagged_videos()
+        if not flagged:
+            print("No videos are flagged")
+            return
+
+        print("Showing flagged videos:")
+        self._print_videos(flagged)
@@ -1,8 +1,63 @@
-"""A video playlist class."""
-
-
-class Playlist:
-    """A class used to represent a Playlist."""
-    def __init__(self, name):
-        self.name = name
-        self.videos = []
+"""A video playlist class."""
+
+
+class Playlist:
+    """A class used to represent a Playlist.
+
+    The videos are kept in a dict of video_id -> Video, which remembers the
+    order they were added in, so adding, removing and checking for a video
+    don't have to go through the whole playlist.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._videos = {}
+
+    @property
+    def videos(self):
+        """Returns the videos in the playlist, in the order they were added."""
+        return list(self._videos.values())
+
+    def __len__(self):
+        return len(self._videos)
+
+    def __iter__(self):
+        return iter(self._videos.values())
+
+    def __contains__(self, video):
+        """Checks for a Video, or a video_id."""
+        return getattr(video, "video_id", video) in self._videos
+
+    def add(self, video):
+        """Adds a video to the end of the playlist.
+
+        Returns:
+            False if the video was already in the playlist.
+        """
+        if video.video_id in self._videos:
+            return False
+        self._videos[video.video_id] = video
+        return True
+
+    def replace(self, video):
+        """Swaps in a new Video object for the one with the same video_id,
+        keeping its place in the playlist.
+
+        Returns:
+            False if the video isn't in the playlist.
+        """
+        if video.video_id not in self._videos:
+            return False
+        self._videos[video.video_id] = video
+        return True
+
+    def remove(self, video_id):
+        """Removes a video from the playlist.
+
+        Returns:
+            The removed Video object. None if it wasn't in the playlist.
+        """
+        return self._videos.pop(video_id, None)
+
+    def clear(self):
+        """Removes all the videos from the playlist."""
+        self._videos.clear()
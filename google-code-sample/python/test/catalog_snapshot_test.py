@@ -0,0 +1,71 @@
+import os
+
+from src.catalog_snapshot import compile_snapshot
+from src.catalog_snapshot import open_snapshot
+from src.catalog_snapshot import snapshot_path_for
+from src.video_library import VideoLibrary
+
+CATALOG = ("Funny Dogs | funny_dogs_video_id |  #dog , #animal\n"
+           "Amazing Cats | amazing_cats_video_id |  #cat , #animal\n"
+           "Life at Google | life_at_google_video_id |  #google , #career\n")
+
+
+def write_catalog(tmp_path, text=CATALOG):
+    catalog_path = tmp_path / "videos.txt"
+    catalog_path.write_text(text, encoding="utf-8")
+    return catalog_path
+
+
+def test_compiled_snapshot_has_the_catalog(tmp_path):
+    catalog_path = write_catalog(tmp_path)
+    compile_snapshot(catalog_path)
+    snapshot = open_snapshot(catalog_path)
+    assert snapshot is not None
+    assert list(snapshot.ids()) == ["funny_dogs_video_id", "amazing_cats_video_id", "life_at_google_video_id"]
+    assert snapshot.read(snapshot.find("amazing_cats_video_id")) == \
+        ("Amazing Cats", "amazing_cats_video_id", ("#cat", "#animal"))
+    assert [title for title, _ in snapshot.keys_by_title()] == ["Amazing Cats", "Funny Dogs", "Life at Google"]
+    assert snapshot.find("nothing_video_id") is None
+
+
+def test_snapshot_is_stale_once_the_catalog_changes(tmp_path):
+    catalog_path = write_catalog(tmp_path)
+    compile_snapshot(catalog_path)
+    write_catalog(tmp_path, CATALOG + "Video about nothing | nothing_video_id |\n")
+    assert open_snapshot(catalog_path) is None
+
+
+def test_snapshot_is_stale_once_the_catalog_is_touched(tmp_path):
+    catalog_path = write_catalog(tmp_path)
+    compile_snapshot(catalog_path)
+    stat = os.stat(catalog_path)
+    os.utime(catalog_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert open_snapshot(catalog_path) is None
+
+
+def test_invalid_snapshot_is_not_opened(tmp_path):
+    catalog_path = write_catalog(tmp_path)
+    snapshot_path_for(catalog_path).write_bytes(b"not a snapshot")
+    assert open_snapshot(catalog_path) is None
+
+
+def test_library_parses_the_text_when_the_snapshot_is_stale(tmp_path):
+    catalog_path = write_catalog(tmp_path)
+    compile_snapshot(catalog_path)
+    write_catalog(tmp_path, CATALOG.replace("Amazing Cats", "Amazing Cats Again"))
+
+    for lazy in (False, True):
+        library = VideoLibrary(catalog_path, lazy=lazy)
+        assert len(library) == 3
+        assert library.get_video("amazing_cats_video_id").title == "Amazing Cats Again"
+        assert [video.title for video in library.iter_videos_by_title()] == \
+            ["Amazing Cats Again", "Funny Dogs", "Life at Google"]
+
+
+def test_library_loads_an_up_to_date_snapshot(tmp_path):
+    catalog_path = write_catalog(tmp_path)
+    compile_snapshot(catalog_path)
+    for lazy in (False, True):
+        library = VideoLibrary(catalog_path, lazy=lazy)
+        assert len(library) == 3
+        assert library.get_video("life_at_google_video_id").tags == ("#google", "#career")
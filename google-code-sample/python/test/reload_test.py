@@ -0,0 +1,89 @@
+from src.state_store import StateStore
+from src.video_library import VideoLibrary
+from src.video_player import VideoPlayer
+
+CATALOG = ("Amazing Cats | amazing_cats_video_id |  #cat , #animal\n"
+           "Funny Dogs | funny_dogs_video_id |  #dog , #animal\n"
+           "Another Cat Video | another_cat_video_id |  #cat , #animal\n"
+           "Life at Google | life_at_google_video_id |  #google , #career\n")
+
+CHANGED = ("Amazing Cats Again | amazing_cats_video_id |  #cat , #animal\n"
+           "Another Cat Video | another_cat_video_id |  #cat\n"
+           "Video about nothing | nothing_video_id |\n")
+
+
+def make_player(tmp_path, store=None):
+    catalog_path = tmp_path / "videos.txt"
+    catalog_path.write_text(CATALOG, encoding="utf-8")
+    return VideoPlayer(VideoLibrary(catalog_path, use_snapshot=False), prompt=None, store=store), catalog_path
+
+
+def test_read_changes_finds_what_changed(tmp_path):
+    player, catalog_path = make_player(tmp_path)
+    catalog_path.write_text(CHANGED, encoding="utf-8")
+    changes = player.video_library.read_changes()
+    assert [video.video_id for video in changes.added] == ["nothing_video_id"]
+    assert sorted(changes.removed) == ["funny_dogs_video_id", "life_at_google_video_id"]
+    assert sorted(video.video_id for video in changes.changed) == ["amazing_cats_video_id", "another_cat_video_id"]
+    # Nothing is applied until apply_changes
+    assert len(player.video_library) == 4
+
+
+def test_reload_updates_playlists_flags_and_the_current_video(tmp_path, capfd):
+    player, catalog_path = make_player(tmp_path)
+    player.create_playlist("my_playlist")
+    player.add_to_playlist("my_playlist", "amazing_cats_video_id", "funny_dogs_video_id")
+    player.flag_video("another_cat_video_id", "dont_like_cats")
+    player.play_video("life_at_google_video_id")
+    capfd.readouterr()
+
+    catalog_path.write_text(CHANGED, encoding="utf-8")
+    player.reload_library()
+    player.show_playing()
+    player.show_playlist("my_playlist")
+    player.show_flagged()
+    out, err = capfd.readouterr()
+    lines = out.splitlines()
+    assert lines[0] == "Stopping video: Life at Google"
+    assert lines[1] == "Reloaded library: 1 added, 2 removed, 2 changed"
+    assert lines[2] == "No video is currently playing"
+    assert lines[3] == "Showing playlist: my_playlist"
+    assert "Amazing Cats Again (amazing_cats_video_id) [#cat #animal]" in lines[4]
+    assert len(lines) == 7
+    assert lines[5] == "Showing flagged videos:"
+    assert "Another Cat Video (another_cat_video_id) [#cat]" in lines[6]
+    assert "FLAGGED (reason: dont_like_cats)" in lines[6]
+
+
+def test_reload_keeps_playing_a_video_that_is_still_there(tmp_path, capfd):
+    player, catalog_path = make_player(tmp_path)
+    player.play_video("amazing_cats_video_id")
+    capfd.readouterr()
+
+    catalog_path.write_text(CHANGED, encoding="utf-8")
+    player.reload_library()
+    player.show_playing()
+    out, err = capfd.readouterr()
+    lines = out.splitlines()
+    assert lines[0] == "Reloaded library: 1 added, 2 removed, 2 changed"
+    assert "Currently playing: Amazing Cats Again (amazing_cats_video_id)" in lines[1]
+
+
+def test_reload_drops_the_flag_of_a_removed_video(tmp_path):
+    store = StateStore(tmp_path / "state")
+    player, catalog_path = make_player(tmp_path, store)
+    player.flag_video("funny_dogs_video_id", "dont_like_dogs")
+    catalog_path.write_text(CHANGED, encoding="utf-8")
+    player.reload_library()
+
+    # The video coming back doesn't bring the flag back
+    catalog_path.write_text(CATALOG, encoding="utf-8")
+    player.reload_library()
+    assert player.video_library.get_video("funny_dogs_video_id").flag is None
+    player.close()
+    store.close()
+
+    # Nor does a restart, the store has it dropped too
+    store = StateStore(tmp_path / "state")
+    assert store.recover().flags == {}
+    store.close()
@@ -0,0 +1,102 @@
+import asyncio
+import sys
+
+import pytest
+
+from src.server import VideoServer
+from src.server import frame
+from src.video_library import VideoLibrary
+from src.video_player import VideoPlayer
+
+CATALOG = ("Amazing Cats | amazing_cats_video_id |  #cat , #animal\n"
+           ".hidden cats | hidden_cats_video_id |  #cat\n"
+           "..two dots | two_dots_video_id |\n")
+
+
+def test_frame_ends_with_a_lone_dot():
+    assert frame("Playing video: Amazing Cats\n") == "Playing video: Amazing Cats\n.\n"
+    assert frame("") == ".\n"
+
+
+def test_frame_doubles_leading_dots():
+    assert frame(".\n.hidden\n..two\nno . here\n") == "..\n..hidden\n...two\nno . here\n.\n"
+
+
+async def read_reply(reader):
+    """Reads one reply, taking the extra dot off the lines starting with one."""
+    lines = []
+    while True:
+        line = (await reader.readline()).decode("utf-8")
+        assert line, "connection closed before the end of the reply"
+        if line == ".\n":
+            return lines
+        lines.append(line[1:-1] if line.startswith("..") else line[:-1])
+
+
+def serve_and_run(tmp_path, commands, catalog_change=None):
+    """Starts a server on a Unix socket, sends it commands from one client
+    and returns the replies (without the welcome)."""
+    catalog_path = tmp_path / "videos.txt"
+    catalog_path.write_text(CATALOG, encoding="utf-8")
+    server = VideoServer(VideoPlayer(VideoLibrary(catalog_path, use_snapshot=False), prompt=None))
+    socket_path = str(tmp_path / "server.sock")
+
+    async def run():
+        serving = asyncio.create_task(server.serve(path=socket_path))
+        try:
+            for _ in range(100):
+                try:
+                    reader, writer = await asyncio.open_unix_connection(socket_path)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    await asyncio.sleep(0.01)
+            await read_reply(reader)
+            replies = []
+            for command in commands:
+                if command == "CHANGE_CATALOG":
+                    catalog_path.write_text(catalog_change, encoding="utf-8")
+                    continue
+                writer.write(f"{command}\n".encode("utf-8"))
+                await writer.drain()
+                replies.append(await read_reply(reader))
+            writer.close()
+            return replies
+        finally:
+            serving.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await serving
+
+    return asyncio.run(run())
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs Unix sockets")
+def test_server_replies_keep_leading_dots(tmp_path):
+    replies = serve_and_run(tmp_path, ["SHOW_ALL_VIDEOS", "EXIT"])
+    assert replies[0] == ["..two dots (two_dots_video_id) [] ",
+                          ".hidden cats (hidden_cats_video_id) [#cat] ",
+                          "Amazing Cats (amazing_cats_video_id) [#cat #animal] "]
+    assert replies[1] == ["YouTube has now terminated its execution. Thank you and goodbye!"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs Unix sockets")
+def test_server_answers_the_search_question_on_the_next_line(tmp_path):
+    replies = serve_and_run(tmp_path, ["SEARCH_VIDEOS cats", "2", "SHOW_PLAYING"])
+    assert replies[0][:3] == ["Here are the results for cats:",
+                              "1) .hidden cats (hidden_cats_video_id) [#cat] ",
+                              "2) Amazing Cats (amazing_cats_video_id) [#cat #animal] "]
+    assert replies[1] == ["Playing video: Amazing Cats"]
+    assert replies[2] == ["Currently playing: Amazing Cats (amazing_cats_video_id) [#cat #animal]  - NOT PAUSED"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs Unix sockets")
+def test_server_reloads_only_its_own_catalog(tmp_path):
+    other_path = tmp_path / "other.txt"
+    other_path.write_text("Secret | secret_video_id |\n", encoding="utf-8")
+    replies = serve_and_run(tmp_path, [f"RELOAD_LIBRARY {other_path}", "NUMBER_OF_VIDEOS",
+                                       "CHANGE_CATALOG", "RELOAD_LIBRARY", "NUMBER_OF_VIDEOS"],
+                            catalog_change=CATALOG + "Funny Dogs | funny_dogs_video_id |  #dog\n")
+    assert replies[0] == ["Please enter RELOAD_LIBRARY without a catalog path, "
+                          "the server only reloads the catalog it was started with."]
+    assert replies[1] == ["3 videos in the library"]
+    assert replies[2] == ["Reloaded library: 1 added, 0 removed, 0 changed"]
+    assert replies[3] == ["4 videos in the library"]
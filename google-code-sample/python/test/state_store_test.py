@@ -0,0 +1,77 @@
+from src.state_store import SavedState
+from src.state_store import StateStore
+
+
+def test_recover_replays_the_log(tmp_path):
+    store = StateStore(tmp_path)
+    store.recover()
+    store.append("create", "my_playlist", "my_PLAYlist")
+    store.append("add", "my_playlist", "amazing_cats_video_id", "funny_dogs_video_id")
+    store.append("remove", "my_playlist", "funny_dogs_video_id")
+    store.append("flag", "life_at_google_video_id", "dont_like_cats")
+    store.close()
+
+    state = StateStore(tmp_path).recover()
+    assert state.playlists == {"my_playlist": ["my_PLAYlist", {"amazing_cats_video_id": None}]}
+    assert state.flags == {"life_at_google_video_id": "dont_like_cats"}
+
+
+def test_recover_cuts_off_a_torn_last_line(tmp_path):
+    store = StateStore(tmp_path)
+    store.recover()
+    store.append("flag", "amazing_cats_video_id", "dont_like_cats")
+    store.append("flag", "funny_dogs_video_id", "dont_like_dogs")
+    store.close()
+
+    log_path = tmp_path / "state.log"
+    good = log_path.read_bytes()
+    last_line = good.splitlines(keepends=True)[-1]
+    log_path.write_bytes(good[:-len(last_line)] + last_line[:len(last_line) // 2])
+
+    store = StateStore(tmp_path)
+    state = store.recover()
+    assert state.flags == {"amazing_cats_video_id": "dont_like_cats"}
+    assert log_path.read_bytes() == good[:-len(last_line)]
+
+    # Writing carries on where the good records end
+    store.append("flag", "nothing_video_id", "boring")
+    store.close()
+    state = StateStore(tmp_path).recover()
+    assert state.flags == {"amazing_cats_video_id": "dont_like_cats", "nothing_video_id": "boring"}
+
+
+def test_recover_stops_at_a_line_failing_its_checksum(tmp_path):
+    store = StateStore(tmp_path)
+    store.recover()
+    store.append("flag", "amazing_cats_video_id", "dont_like_cats")
+    store.append("flag", "funny_dogs_video_id", "dont_like_dogs")
+    store.close()
+
+    log_path = tmp_path / "state.log"
+    log_path.write_bytes(log_path.read_bytes().replace(b"dont_like_dogs", b"dont_like_cows"))
+
+    state = StateStore(tmp_path).recover()
+    assert state.flags == {"amazing_cats_video_id": "dont_like_cats"}
+
+
+def test_recover_skips_records_the_snapshot_has(tmp_path):
+    store = StateStore(tmp_path)
+    store.recover()
+    store.append("flag", "amazing_cats_video_id", "dont_like_cats")
+    store.append("create", "my_playlist", "my_playlist")
+    log = (tmp_path / "state.log").read_bytes()
+    store.compact(SavedState(flags={"funny_dogs_video_id": "dont_like_dogs"}))
+    store.close()
+
+    # As if the program died after writing the snapshot, before emptying the log
+    (tmp_path / "state.log").write_bytes(log)
+
+    store = StateStore(tmp_path)
+    state = store.recover()
+    assert state.flags == {"funny_dogs_video_id": "dont_like_dogs"}
+    assert state.playlists == {}
+
+    # New records come after the ones the snapshot has, so they are replayed
+    store.append("allow", "funny_dogs_video_id")
+    store.close()
+    assert StateStore(tmp_path).recover().flags == {}
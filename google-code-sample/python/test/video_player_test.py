@@ -0,0 +1,114 @@
+from src.player_session import PlayerSession
+from src.query_cache import QueryCache
+from src.video_library import VideoLibrary
+from src.video_player import VideoPlayer
+
+CATALOG = "".join(f"Cat {i} | cat{i}_video_id |  #cat\n" for i in range(1, 6))
+
+
+def make_library(tmp_path):
+    catalog_path = tmp_path / "videos.txt"
+    catalog_path.write_text(CATALOG, encoding="utf-8")
+    return VideoLibrary(catalog_path, use_snapshot=False)
+
+
+def results(out):
+    """Returns the numbered result lines of some output."""
+    return [line.rstrip() for line in out.splitlines() if line[:1].isdigit()]
+
+
+def search_first_page(tmp_path, capfd):
+    player = VideoPlayer(make_library(tmp_path), prompt=None)
+    player.search_videos("cat", limit=2)
+    out, err = capfd.readouterr()
+    assert results(out) == ["1) Cat 1 (cat1_video_id) [#cat]", "2) Cat 2 (cat2_video_id) [#cat]"]
+    assert "Enter NEXT_PAGE to see more results." in out
+    return player
+
+
+def test_next_page_skips_a_removed_later_result(tmp_path, capfd):
+    player = search_first_page(tmp_path, capfd)
+    player.video_library.remove_video("cat4_video_id")
+    player.show_next_page()
+    out, err = capfd.readouterr()
+    assert results(out) == ["3) Cat 3 (cat3_video_id) [#cat]", "4) Cat 5 (cat5_video_id) [#cat]"]
+    assert "Enter NEXT_PAGE" not in out
+
+
+def test_next_page_skips_a_removed_video_read_ahead(tmp_path, capfd):
+    # The first page reads the video after it, to know there is a next page
+    player = search_first_page(tmp_path, capfd)
+    player.video_library.remove_video("cat3_video_id")
+    player.show_next_page()
+    out, err = capfd.readouterr()
+    assert results(out) == ["3) Cat 4 (cat4_video_id) [#cat]", "4) Cat 5 (cat5_video_id) [#cat]"]
+
+
+def test_next_page_skips_flagged_results(tmp_path, capfd):
+    player = search_first_page(tmp_path, capfd)
+    player.flag_video("cat3_video_id", "dont_like_cats")
+    player.flag_video("cat4_video_id", "dont_like_cats")
+    capfd.readouterr()
+    player.show_next_page()
+    out, err = capfd.readouterr()
+    assert results(out) == ["3) Cat 5 (cat5_video_id) [#cat]"]
+
+
+def test_next_page_with_every_later_result_gone(tmp_path, capfd):
+    player = search_first_page(tmp_path, capfd)
+    for i in range(3, 6):
+        player.video_library.remove_video(f"cat{i}_video_id")
+    player.show_next_page()
+    out, err = capfd.readouterr()
+    assert out == "No more results to show\n"
+    player.show_next_page()
+    out, err = capfd.readouterr()
+    assert out == "No more results to show\n"
+
+
+def test_next_page_of_all_videos_shows_flagged_ones(tmp_path, capfd):
+    player = VideoPlayer(make_library(tmp_path), prompt=None)
+    player.show_all_videos(limit=2)
+    player.flag_video("cat3_video_id", "dont_like_cats")
+    player.video_library.remove_video("cat4_video_id")
+    capfd.readouterr()
+    player.show_next_page()
+    out, err = capfd.readouterr()
+    lines = out.splitlines()
+    assert lines[0] == "Cat 3 (cat3_video_id) [#cat]  - FLAGGED (reason: dont_like_cats)"
+    assert lines[1] == "Cat 5 (cat5_video_id) [#cat] "
+    assert len(lines) == 2
+
+
+def check_lines_follow_the_library(player, capfd):
+    """Shows every video, changes one behind the player's back and checks
+    the next listing shows the change."""
+    library = player.video_library
+    player.show_all_videos()
+    library.flag_video("cat1_video_id", "dont_like_cats")
+    player.show_all_videos()
+    out, err = capfd.readouterr()
+    lines = out.splitlines()
+    assert lines[0] == "Cat 1 (cat1_video_id) [#cat] "
+    assert lines[5] == "Cat 1 (cat1_video_id) [#cat]  - FLAGGED (reason: dont_like_cats)"
+
+    library.allow_video("cat1_video_id")
+    player.show_all_videos()
+    out, err = capfd.readouterr()
+    assert out.splitlines()[0] == "Cat 1 (cat1_video_id) [#cat] "
+
+
+def test_lines_follow_the_library_with_a_given_session(tmp_path, capfd):
+    check_lines_follow_the_library(VideoPlayer(session=PlayerSession(make_library(tmp_path))), capfd)
+
+
+def test_lines_follow_the_library_with_a_given_query_cache(tmp_path, capfd):
+    check_lines_follow_the_library(VideoPlayer(make_library(tmp_path), query_cache=QueryCache()), capfd)
+
+
+def test_lines_follow_the_library_in_new_sessions(tmp_path, capfd):
+    player = VideoPlayer(make_library(tmp_path))
+    other = player.new_session()
+    check_lines_follow_the_library(other, capfd)
+    other.close() # Closing a new session leaves the shared lines looked after
+    check_lines_follow_the_library(player, capfd)